@@ -1,26 +1,62 @@
 #include "RdpBridge.h"
 #include <freerdp/settings.h>
 #include <freerdp/gdi/gdi.h>
+#include <freerdp/codec/color.h>
+#include <freerdp/transport_io.h>
 #include <winpr/crt.h>
 #include <winpr/library.h>
 #include <winpr/synch.h>
+#include <winpr/sysinfo.h>
 #include <stdio.h>
+#include <stdlib.h>
 #include <string.h>
 #include <windows.h>
 
 #pragma comment(lib, "ws2_32.lib")
 
-#define MAX_WIDTH 1920
-#define MAX_HEIGHT 1080
-// Basic header + pixel data
-#define CALC_SHM_SIZE(w, h) (sizeof(ShmHeader) + ((w) * (h) * 4))
+// 標頭區固定保留 4 KB，讓像素資料維持分頁對齊
+#define SHM_HEADER_SIZE 4096
+// 標頭 + 像素資料，依協商後的桌面尺寸與像素格式配置，不再預留 1080p
+#define CALC_SHM_SIZE(w, h, bpp) (SHM_HEADER_SIZE + ((size_t)(w) * (h) * (bpp)))
+
+// 標頭識別碼 ("RDPB") 與版面配置版本，Python 端不符時拒絕映射
+#define SHM_MAGIC 0x42504452u
+#define SHM_VERSION 2
+
+// 每幀最多記錄的髒矩形數量，超過時改為整張更新
+#define SHM_MAX_DAMAGE_RECTS 64
+#define SHM_DAMAGE_FULL 0xFFFFFFFFu
+
+// 像素格式 (ShmHeader.format)，Python 端依此選擇紋理格式直接取樣
+#define SHM_FORMAT_BGRA32 0
+#define SHM_FORMAT_RGB565 1
+
+typedef struct {
+    uint32_t x;
+    uint32_t y;
+    uint32_t w;
+    uint32_t h;
+} ShmRect;
 
 // Shared memory header
 typedef struct {
+    uint32_t magic;            // SHM_MAGIC
+    uint32_t version;          // SHM_VERSION
+    uint32_t mapSize;          // 本映射的總大小 (標頭 + 像素)，Python 端依此映射
+    volatile LONG generation;  // 映射世代：解析度變更時建立新映射並遞增，舊映射的此欄位同步更新以通知讀取端
     uint32_t width;
     uint32_t height;
     uint32_t stride;
     uint32_t frameId;
+    uint32_t damageCount;      // 本幀髒矩形數量，SHM_DAMAGE_FULL 表示需整張上傳
+    uint32_t coalescedPaints;  // 本幀合併了幾次 GDI 繪製
+    uint32_t idleSteps;        // 累計沒有任何繪製、未發佈的 rdpb_step 次數
+    uint32_t activeSteps;      // 累計有發佈新幀的 rdpb_step 次數
+    volatile LONG seq;         // Seqlock 序號：奇數表示寫入中 (本次 step 的繪製到發佈之間)
+    uint32_t format;           // SHM_FORMAT_*
+    uint32_t receivedKiB;      // 累計從伺服器收到的資料量 (KiB，溢位後從 0 繼續)，Python 端以差值計算頻寬
+    uint32_t busyUs;           // 累計處理事件 (接收、解碼、GDI 繪製) 的時間 (微秒，溢位後從 0 繼續)
+    ShmRect damage[SHM_MAX_DAMAGE_RECTS];
 } ShmHeader;
 
 // [Key modification] Custom Context structure, containing resources unique to each connection
@@ -30,56 +66,187 @@ typedef struct {
     // Resources handles unique to each instance
     HANDLE hMapFile;
     void* pSharedMem;
-    HANDLE hMutex;
     HANDLE hEvent;         // [Added] Event handle
     ShmHeader* pHeader;
     uint8_t* pPixelData;
 
     // Names unique to each instance
-    char shmName[128];
-    char mutexName[128];
+    char shmBaseName[112];
+    char shmNames[2][128];          // 目前與上一代的映射名稱 (<base>_<generation>)，輪替寫入避免讀取端讀到寫一半的名稱
+    volatile LONG shmNameIndex;
     char eventName[128];   // [Added] Event name
 
     // Record current shared memory size to avoid repeated overhead
     size_t currentShmSize;
-
-    BOOL target_visible;       // [新增] Python 設定的目標狀態
-    BOOL current_visible;      // [新增] 目前 DLL 的實際狀態
+    uint32_t generation;
+
+    // 換代後等待 GDI 重新綁定才釋放的舊映射
+    HANDLE hOldMapFile;
+    void* pOldSharedMem;
+
+    // 自上次發佈以來累積的髒矩形 (由 EndPaint 收集)
+    ShmRect pendingDamage[SHM_MAX_DAMAGE_RECTS];
+    uint32_t pendingDamageCount;
+    BOOL pendingDamageFull;
+    // 自上次發佈以來 GDI 實際繪製的次數，為 0 時不發佈新幀
+    uint32_t pendingPaints;
+    // 目前是否處於 seqlock 寫入區段 (seq 為奇數)
+    BOOL inWrite;
+
+    // GDI 緩衝區的像素格式 (16 位元色深時使用 RGB565，記憶體頻寬減半)
+    uint32_t shmFormat;
+
+    // 連線進度回報與取消 (僅在 rdpb_connect_with_job 期間有效)
+    RdpbConnectJob* job;
+    BOOL tryNla;
+    rdpTransportIo defaultIo;  // 被包裝的 FreeRDP 原始傳輸回呼
+
+    BOOL target_visible;       // Python 設定的目標狀態 (rdpb_set_visibility)
+    BOOL current_visible;      // 已通知伺服器的狀態 (FALSE 表示已送出 Suppress Output)
+
+    // 圖形管線設定檔 (PreConnect 套用) 與發佈幀率上限
+    RdpbProfile profile;
+    volatile LONG frameInterval;  // 兩次發佈的最小間隔 (毫秒)，0 為不限
+    LONGLONG lastPublish;      // 上一次發佈的 QueryPerformanceCounter 值
+    HANDLE hFrameTimer;        // 被幀率上限延後的幀到期時觸發 (自動重設)，由 rdpb_get_event_handles 交給排程器等待
+    BOOL frameTimerArmed;
+    ULONGLONG busyUs;
 } BridgeContext;
 
-// Initialize shared memory for this Context
-static BOOL Shm_Init(BridgeContext* ctx, int width, int height) {
-    if (!ctx) return FALSE;
-    if (ctx->hMapFile) return TRUE; // Already initialized
+// 預設設定檔：與先前固定的設定相同
+static const RdpbProfile DEFAULT_PROFILE = {
+    1, 1, 1, 1, 0, 0, -1, 0
+};
+
+// 連線工作：由 Python 建立並持有，可從其他執行緒取消進行中的連線
+struct RdpbConnectJob {
+    rdpb_progress_cb progress;
+    void* userData;
+    volatile LONG cancelled;
+    BOOL fallback;             // 已進入手動登入重試，之後不再回報較早的階段
+    CRITICAL_SECTION lock;
+    freerdp* instance;         // 目前嘗試中的實例，取消時用來中斷握手
+    char shmBaseName[112];     // 重新連線時沿用的映射名稱 (空字串表示依實例產生新名稱)
+    uint32_t shmGeneration;    // 沿用映射的世代
+    RdpbProfile profile;       // 圖形管線設定檔 (hasProfile 為 FALSE 時使用 DEFAULT_PROFILE)
+    BOOL hasProfile;
+};
+
+static void Job_Report(RdpbConnectJob* job, int state) {
+    if (!job || !job->progress) return;
+    if (job->fallback && state < RDPB_CONNECT_FALLBACK) return;
+    job->progress(job->userData, state);
+}
 
-    // Use unique name within the Context
-    size_t size = CALC_SHM_SIZE(MAX_WIDTH, MAX_HEIGHT); // Allocate maximum space to prevent resolution changes
+static BOOL Job_Cancelled(RdpbConnectJob* job) {
+    return job && InterlockedCompareExchange(&job->cancelled, 0, 0) != 0;
+}
 
-    ctx->hMapFile = CreateFileMappingA(INVALID_HANDLE_VALUE, NULL, PAGE_READWRITE, 0, (DWORD)size, ctx->shmName);
-    if (!ctx->hMapFile) {
-        printf("[Bridge Error] Failed to create FileMapping: %s\n", ctx->shmName);
-        return FALSE;
-    }
+static void Job_Attach(RdpbConnectJob* job, freerdp* instance) {
+    if (!job) return;
+    EnterCriticalSection(&job->lock);
+    job->instance = instance;
+    LeaveCriticalSection(&job->lock);
+}
 
-    ctx->pSharedMem = MapViewOfFile(ctx->hMapFile, FILE_MAP_ALL_ACCESS, 0, 0, size);
-    if (!ctx->pSharedMem) {
-        CloseHandle(ctx->hMapFile);
-        ctx->hMapFile = NULL;
-        return FALSE;
+static void Seq_EndWrite(BridgeContext* ctx);
+
+// 依色深決定 GDI 輸出格式：16 位元直接輸出 RGB565 (Python 端以 GL_UNSIGNED_SHORT_5_6_5 取樣)，其餘為 BGRA32
+static UINT32 Bridge_PixelFormat(UINT32 colorDepth, uint32_t* shmFormat) {
+    if (colorDepth == 16) {
+        *shmFormat = SHM_FORMAT_RGB565;
+        return PIXEL_FORMAT_RGB16;
     }
+    *shmFormat = SHM_FORMAT_BGRA32;
+    return PIXEL_FORMAT_BGRA32;
+}
 
-    ctx->pHeader = (ShmHeader*)ctx->pSharedMem;
-    ctx->pPixelData = (uint8_t*)ctx->pSharedMem + sizeof(ShmHeader);
+// 建立下一代共享記憶體 (大小恰好容納 width x height)，並切換為目前映射
+// 舊映射保留到 Shm_ReleaseOld，讓 GDI 先重新綁定到新的像素緩衝區
+static BOOL Shm_Map(BridgeContext* ctx, UINT32 width, UINT32 height, UINT32 bpp) {
+    size_t size = CALC_SHM_SIZE(width, height, bpp);
+    uint32_t generation = ctx->generation;
+    LONG nameIndex = ctx->shmNameIndex ^ 1;
+    char* name = ctx->shmNames[nameIndex];
+    HANDLE hMapFile = NULL;
+    void* pSharedMem = NULL;
+    BOOL reused = FALSE;
+
+    // 重新連線時沿用上一個實例的名稱，Python 端仍持有該映射，同名會開啟同一塊記憶體 (不需重新映射)
+    // 既有的映射太小時改用下一個世代的新名稱
+    for (int attempt = 0; attempt < 2 && !pSharedMem; attempt++) {
+        generation++;
+        sprintf_s(name, 128, "%s_%u", ctx->shmBaseName, generation);
+        hMapFile = CreateFileMappingA(INVALID_HANDLE_VALUE, NULL, PAGE_READWRITE,
+                                      (DWORD)((uint64_t)size >> 32), (DWORD)size, name);
+        if (!hMapFile) {
+            printf("[Bridge Error] Failed to create FileMapping: %s\n", name);
+            return FALSE;
+        }
+        reused = GetLastError() == ERROR_ALREADY_EXISTS;
+        pSharedMem = MapViewOfFile(hMapFile, FILE_MAP_ALL_ACCESS, 0, 0, size);
+        if (!pSharedMem) {
+            CloseHandle(hMapFile);
+            hMapFile = NULL;
+            if (!reused) return FALSE;
+        }
+    }
+    if (!pSharedMem) return FALSE;
+
+    // 沿用的映射保留像素 (畫面維持上一幀) 與 frameId；計數器與 frameId 延續上一代
+    ShmHeader* header = (ShmHeader*)pSharedMem;
+    header->magic = SHM_MAGIC;
+    header->version = SHM_VERSION;
+    header->mapSize = (uint32_t)size;
+    header->generation = (LONG)generation;
+    header->width = 0;
+    header->height = 0;
+    header->stride = 0;
+    header->damageCount = SHM_DAMAGE_FULL;
+    header->coalescedPaints = 0;
+    header->seq = 0;  // 上一個實例可能在寫入區段中斷線
+    header->format = ctx->shmFormat;
+    if (!reused) header->frameId = 0;
+    if (ctx->pHeader) {
+        header->frameId = ctx->pHeader->frameId;
+        header->idleSteps = ctx->pHeader->idleSteps;
+        header->activeSteps = ctx->pHeader->activeSteps;
+
+        // 結束舊映射的寫入區段並通知讀取端換代；讀取端持有自己的 view，舊記憶體在其重新映射前仍有效
+        Seq_EndWrite(ctx);
+        InterlockedExchange(&ctx->pHeader->generation, (LONG)generation);
+        ctx->hOldMapFile = ctx->hMapFile;
+        ctx->pOldSharedMem = ctx->pSharedMem;
+    }
 
-    // Initialize header
-    ctx->pHeader->width = 0;
-    ctx->pHeader->height = 0;
-    ctx->pHeader->frameId = 0;
+    ctx->hMapFile = hMapFile;
+    ctx->pSharedMem = pSharedMem;
+    ctx->pHeader = header;
+    ctx->pPixelData = (uint8_t*)pSharedMem + SHM_HEADER_SIZE;
     ctx->currentShmSize = size;
+    ctx->generation = generation;
+    InterlockedExchange(&ctx->shmNameIndex, nameIndex);
+
+    // 新映射的第一幀必定整張上傳
+    ctx->pendingDamageCount = 0;
+    ctx->pendingDamageFull = TRUE;
+    return TRUE;
+}
+
+static void Shm_ReleaseOld(BridgeContext* ctx) {
+    if (ctx->pOldSharedMem) { UnmapViewOfFile(ctx->pOldSharedMem); ctx->pOldSharedMem = NULL; }
+    if (ctx->hOldMapFile) { CloseHandle(ctx->hOldMapFile); ctx->hOldMapFile = NULL; }
+}
+
+// Initialize shared memory for this Context
+static BOOL Shm_Init(BridgeContext* ctx, int width, int height, UINT32 bpp) {
+    if (!ctx) return FALSE;
+    if (ctx->hMapFile) return TRUE; // Already initialized
+
+    ctx->pendingPaints = 0;
+    ctx->inWrite = FALSE;
+    if (!Shm_Map(ctx, width, height, bpp)) return FALSE;
 
-    // Create mutex
-    ctx->hMutex = CreateMutexA(NULL, FALSE, ctx->mutexName);
-    
     // [Added] Create event
 	sprintf_s(ctx->eventName, 128, "Local\\RdpBridgeEvent_%p", ctx);
     ctx->hEvent = CreateEventA(NULL, FALSE, FALSE, ctx->eventName); // Auto-reset event
@@ -89,10 +256,101 @@ static BOOL Shm_Init(BridgeContext* ctx, int width, int height) {
 // Release resources
 static void Shm_Free(BridgeContext* ctx) {
     if (!ctx) return;
+    Shm_ReleaseOld(ctx);
     if (ctx->pSharedMem) { UnmapViewOfFile(ctx->pSharedMem); ctx->pSharedMem = NULL; }
     if (ctx->hMapFile) { CloseHandle(ctx->hMapFile); ctx->hMapFile = NULL; }
-    if (ctx->hMutex) { CloseHandle(ctx->hMutex); ctx->hMutex = NULL; }
     if (ctx->hEvent) { CloseHandle(ctx->hEvent); ctx->hEvent = NULL; }
+    ctx->pHeader = NULL;
+    ctx->pPixelData = NULL;
+}
+
+// 將一個髒矩形併入待發佈清單，與既有矩形合併不會多出面積時直接合併
+static void Damage_Add(BridgeContext* ctx, INT32 x, INT32 y, INT32 w, INT32 h, UINT32 maxW, UINT32 maxH) {
+    if (ctx->pendingDamageFull) return;
+
+    // 裁切到桌面範圍
+    if (x < 0) { w += x; x = 0; }
+    if (y < 0) { h += y; y = 0; }
+    if ((UINT32)x >= maxW || (UINT32)y >= maxH || w <= 0 || h <= 0) return;
+    if ((UINT32)(x + w) > maxW) w = (INT32)maxW - x;
+    if ((UINT32)(y + h) > maxH) h = (INT32)maxH - y;
+
+    for (uint32_t i = 0; i < ctx->pendingDamageCount; i++) {
+        ShmRect* r = &ctx->pendingDamage[i];
+        uint32_t ux = min(r->x, (uint32_t)x);
+        uint32_t uy = min(r->y, (uint32_t)y);
+        uint32_t ur = max(r->x + r->w, (uint32_t)(x + w));
+        uint32_t ub = max(r->y + r->h, (uint32_t)(y + h));
+        uint64_t unionArea = (uint64_t)(ur - ux) * (ub - uy);
+        uint64_t sumArea = (uint64_t)r->w * r->h + (uint64_t)w * h;
+        if (unionArea <= sumArea) {
+            r->x = ux; r->y = uy; r->w = ur - ux; r->h = ub - uy;
+            return;
+        }
+    }
+
+    if (ctx->pendingDamageCount >= SHM_MAX_DAMAGE_RECTS) {
+        ctx->pendingDamageFull = TRUE;
+        return;
+    }
+
+    ShmRect* r = &ctx->pendingDamage[ctx->pendingDamageCount++];
+    r->x = (uint32_t)x; r->y = (uint32_t)y; r->w = (uint32_t)w; r->h = (uint32_t)h;
+}
+
+// Seqlock 寫入端：序號變為奇數期間讀取端視為資料不穩定
+// 一次 rdpb_step 中的所有繪製與標頭發佈共用同一個寫入區段，讀取端只會看到完整發佈的幀
+// InterlockedIncrement 為完整記憶體屏障，確保像素/標頭寫入不會越過序號
+static void Seq_BeginWrite(BridgeContext* ctx) {
+    if (ctx->inWrite || !ctx->pHeader) return;
+    InterlockedIncrement(&ctx->pHeader->seq);
+    ctx->inWrite = TRUE;
+}
+
+static void Seq_EndWrite(BridgeContext* ctx) {
+    if (!ctx->inWrite) return;
+    ctx->inWrite = FALSE;
+    InterlockedIncrement(&ctx->pHeader->seq);
+}
+
+static BOOL Bridge_BeginPaint(rdpContext* context) {
+    BridgeContext* ctx = (BridgeContext*)context;
+    Seq_BeginWrite(ctx);
+
+    rdpGdi* gdi = context->gdi;
+    if (!gdi || !gdi->primary || !gdi->primary->hdc || !gdi->primary->hdc->hwnd) return TRUE;
+
+    HGDI_WND hwnd = gdi->primary->hdc->hwnd;
+    hwnd->invalid->null = TRUE;
+    hwnd->ninvalid = 0;
+    return TRUE;
+}
+
+// 收集 GDI 本次繪製的失效區域
+static BOOL Bridge_EndPaint(rdpContext* context) {
+    BridgeContext* ctx = (BridgeContext*)context;
+    rdpGdi* gdi = context->gdi;
+    if (!gdi || !gdi->primary || !gdi->primary->hdc || !gdi->primary->hdc->hwnd) return TRUE;
+
+    HGDI_WND hwnd = gdi->primary->hdc->hwnd;
+    if (hwnd->invalid->null) return TRUE;
+
+    ctx->pendingPaints++;
+
+    if (hwnd->ninvalid <= 0) {
+        Damage_Add(ctx, hwnd->invalid->x, hwnd->invalid->y, hwnd->invalid->w, hwnd->invalid->h,
+                   gdi->width, gdi->height);
+    }
+    else {
+        for (INT32 i = 0; i < hwnd->ninvalid; i++) {
+            HGDI_RGN rgn = &hwnd->cinvalid[i];
+            Damage_Add(ctx, rgn->x, rgn->y, rgn->w, rgn->h, gdi->width, gdi->height);
+        }
+    }
+
+    hwnd->invalid->null = TRUE;
+    hwnd->ninvalid = 0;
+    return TRUE;
 }
 
 // Update image
@@ -100,26 +358,69 @@ static void Shm_Update(freerdp* instance) {
     if (!instance || !instance->context) return;
     BridgeContext* ctx = (BridgeContext*)instance->context;
 
-    if (!ctx->pSharedMem || !ctx->hMutex || !ctx->hEvent) return;
+    if (!ctx->pSharedMem || !ctx->hEvent) return;
 
-    // 鎖定標頭資訊
-    WaitForSingleObject(ctx->hMutex, INFINITE);
+    // 以 seqlock 取代互斥鎖：Python 端不需等待，只需驗證序號
+    // 若本次 step 已有繪製，寫入區段早已開啟，這裡不會重複遞增
+    Seq_BeginWrite(ctx);
 
     rdpGdi* gdi = instance->context->gdi;
     ctx->pHeader->width = gdi->width;
     ctx->pHeader->height = gdi->height;
-    ctx->pHeader->stride = gdi->width * 4;
+    ctx->pHeader->stride = gdi->stride;
+    ctx->pHeader->format = ctx->shmFormat;
     
     // [重要] 這裡不需要 memcpy 了！影像已經由 FreeRDP 自動填入 pPixelData
+
+    // 發佈本幀的髒矩形，Python 端只上傳這些區域
+    if (ctx->pendingDamageFull) {
+        ctx->pHeader->damageCount = SHM_DAMAGE_FULL;
+    }
+    else {
+        memcpy(ctx->pHeader->damage, ctx->pendingDamage, ctx->pendingDamageCount * sizeof(ShmRect));
+        ctx->pHeader->damageCount = ctx->pendingDamageCount;
+    }
+    ctx->pHeader->coalescedPaints = ctx->pendingPaints;
+    ctx->pHeader->activeSteps++;
+    ctx->pendingDamageCount = 0;
+    ctx->pendingDamageFull = FALSE;
+    ctx->pendingPaints = 0;
     
     ctx->pHeader->frameId++;
 
-    ReleaseMutex(ctx->hMutex);
-    
+    Seq_EndWrite(ctx);
+
     // 敲門通知 Python
     SetEvent(ctx->hEvent);
 }
 
+// 伺服器變更解析度：建立恰好容納新尺寸的下一代共享記憶體，將 GDI 重新綁定後再釋放舊映射
+static BOOL Bridge_DesktopResize(rdpContext* context) {
+    BridgeContext* ctx = (BridgeContext*)context;
+    rdpSettings* settings = context->settings;
+    rdpGdi* gdi = context->gdi;
+    if (!gdi) return FALSE;
+
+    UINT32 width = settings->DesktopWidth;
+    UINT32 height = settings->DesktopHeight;
+    if ((UINT32)gdi->width == width && (UINT32)gdi->height == height) return TRUE;
+
+    UINT32 bpp = FreeRDPGetBytesPerPixel(gdi->dstFormat);
+    if (!Shm_Map(ctx, width, height, bpp)) return FALSE;
+    BOOL ok = gdi_resize_ex(gdi, width, height, width * bpp, gdi->dstFormat, ctx->pPixelData, NULL);
+    Shm_ReleaseOld(ctx);
+    if (!ok) {
+        printf("[Bridge Error] GDI resize failed (%ux%u)\n", width, height);
+        return FALSE;
+    }
+
+    // 立即通知 Python 換代，不必等到下一次繪製
+    SetEvent(ctx->hEvent);
+    printf("[Bridge] Desktop resized to %ux%u, SHM generation %u (%zu bytes)\n",
+           width, height, ctx->generation, ctx->currentShmSize);
+    return TRUE;
+}
+
 static BOOL Bridge_PreConnect(freerdp* instance) {
     if (!instance || !instance->context || !instance->context->settings) return FALSE;
     rdpSettings* settings = instance->context->settings;
@@ -127,26 +428,47 @@ static BOOL Bridge_PreConnect(freerdp* instance) {
     // Generate unique SHM name (based on instance pointer address)
         // So different instances will have different memory blocks
         BridgeContext* ctx = (BridgeContext*)instance->context;
-        sprintf_s(ctx->shmName, 128, "Local\\RdpBridgeMem_%p", instance);
-        sprintf_s(ctx->mutexName, 128, "Local\\RdpBridgeMutex_%p", instance);
-    
-        printf("[Bridge] Initializing SHM: %s\n", ctx->shmName);
-    
-        // Initialize SHM
-        if (!Shm_Init(ctx, settings->DesktopWidth, settings->DesktopHeight)) {
+        if (!ctx->shmBaseName[0])
+            sprintf_s(ctx->shmBaseName, sizeof(ctx->shmBaseName), "Local\\RdpBridgeMem_%p", instance);
+
+        // Initialize SHM (依要求的桌面尺寸配置，PostConnect 時若伺服器協商出不同尺寸再重新配置)
+        UINT32 pixel_format = Bridge_PixelFormat(settings->ColorDepth, &ctx->shmFormat);
+        if (!Shm_Init(ctx, settings->DesktopWidth, settings->DesktopHeight, FreeRDPGetBytesPerPixel(pixel_format))) {
             return FALSE;
         }
+        printf("[Bridge] Initializing SHM: %s (%zu bytes)\n", ctx->shmNames[ctx->shmNameIndex], ctx->currentShmSize);
 
+    // 圖形管線依設定檔：區域網路的密集連線避開 H.264 解碼，窄頻寬連線用 H.264 並關閉桌面效果
+    const RdpbProfile* profile = &ctx->profile;
     settings->SoftwareGdi = FALSE;
     settings->SupportGraphicsPipeline = TRUE;
-    settings->GfxThinClient = TRUE;
-    settings->GfxSmallCache = TRUE;
-    settings->GfxH264 = TRUE;
-    settings->GfxAVC444 = TRUE;
-
-    settings->BitmapCacheEnabled = FALSE;
-    settings->OffscreenSupportLevel = FALSE;
-    settings->GlyphSupportLevel = GLYPH_SUPPORT_NONE;
+    settings->GfxThinClient = profile->thin_client ? TRUE : FALSE;
+    settings->GfxSmallCache = profile->thin_client ? TRUE : FALSE;
+    settings->GfxH264 = profile->h264 ? TRUE : FALSE;
+    settings->GfxAVC444 = (profile->h264 && profile->avc444) ? TRUE : FALSE;
+    settings->CompressionEnabled = profile->compression ? TRUE : FALSE;
+
+    // 伺服器不支援圖形管線時才會用到的舊式快取
+    settings->BitmapCacheEnabled = profile->caches ? TRUE : FALSE;
+    settings->OffscreenSupportLevel = profile->caches ? TRUE : FALSE;
+    settings->GlyphSupportLevel = profile->caches ? GLYPH_SUPPORT_FULL : GLYPH_SUPPORT_NONE;
+
+    if (profile->connection_type > 0) settings->ConnectionType = (UINT32)profile->connection_type;
+    if (profile->desktop_effects >= 0) {
+        BOOL effects = profile->desktop_effects ? TRUE : FALSE;
+        settings->DisableWallpaper = !effects;
+        settings->DisableFullWindowDrag = !effects;
+        settings->DisableMenuAnims = !effects;
+        settings->DisableThemes = !effects;
+        settings->AllowFontSmoothing = effects;
+        settings->AllowDesktopComposition = effects;
+        freerdp_performance_flags_make(settings);
+    }
+    printf("[Bridge] Profile: H.264 %s, AVC444 %s, thin client %s, compression %s, effects %d, frame cap %d\n",
+           settings->GfxH264 ? "on" : "off", settings->GfxAVC444 ? "on" : "off", settings->GfxThinClient ? "on" : "off",
+           settings->CompressionEnabled ? "on" : "off", profile->desktop_effects, profile->frame_rate);
+    // 宣告支援 Suppress Output，視窗隱藏時可要求伺服器停止送出畫面
+    settings->SuppressOutput = TRUE;
 
     return TRUE;
 }
@@ -157,11 +479,17 @@ static BOOL Bridge_PostConnect(freerdp* instance) {
     BridgeContext* ctx = (BridgeContext*)instance->context;
     rdpSettings* settings = instance->context->settings; // [修正點]
 
-    // 定義格式：BGRA32 匹配 Python 端
-    UINT32 pixel_format = PIXEL_FORMAT_BGRA32;
+    UINT32 pixel_format = Bridge_PixelFormat(settings->ColorDepth, &ctx->shmFormat);
+    UINT32 bpp = FreeRDPGetBytesPerPixel(pixel_format);
+
+    // 伺服器協商出的尺寸或色深與 PreConnect 時不同：重新配置 (此時尚無讀取端)
+    if (CALC_SHM_SIZE(settings->DesktopWidth, settings->DesktopHeight, bpp) != ctx->currentShmSize) {
+        if (!Shm_Map(ctx, settings->DesktopWidth, settings->DesktopHeight, bpp)) return FALSE;
+        Shm_ReleaseOld(ctx);
+    }
     
     // [修正點] 從 settings 獲取寬度
-    int stride = settings->DesktopWidth * 4;
+    int stride = settings->DesktopWidth * bpp;
 
     // [核心優化] 使用 gdi_init_ex 直接綁定 SHM 指標
     if (!gdi_init_ex(instance, pixel_format, stride, ctx->pPixelData, NULL)) {
@@ -169,13 +497,47 @@ static BOOL Bridge_PostConnect(freerdp* instance) {
         return FALSE;
     }
 
-    printf("[Bridge] Zero-copy GDI initialized (%dx%d). Buffer: %p\n",
-           settings->DesktopWidth, settings->DesktopHeight, ctx->pPixelData);
+    // 掛上繪製回呼以收集髒矩形
+    instance->context->update->BeginPaint = Bridge_BeginPaint;
+    instance->context->update->EndPaint = Bridge_EndPaint;
+    instance->context->update->DesktopResize = Bridge_DesktopResize;
+
+    printf("[Bridge] Zero-copy GDI initialized (%dx%d, %s). Buffer: %p\n",
+           settings->DesktopWidth, settings->DesktopHeight,
+           ctx->shmFormat == SHM_FORMAT_RGB565 ? "RGB565" : "BGRA32", ctx->pPixelData);
     
     return TRUE;
 }
 
-static freerdp* _connect_attempt(const char* ip, int port, const char* username, const char* password, int width, int height, int color_depth, BOOL try_nla) {
+// 包裝 FreeRDP 的 TCP/TLS 連線回呼以回報進度；取消後直接讓握手失敗
+static int Bridge_TCPConnect(rdpContext* context, rdpSettings* settings, const char* hostname, int port, DWORD timeout) {
+    BridgeContext* ctx = (BridgeContext*)context;
+    if (Job_Cancelled(ctx->job)) return -1;
+    Job_Report(ctx->job, RDPB_CONNECT_RESOLVING);
+    return ctx->defaultIo.TCPConnect(context, settings, hostname, port, timeout);
+}
+
+static BOOL Bridge_TLSConnect(rdpTransport* transport) {
+    BridgeContext* ctx = (BridgeContext*)transport_get_context(transport);
+    if (Job_Cancelled(ctx->job)) return FALSE;
+    Job_Report(ctx->job, RDPB_CONNECT_TLS);
+    BOOL ok = ctx->defaultIo.TLSConnect(transport);
+    // TLS 完成後 nego 接著進行 CredSSP (NLA)
+    if (ok && ctx->tryNla) Job_Report(ctx->job, RDPB_CONNECT_NLA);
+    return ok;
+}
+
+static void Bridge_HookTransport(BridgeContext* ctx) {
+    const rdpTransportIo* io = freerdp_get_io_callbacks(&ctx->_p);
+    if (!io) return;
+    ctx->defaultIo = *io;
+    rdpTransportIo hooked = *io;
+    hooked.TCPConnect = Bridge_TCPConnect;
+    hooked.TLSConnect = Bridge_TLSConnect;
+    freerdp_set_io_callbacks(&ctx->_p, &hooked);
+}
+
+static freerdp* _connect_attempt(const char* ip, int port, const char* username, const char* password, int width, int height, int color_depth, BOOL try_nla, RdpbConnectJob* job) {
     freerdp* instance = freerdp_new();
     if (!instance) return NULL;
 
@@ -190,6 +552,22 @@ static freerdp* _connect_attempt(const char* ip, int port, const char* username,
         return NULL;
     }
 
+    BridgeContext* bridge = (BridgeContext*)instance->context;
+    bridge->job = job;
+    bridge->tryNla = try_nla;
+    // 新連線的伺服器預設送出畫面
+    bridge->target_visible = TRUE;
+    bridge->current_visible = TRUE;
+    bridge->profile = (job && job->hasProfile) ? job->profile : DEFAULT_PROFILE;
+    bridge->frameInterval = bridge->profile.frame_rate > 0 ? 1000 / bridge->profile.frame_rate : 0;
+    if (job && job->shmBaseName[0]) {
+        // 沿用上一個實例的映射：Shm_Map 會以同一個名稱重新開啟
+        strcpy_s(bridge->shmBaseName, sizeof(bridge->shmBaseName), job->shmBaseName);
+        bridge->generation = job->shmGeneration - 1;
+    }
+    Bridge_HookTransport(bridge);
+    Job_Attach(job, instance);
+
     rdpSettings* settings = instance->context->settings;
     settings->ServerHostname = _strdup(ip);
     settings->TargetNetAddress = _strdup(ip);
@@ -221,11 +599,15 @@ static freerdp* _connect_attempt(const char* ip, int port, const char* username,
         settings->ConsoleSession = TRUE;
     }
 
-    if (!freerdp_connect(instance)) {
+    BOOL connected = freerdp_connect(instance);
+    // 連線結束後不再接受取消，工作物件之後可能被 Python 釋放
+    Job_Attach(job, NULL);
+    bridge->job = NULL;
+
+    if (!connected) {
         // When connection fails, the SHM created in PreConnect needs to be released during context_free
                 // But since we put the release in rdpb_free, it's safer to manually clean up here
-                BridgeContext* ctx = (BridgeContext*)instance->context;
-                Shm_Free(ctx);
+                Shm_Free(bridge);
         
         freerdp_context_free(instance);
         freerdp_free(instance);
@@ -235,45 +617,176 @@ static freerdp* _connect_attempt(const char* ip, int port, const char* username,
     return instance;
 }
 
-EXPORT_FUNC freerdp* rdpb_connect(const char* ip, int port, const char* username, const char* password, int width, int height, int color_depth) {
+EXPORT_FUNC RdpbConnectJob* rdpb_job_new(rdpb_progress_cb progress, void* user_data) {
+    RdpbConnectJob* job = (RdpbConnectJob*)calloc(1, sizeof(RdpbConnectJob));
+    if (!job) return NULL;
+    job->progress = progress;
+    job->userData = user_data;
+    InitializeCriticalSection(&job->lock);
+    return job;
+}
+
+EXPORT_FUNC void rdpb_job_cancel(RdpbConnectJob* job) {
+    if (!job) return;
+    InterlockedExchange(&job->cancelled, 1);
+    EnterCriticalSection(&job->lock);
+    if (job->instance && job->instance->context) freerdp_abort_connect_context(job->instance->context);
+    LeaveCriticalSection(&job->lock);
+}
+
+EXPORT_FUNC void rdpb_job_set_shm(RdpbConnectJob* job, const char* base_name, unsigned int generation) {
+    if (!job || !base_name) return;
+    strcpy_s(job->shmBaseName, sizeof(job->shmBaseName), base_name);
+    job->shmGeneration = generation;
+}
+
+EXPORT_FUNC void rdpb_job_set_profile(RdpbConnectJob* job, const RdpbProfile* profile) {
+    if (!job || !profile) return;
+    job->profile = *profile;
+    job->hasProfile = TRUE;
+}
+
+EXPORT_FUNC void rdpb_job_free(RdpbConnectJob* job) {
+    if (!job) return;
+    DeleteCriticalSection(&job->lock);
+    free(job);
+}
+
+EXPORT_FUNC freerdp* rdpb_connect_with_job(RdpbConnectJob* job, const char* ip, int port, const char* username, const char* password, int width, int height, int color_depth) {
     // Shm_Init has been moved to PreConnect, here we only need to initialize the network library
         WSADATA wsaData;
         WSAStartup(0x0202, &wsaData);
     
-    freerdp* instance = _connect_attempt(ip, port, username, password, width, height, color_depth, TRUE);
-    if (instance) return instance;
+    freerdp* instance = _connect_attempt(ip, port, username, password, width, height, color_depth, TRUE, job);
+    if (instance) {
+        Job_Report(job, RDPB_CONNECT_CONNECTED);
+        return instance;
+    }
+    if (Job_Cancelled(job)) {
+        printf("[Bridge] Connect to %s cancelled\n", ip);
+        return NULL;
+    }
 
     printf("[Bridge] NLA failed, retrying manual login...\n");
-    instance = _connect_attempt(ip, port, username, NULL, width, height, color_depth, FALSE);
+    Job_Report(job, RDPB_CONNECT_FALLBACK);
+    if (job) job->fallback = TRUE;
+    instance = _connect_attempt(ip, port, username, NULL, width, height, color_depth, FALSE, job);
+    if (instance) Job_Report(job, RDPB_CONNECT_CONNECTED);
 
     return instance;
 }
 
+EXPORT_FUNC freerdp* rdpb_connect(const char* ip, int port, const char* username, const char* password, int width, int height, int color_depth) {
+    return rdpb_connect_with_job(NULL, ip, port, username, password, width, height, color_depth);
+}
+
+// 幀率上限內延後發佈：在下一次允許發佈的時間觸發計時器，讓排程器回來 poll
+// 計時器為自動重設，觸發後 (或提早喚醒時) 都重新設定，保證被延後的幀一定會在到期時發佈
+static void Frame_ArmTimer(BridgeContext* ctx, LONGLONG delay100ns) {
+    if (!ctx->hFrameTimer) ctx->hFrameTimer = CreateWaitableTimer(NULL, FALSE, NULL);
+    if (!ctx->hFrameTimer) return;
+    LARGE_INTEGER due;
+    due.QuadPart = -(delay100ns > 0 ? delay100ns : 1); // 相對時間，單位 100 奈秒
+    if (SetWaitableTimer(ctx->hFrameTimer, &due, 0, NULL, NULL, FALSE)) ctx->frameTimerArmed = TRUE;
+}
+
+// 累計的接收量與處理時間寫入標頭，Python 端 (rdp_profile.LinkMonitor) 以差值估計頻寬與 CPU 負載
+static void Stats_Publish(BridgeContext* ctx) {
+    if (!ctx->pHeader || !ctx->_p.rdp) return;
+    UINT64 inBytes = 0, outBytes = 0, inPackets = 0, outPackets = 0;
+    freerdp_get_stats(ctx->_p.rdp, &inBytes, &outBytes, &inPackets, &outPackets);
+    ctx->pHeader->receivedKiB = (uint32_t)(inBytes / 1024);
+    ctx->pHeader->busyUs = (uint32_t)ctx->busyUs;
+}
+
+// 處理已就緒的事件並在有繪製時發佈，不等待
+// 回傳 RDPB_POLL_DISCONNECTED / RDPB_POLL_IDLE / RDPB_POLL_FRAME
+static int Bridge_Process(freerdp* instance) {
+    BridgeContext* ctx = (BridgeContext*)instance->context;
+    LARGE_INTEGER start, end, freq;
+    QueryPerformanceCounter(&start);
+    BOOL alive = freerdp_check_event_handles(instance->context);
+    QueryPerformanceCounter(&end);
+    QueryPerformanceFrequency(&freq);
+    if (freq.QuadPart <= 0) freq.QuadPart = 1;
+    ctx->busyUs += (ULONGLONG)((end.QuadPart - start.QuadPart) * 1000000 / freq.QuadPart);
+    if (!alive) {
+        Seq_EndWrite(ctx);
+        return RDPB_POLL_DISCONNECTED;
+    }
+
+    // 只有 GDI 真的繪製過 (或需要整張更新) 才發佈並喚醒 Python
+    // 設定了幀率上限時，間隔內的繪製留在待發佈清單，與之後的繪製合併成一幀
+    int result = RDPB_POLL_IDLE;
+    if (ctx->pendingPaints > 0 || ctx->pendingDamageFull) {
+        // 以 QueryPerformanceCounter 計算間隔 (GetTickCount64 只有 10~16 ms 的解析度)
+        LONGLONG interval = (LONGLONG)ctx->frameInterval * freq.QuadPart / 1000;
+        LONGLONG now = end.QuadPart;
+        LONGLONG elapsed = now - ctx->lastPublish;
+        if (interval > 0 && elapsed < interval) {
+            // 每次延後都重新設定計時器：觸發時若因解析度仍未到期，下一次觸發一定會發佈
+            Frame_ArmTimer(ctx, (interval - elapsed) * 10000000 / freq.QuadPart + 1);
+        }
+        else {
+            Stats_Publish(ctx);
+            Shm_Update(instance);
+            ctx->lastPublish = now;
+            if (ctx->frameTimerArmed) {
+                CancelWaitableTimer(ctx->hFrameTimer);
+                ctx->frameTimerArmed = FALSE;
+            }
+            result = RDPB_POLL_FRAME;
+        }
+    }
+    else if (ctx->pHeader) {
+        ctx->pHeader->idleSteps++;
+    }
+
+    // 結束本次 step 的寫入區段 (包含沒有失效區域的繪製)
+    Seq_EndWrite(ctx);
+    return result;
+}
+
 EXPORT_FUNC int rdpb_step(freerdp* instance) {
     if (!instance || !instance->context) return 0;
     if (freerdp_shall_disconnect_context(instance->context)) return 0;
 
     HANDLE handles[64];
-    DWORD count = freerdp_get_event_handles(instance->context, handles, 64);
+    DWORD count = freerdp_get_event_handles(instance->context, handles, 63);
     if (count == 0) return 0;
+    BridgeContext* ctx = (BridgeContext*)instance->context;
+    if (ctx->hFrameTimer) handles[count++] = ctx->hFrameTimer;
 
     WaitForMultipleObjects(count, handles, FALSE, 5);
-    if (!freerdp_check_event_handles(instance->context)) return 0;
+    return Bridge_Process(instance) != RDPB_POLL_DISCONNECTED;
+}
+
+EXPORT_FUNC int rdpb_get_event_handles(freerdp* instance, HANDLE* handles, int max_count) {
+    if (!instance || !instance->context || !handles || max_count <= 0) return 0;
+    if (freerdp_shall_disconnect_context(instance->context)) return 0;
+    // 幀率上限的計時器在第一次延後發佈時建立，排程器每次 poll 後重新取得句柄清單
+    BridgeContext* ctx = (BridgeContext*)instance->context;
+    int reserve = ctx->hFrameTimer ? 1 : 0;
+    if (max_count <= reserve) return 0;
+    int count = (int)freerdp_get_event_handles(instance->context, handles, (DWORD)(max_count - reserve));
+    if (count > 0 && ctx->hFrameTimer) handles[count++] = ctx->hFrameTimer;
+    return count;
+}
 
-    Shm_Update(instance);
-    return 1;
+EXPORT_FUNC int rdpb_poll(freerdp* instance) {
+    if (!instance || !instance->context) return RDPB_POLL_DISCONNECTED;
+    if (freerdp_shall_disconnect_context(instance->context)) return RDPB_POLL_DISCONNECTED;
+    return Bridge_Process(instance);
 }
 
-EXPORT_FUNC void rdpb_send_scancode(freerdp* instance, int scancode, int flags) {
-    if (!instance || !instance->context || !instance->context->input) return;
+static void Input_Key(rdpInput* input, int scancode, int flags) {
     UINT16 kbdFlags = 0;
     if (flags & 1) kbdFlags |= KBD_FLAGS_DOWN; else kbdFlags |= KBD_FLAGS_RELEASE;
     if (flags & 2) kbdFlags |= KBD_FLAGS_EXTENDED;
-    instance->context->input->KeyboardEvent(instance->context->input, kbdFlags, scancode);
+    input->KeyboardEvent(input, kbdFlags, scancode);
 }
 
-EXPORT_FUNC void rdpb_send_mouse(freerdp* instance, int flags, int x, int y) {
-    if (!instance || !instance->context || !instance->context->input) return;
+static BOOL Input_Mouse(rdpInput* input, int flags, int x, int y) {
     UINT16 ptrFlags = 0;
     switch (flags) {
     case 1: ptrFlags = PTR_FLAGS_BUTTON1 | PTR_FLAGS_DOWN; break;
@@ -295,9 +808,38 @@ EXPORT_FUNC void rdpb_send_mouse(freerdp* instance, int flags, int x, int y) {
     case 7: ptrFlags = PTR_FLAGS_BUTTON3 | PTR_FLAGS_DOWN; break; // Middle Down
     case 8: ptrFlags = PTR_FLAGS_BUTTON3; break; // Middle Up
         
-    default: return;
+    default: return FALSE;
+    }
+    return input->MouseEvent(input, ptrFlags, x, y);
+}
+
+EXPORT_FUNC void rdpb_send_scancode(freerdp* instance, int scancode, int flags) {
+    if (!instance || !instance->context || !instance->context->input) return;
+    Input_Key(instance->context->input, scancode, flags);
+}
+
+EXPORT_FUNC void rdpb_send_mouse(freerdp* instance, int flags, int x, int y) {
+    if (!instance || !instance->context || !instance->context->input) return;
+    Input_Mouse(instance->context->input, flags, x, y);
+}
+
+// 一次送出多個輸入事件 (Python 端已合併連續的滑鼠移動)，省去每個事件一次的 ctypes 呼叫
+EXPORT_FUNC int rdpb_send_input_batch(freerdp* instance, const RdpbInputEvent* events, int count) {
+    if (!instance || !instance->context || !instance->context->input || !events) return 0;
+    if (freerdp_shall_disconnect_context(instance->context)) return 0;
+    rdpInput* input = instance->context->input;
+    int sent = 0;
+    for (int i = 0; i < count; i++) {
+        const RdpbInputEvent* ev = &events[i];
+        if (ev->type == RDPB_INPUT_KEYBOARD) {
+            Input_Key(input, ev->x, ev->flags);
+            sent++;
+        }
+        else if (ev->type == RDPB_INPUT_MOUSE && Input_Mouse(input, ev->flags, ev->x, ev->y)) {
+            sent++;
+        }
     }
-    instance->context->input->MouseEvent(instance->context->input, ptrFlags, x, y);
+    return sent;
 }
 
 EXPORT_FUNC BOOL rdpb_check_connection(freerdp* instance) {
@@ -306,10 +848,11 @@ EXPORT_FUNC BOOL rdpb_check_connection(freerdp* instance) {
 }
 
 // [Added] Export function: Let Python get the correct SHM name
+// 回傳目前世代的映射名稱；解析度變更後名稱會改變，Python 端依標頭的 generation 判斷是否需重新取得
 EXPORT_FUNC const char* rdpb_get_shm_name(freerdp* instance) {
     if (!instance || !instance->context) return "";
     BridgeContext* ctx = (BridgeContext*)instance->context;
-    return ctx->shmName;
+    return ctx->shmNames[ctx->shmNameIndex];
 }
 
 EXPORT_FUNC void rdpb_free(freerdp* instance) {
@@ -317,6 +860,7 @@ EXPORT_FUNC void rdpb_free(freerdp* instance) {
         if (instance->context) {
             BridgeContext* ctx = (BridgeContext*)instance->context;
             Shm_Free(ctx);
+            if (ctx->hFrameTimer) { CloseHandle(ctx->hFrameTimer); ctx->hFrameTimer = NULL; }
         }
         gdi_free(instance);
         freerdp_disconnect(instance);
@@ -335,6 +879,47 @@ EXPORT_FUNC void rdpb_sync_locks(freerdp* instance, int flags) {
     }
 }
 
+// 視窗隱藏、最小化或被遮住時送出 Suppress Output PDU：伺服器停止編碼與傳送畫面，
+// FreeRDP 不再解碼 (H.264/AVC444)，rdpb_poll 也幾乎不會發佈新幀；恢復顯示時允許更新並要求整個桌面重繪
+// 與輸入相同，可從 UI 執行緒呼叫 (FreeRDP 的傳輸寫入有鎖保護)
+EXPORT_FUNC BOOL rdpb_set_visibility(freerdp* instance, BOOL is_visible) {
+    if (!instance || !instance->context || !instance->context->update) return FALSE;
+    if (freerdp_shall_disconnect_context(instance->context)) return FALSE;
+    BridgeContext* ctx = (BridgeContext*)instance->context;
+    rdpContext* context = instance->context;
+    rdpUpdate* update = context->update;
+
+    ctx->target_visible = is_visible ? TRUE : FALSE;
+    if (ctx->target_visible == ctx->current_visible) return TRUE;
+
+    // 整個桌面 (TS_RECTANGLE16 的右下角為包含)
+    rdpGdi* gdi = context->gdi;
+    UINT32 width = gdi ? (UINT32)gdi->width : context->settings->DesktopWidth;
+    UINT32 height = gdi ? (UINT32)gdi->height : context->settings->DesktopHeight;
+    RECTANGLE_16 area = { 0, 0, (UINT16)(width - 1), (UINT16)(height - 1) };
+
+    if (!update->SuppressOutput || !update->SuppressOutput(context, (BYTE)ctx->target_visible, &area)) {
+        printf("[Bridge Error] Failed to send Suppress Output PDU\n");
+        return FALSE;
+    }
+    // 伺服器暫停期間的內容都沒有送出，恢復時要求整張重繪
+    if (ctx->target_visible && update->RefreshRect) update->RefreshRect(context, 1, &area);
+    ctx->current_visible = ctx->target_visible;
+    printf("[Bridge] Display updates %s\n", ctx->current_visible ? "resumed" : "suppressed");
+    return TRUE;
+}
+
+// 發佈幀率上限，可在連線中從 UI 執行緒呼叫 (排程器下一次 poll 生效)
+// 只減少發佈與上傳的次數，伺服器仍依原本的速率編碼，GDI 也照常解碼
+EXPORT_FUNC void rdpb_set_frame_rate(freerdp* instance, int fps) {
+    if (!instance || !instance->context) return;
+    BridgeContext* ctx = (BridgeContext*)instance->context;
+    LONG interval = fps > 0 ? 1000 / fps : 0;
+    if (InterlockedExchange(&ctx->frameInterval, interval) != interval) {
+        printf("[Bridge] Frame cap %s\n", fps > 0 ? "changed" : "removed");
+    }
+}
+
 EXPORT_FUNC const char* rdpb_get_event_name(freerdp* instance) {
     if (!instance || !instance->context) return "";
     BridgeContext* ctx = (BridgeContext*)instance->context;
@@ -29,6 +29,68 @@ extern "C" {
      * @details This function first tries automatic login using NLA, and falls back to manual login mode if it fails
      */
     EXPORT_FUNC freerdp* rdpb_connect(const char* ip, int port, const char* username, const char* password, int width, int height, int color_depth);
+
+    // Connection progress states reported through rdpb_progress_cb
+#define RDPB_CONNECT_RESOLVING 0   // Resolving the host name and opening the TCP connection
+#define RDPB_CONNECT_TLS 1         // TLS handshake
+#define RDPB_CONNECT_NLA 2         // CredSSP (NLA) authentication
+#define RDPB_CONNECT_FALLBACK 3    // NLA failed, retrying with manual login
+#define RDPB_CONNECT_CONNECTED 4
+
+    typedef void (*rdpb_progress_cb)(void* user_data, int state);
+    typedef struct RdpbConnectJob RdpbConnectJob;
+
+    /**
+     * @brief Create a connection job used to report progress and cancel rdpb_connect_with_job
+     * @param progress Callback invoked on the connecting thread for each RDPB_CONNECT_* state (may be NULL)
+     * @param user_data Passed back to the callback
+     */
+    EXPORT_FUNC RdpbConnectJob* rdpb_job_new(rdpb_progress_cb progress, void* user_data);
+
+    /**
+     * @brief Cancel the connection running with this job; safe to call from any thread
+     * @details Aborts the handshake in progress and skips the manual-login fallback
+     */
+    EXPORT_FUNC void rdpb_job_cancel(RdpbConnectJob* job);
+
+    /**
+     * @brief Reuse an existing shared memory mapping for the connection (fast reconnect)
+     * @param base_name Base name returned by rdpb_get_shm_name without the "_<generation>" suffix
+     * @param generation Generation of that mapping; the new instance reopens "<base_name>_<generation>"
+     * @details The caller must keep its view of the mapping open so the section stays alive.
+     *          The last frame stays in the pixel buffer until the new session paints over it.
+     */
+    EXPORT_FUNC void rdpb_job_set_shm(RdpbConnectJob* job, const char* base_name, unsigned int generation);
+
+    // Graphics pipeline profile applied in PreConnect (see rdp_profile.py for the presets)
+    typedef struct {
+        int h264;             // Allow H.264 (AVC420) in the graphics pipeline
+        int avc444;           // Allow AVC444 (full chroma H.264), requires h264
+        int thin_client;      // GfxThinClient + GfxSmallCache: ask the server for a lighter stream and a small surface cache
+        int compression;      // Bulk data compression
+        int caches;           // Bitmap/offscreen/glyph caches, used when the server does not support the graphics pipeline
+        int connection_type;  // CONNECTION_TYPE_* hint sent to the server, 0 keeps the FreeRDP default
+        int desktop_effects;  // 1 = wallpaper, themes, font smoothing, animations and composition; 0 = all off; -1 = FreeRDP default
+        int frame_rate;       // Cap on published frames per second, 0 = unlimited (can be changed later with rdpb_set_frame_rate)
+    } RdpbProfile;
+
+    /**
+     * @brief Use a graphics pipeline profile for the connection instead of the built-in default
+     * @param profile Copied into the job; the default matches the previous hard-coded settings
+     *                (H.264 + AVC444, thin client, compression on, no legacy caches, no frame cap)
+     */
+    EXPORT_FUNC void rdpb_job_set_profile(RdpbConnectJob* job, const RdpbProfile* profile);
+
+    /**
+     * @brief Release a job once rdpb_connect_with_job has returned
+     */
+    EXPORT_FUNC void rdpb_job_free(RdpbConnectJob* job);
+
+    /**
+     * @brief Same as rdpb_connect, reporting progress to and honouring cancellation from job
+     * @return Returns pointer to freerdp instance on success, NULL on failure or cancellation
+     */
+    EXPORT_FUNC freerdp* rdpb_connect_with_job(RdpbConnectJob* job, const char* ip, int port, const char* username, const char* password, int width, int height, int color_depth);
     
     /**
      * @brief Release RDP connection resources
@@ -46,6 +108,28 @@ extern "C" {
      */
     EXPORT_FUNC int rdpb_step(freerdp* instance);
 
+    // rdpb_poll return values
+#define RDPB_POLL_DISCONNECTED 0
+#define RDPB_POLL_IDLE 1
+#define RDPB_POLL_FRAME 2
+
+    /**
+     * @brief Get the event handles that become signaled when the connection has work to do
+     * @param instance Pointer to freerdp instance
+     * @param handles Output array of handles
+     * @param max_count Capacity of the handles array
+     * @return Number of handles written, 0 when the connection is interrupted
+     * @details Lets one scheduler thread wait on many connections at once; call rdpb_poll when any of them is signaled
+     */
+    EXPORT_FUNC int rdpb_get_event_handles(freerdp* instance, HANDLE* handles, int max_count);
+
+    /**
+     * @brief Process pending events without waiting and publish a frame if the GDI painted
+     * @param instance Pointer to freerdp instance
+     * @return RDPB_POLL_FRAME when a new frame was published, RDPB_POLL_IDLE when nothing was painted, RDPB_POLL_DISCONNECTED when the connection is interrupted
+     */
+    EXPORT_FUNC int rdpb_poll(freerdp* instance);
+
     // Input control functions
     /**
      * @brief Send keyboard scan code to remote desktop
@@ -64,6 +148,27 @@ extern "C" {
      */
     EXPORT_FUNC void rdpb_send_mouse(freerdp* instance, int flags, int x, int y);
 
+    // rdpb_send_input_batch event types
+#define RDPB_INPUT_MOUSE 0
+#define RDPB_INPUT_KEYBOARD 1
+
+    typedef struct {
+        int type;   // RDPB_INPUT_MOUSE or RDPB_INPUT_KEYBOARD
+        int flags;  // Same flags as rdpb_send_mouse / rdpb_send_scancode
+        int x;      // Mouse X coordinate, or the scan code for keyboard events
+        int y;      // Mouse Y coordinate (unused for keyboard events)
+    } RdpbInputEvent;
+
+    /**
+     * @brief Send a sequence of input events in one call
+     * @param instance Pointer to freerdp instance
+     * @param events Array of events, sent in order
+     * @param count Number of events
+     * @return Number of events sent
+     * @details Replaces one rdpb_send_mouse / rdpb_send_scancode call per event; the caller coalesces mouse moves beforehand
+     */
+    EXPORT_FUNC int rdpb_send_input_batch(freerdp* instance, const RdpbInputEvent* events, int count);
+
     // Status check functions
     /**
      * @brief Check RDP connection status
@@ -79,6 +184,25 @@ extern "C" {
      */
     EXPORT_FUNC void rdpb_sync_locks(freerdp* instance, int flags);
 
+    /**
+     * @brief Pause or resume server-side graphics output for this connection
+     * @param instance Pointer to freerdp instance
+     * @param is_visible FALSE sends a Suppress Output PDU, TRUE allows display updates again and requests a full refresh
+     * @return TRUE when the server was notified (or the state is unchanged), FALSE when the connection is interrupted
+     * @details Call when the session window is hidden, minimized or occluded; while suppressed the server stops encoding
+     *          and streaming graphics, so FreeRDP decodes nothing and rdpb_poll rarely publishes. Safe to call from the input thread
+     */
+    EXPORT_FUNC BOOL rdpb_set_visibility(freerdp* instance, BOOL is_visible);
+
+    /**
+     * @brief Cap how often new frames are published to shared memory
+     * @param instance Pointer to freerdp instance
+     * @param fps Maximum frames per second, 0 for unlimited
+     * @details Paints arriving faster than the cap are merged into the next frame; a waitable timer returned by
+     *          rdpb_get_event_handles wakes the caller when a held-back frame is due. Decoding is not affected
+     */
+    EXPORT_FUNC void rdpb_set_frame_rate(freerdp* instance, int fps);
+
     // [Added] Export function: Allow Python to get the correct SHM name
     EXPORT_FUNC const char* rdpb_get_shm_name(freerdp* instance);
 
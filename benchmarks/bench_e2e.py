@@ -0,0 +1,440 @@
+"""端對端基準測試：模擬的 RdpBridge 發佈畫面，量測消費端的吞吐量、延遲、CPU 與記憶體
+
+每個模擬連線是一個 rdp_worker 工作程序，由 sim_bridge.SimulatedBridge 依工作負載發佈畫面
+(idle / typing / scrolling / video / stress)，主程序以 WorkerBackend + SessionScheduler 接收，
+消費端與實際程式走同一條路徑：
+    headless  排程器執行緒中 check_new_frame -> read_consistent 內 plan_upload
+              並把髒矩形複製到 CPU 端的「紋理」
+    gl        與 RdpGLWidget.check_frame 相同的 FramePacer + 紋理上傳器 (離屏 GL context)，
+              以 --refresh 模擬畫面交換
+    overview  與總覽視窗 (rdp_overview) 相同：每秒 --thumb-fps 次上傳變動區域
+              並重畫有變動的縮圖到 --view 大小的圖集
+延遲為發佈 (幀內的時間戳記) 到消費端處理完成 (headless 複製完、gl 上傳完、
+overview 縮圖畫完) 的時間；
+上傳 MB/s 為複製到紋理的資料量，可比較總覽與每個連線各開一個視窗。
+
+stress 工作負載不間斷地以單一顏色填滿整個畫面，檢查讀到的畫面是否混了兩幀 (撕裂)，
+讀到撕裂時以非零結束代碼結束；--no-seqlock 略過序號驗證，可確認檢查本身抓得到撕裂。
+只測 seqlock 可用 benchmarks/bench_seqlock.py。
+--hidden 把部分連線設為看不到 (set_visible(False)，模擬縮到托盤時的 Suppress Output)，
+比較發佈幀數與排程器喚醒次數。
+
+    python benchmarks/bench_e2e.py [--workloads idle,typing,scrolling,video] [--sizes 1280x720,1920x1080]
+                                   [--sessions 1,4] [--seconds 5] [--consumer headless|gl|overview] [--depth 32]
+                                   [--save after.json] [--compare before.json]
+    python benchmarks/bench_e2e.py --workloads stress [--no-seqlock]
+    python benchmarks/bench_e2e.py --workloads video --sessions 8 --hidden 0.75
+    python benchmarks/bench_e2e.py --workloads video,typing --sessions 8 --consumer overview [--thumb-fps 5]
+
+在 Linux 上以 QT_QPA_PLATFORM=offscreen (或 EGL surfaceless) 執行，不需視窗與 RdpBridge.dll。
+"""
+import argparse
+import ctypes
+import json
+import os
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+from rdp_pacer import FramePacer
+from rdp_scheduler import SessionScheduler
+from rdp_session import frame_view
+from rdp_shm import BYTES_PER_PIXEL, plan_upload, read_consistent, read_header, read_stats
+from rdp_worker import WorkerBackend
+
+from sim_bridge import WORKLOADS, create_simulated_bridge, frame_is_torn, read_stamp, shm_base
+
+
+def rss_mb():
+    """目前程序的常駐記憶體 (MB)，取得不到時回傳 None"""
+    if sys.platform == 'win32':
+        class Counters(ctypes.Structure):
+            _fields_ = [('cb', ctypes.c_ulong), ('PageFaultCount', ctypes.c_ulong)] + \
+                       [(name, ctypes.c_size_t) for name in ('PeakWorkingSetSize', 'WorkingSetSize',
+                                                             'QuotaPeakPagedPoolUsage', 'QuotaPagedPoolUsage',
+                                                             'QuotaPeakNonPagedPoolUsage', 'QuotaNonPagedPoolUsage',
+                                                             'PagefileUsage', 'PeakPagefileUsage')]
+        counters = Counters()
+        counters.cb = ctypes.sizeof(counters)
+        process = ctypes.windll.kernel32.GetCurrentProcess()
+        if not ctypes.windll.psapi.GetProcessMemoryInfo(process, ctypes.byref(counters), counters.cb): return None
+        return counters.WorkingSetSize / 1e6
+    try:
+        with open('/proc/self/statm') as f:
+            return int(f.read().split()[1]) * os.sysconf('SC_PAGE_SIZE') / 1e6
+    except OSError:
+        return None
+
+
+class SessionStats:
+    def __init__(self):
+        self.frames = 0
+        self.latencies = []
+        self.consume = []
+        self.torn = 0
+        self.failed = 0
+        self.nbytes = 0
+
+    def record(self, stamp, seconds, torn, nbytes=0):
+        self.frames += 1
+        self.latencies.append(time.perf_counter() - stamp)
+        self.consume.append(seconds)
+        self.torn += torn
+        self.nbytes += nbytes
+
+
+class HeadlessConsumer:
+    """排程器執行緒中直接讀取：check_new_frame + seqlock 讀取區段內複製髒矩形"""
+    def __init__(self, backend, seqlock=True, check_torn=False):
+        self.backend = backend
+        self.seqlock = seqlock
+        self.check_torn = check_torn
+        self.last_fid = 0
+        self.texture = None
+        self.stats = SessionStats()
+
+    def on_frame(self, backend):
+        header = backend.check_new_frame(self.last_fid)
+        if header is None: return
+        start = time.perf_counter()
+        if self.seqlock:
+            ok, result = read_consistent(backend.shm, self._consume)
+        else:
+            ok, result = True, self._consume(read_header(backend.shm), 0)
+        if not ok:
+            self.stats.failed += 1
+            return
+        self.last_fid, stamp, torn, nbytes = result
+        self.stats.record(stamp, time.perf_counter() - start, torn, nbytes)
+
+    def _consume(self, header, attempt):
+        view = frame_view(self.backend.shm, header)
+        shape = view.shape
+        full = self.texture is None or self.texture.shape != shape or attempt > 0
+        if full: self.texture = np.empty(shape, view.dtype)
+        rects = plan_upload(header, self.last_fid, shape[1], shape[0], force_full=full) or ()
+        for x, y, w, h in rects: self.texture[y:y + h, x:x + w] = view[y:y + h, x:x + w]
+        nbytes = sum(w * h for _, _, w, h in rects) * view.itemsize * (shape[2] if view.ndim > 2 else 1)
+        return header.frame_id, read_stamp(view), self.check_torn and frame_is_torn(view, header.frame_id), nbytes
+
+
+class GLConsumer:
+    """與 RdpGLWidget 相同的上傳流程：排程器執行緒 pacer.add，
+    UI (主) 執行緒 check_frame 上傳紋理"""
+    def __init__(self, backend, ready, upload_mode, seqlock=True, check_torn=False):
+        from OpenGL.GL import glGenTextures
+        from rdp_texture import create_uploader
+        self.backend = backend
+        self.ready = ready
+        self.seqlock = seqlock
+        self.check_torn = check_torn
+        self.texture_id = glGenTextures(1)
+        self.uploader = create_uploader(self.texture_id, upload_mode)
+        self.pacer = FramePacer()
+        self.last_fid = 0
+        self.force_full_upload = False
+        self.stats = SessionStats()
+
+    def on_frame(self, backend):
+        shm = backend.shm
+        try:
+            header = read_consistent(shm, lambda header, attempt: header)[1] if shm else None
+        except ValueError:
+            header = None
+        if self.pacer.add(header): self.ready.set()
+
+    def swapped(self):
+        if self.pacer.swapped(): self.check_frame()
+
+    def check_frame(self):
+        self.pacer.begin()
+        header = self.backend.check_new_frame(self.last_fid)
+        if header is None: return
+        now = time.perf_counter()
+        if not self.pacer.ready(now):
+            self.pacer.defer()
+            return
+        if self.seqlock:
+            ok, result = read_consistent(self.backend.shm, self._upload_frame)
+        else:
+            ok, result = True, self._upload_frame(read_header(self.backend.shm), 0)
+        if not ok:
+            self.force_full_upload = True
+            self.stats.failed += 1
+            return
+        self.force_full_upload = False
+        nbytes, stamp, torn = result
+        if nbytes:
+            self.pacer.uploaded(time.perf_counter())
+            self.stats.record(stamp, time.perf_counter() - now, torn, nbytes)
+
+    def _upload_frame(self, header, attempt):
+        rects = self.pacer.plan(header, self.last_fid, self.uploader.width, self.uploader.height,
+                                force_full=self.force_full_upload or attempt > 0)
+        self.last_fid = header.frame_id
+        self.pacer.commit(header.frame_id)
+        if not rects: return 0, 0.0, False
+        self.uploader.upload(self.backend.get_pixel_address(), header.width, header.height, header.stride, rects,
+                             header.format)
+        view = frame_view(self.backend.shm, header)
+        nbytes = sum(w * h for _, _, w, h in rects) * BYTES_PER_PIXEL[header.format]
+        return nbytes, read_stamp(view), self.check_torn and frame_is_torn(view, header.frame_id)
+
+    def release(self):
+        from OpenGL.GL import glDeleteTextures
+        self.uploader.release()
+        glDeleteTextures([self.texture_id])
+
+
+class OverviewConsumer:
+    """與總覽視窗相同：排程器執行緒記錄髒矩形，
+    主執行緒依縮圖更新頻率上傳並重畫有變動的縮圖
+
+    連線本身 (backend 屬性) 作為 ThumbnailTile 的 session。
+    """
+    def __init__(self, backend, atlas):
+        from rdp_overview import ThumbnailTile
+        self.backend = backend
+        self.atlas = atlas
+        self.tile = ThumbnailTile(self)
+        self.stats = SessionStats()
+
+    def on_frame(self, backend):
+        shm = backend.shm
+        try:
+            header = read_consistent(shm, lambda header, attempt: header)[1] if shm else None
+        except ValueError:
+            header = None
+        self.tile.notify(header)
+
+    def refresh(self):
+        if not self.tile.changed: return
+        start = time.perf_counter()
+        nbytes = self.atlas.upload(self.tile)
+        if not nbytes: return
+        if self.atlas.fbo is not None: self.atlas.draw_tile(self.tile)
+        # 縮圖中的時間戳記：上傳後再讀一次，寫入端若已發佈下一幀，延遲會略為低估
+        ok, stamp = read_consistent(self.backend.shm,
+                                    lambda header, attempt: read_stamp(frame_view(self.backend.shm, header)))
+        if ok: self.stats.record(stamp, time.perf_counter() - start, False, nbytes)
+
+    def release(self):
+        self.tile.release()
+
+
+def start_sessions(count, width, height, depth, workload):
+    def start(index):
+        config = {'server': f"sim{index}", 'width': width, 'height': height, 'color_depth': depth,
+                  'workload': workload, 'shm_base': shm_base(index), 'seed': index + 1}
+        return WorkerBackend(config, factory=create_simulated_bridge)
+    with ThreadPoolExecutor(max_workers=count) as pool:
+        return list(pool.map(start, range(count)))
+
+
+def run_gl_loop(consumers, ready, seconds, refresh):
+    """主執行緒：有新幀通知時執行 check_frame，每 1/refresh 秒模擬一次畫面交換 (frameSwapped)"""
+    from OpenGL.GL import glFlush
+    interval = 1.0 / refresh
+    end = time.perf_counter() + seconds
+    next_swap = time.perf_counter() + interval
+    while True:
+        now = time.perf_counter()
+        if now >= end: break
+        ready.wait(max(0.0, min(next_swap, end) - now))
+        if ready.is_set():
+            ready.clear()
+            for consumer in consumers: consumer.check_frame()
+            glFlush()
+        now = time.perf_counter()
+        if now >= next_swap:
+            next_swap = max(next_swap + interval, now)
+            for consumer in consumers: consumer.swapped()
+
+
+def run_overview_loop(consumers, atlas, seconds, fps, view):
+    """主執行緒：與 OverviewWidget 相同，每 1/fps 秒更新一次有變動的縮圖"""
+    from OpenGL.GL import glFlush
+    from rdp_overview import grid_layout
+    atlas.resize(*view)
+    for consumer, rect in zip(consumers, grid_layout(len(consumers), *view)): consumer.tile.rect = rect
+    interval = 1.0 / fps
+    end = time.perf_counter() + seconds
+    next_tick = time.perf_counter()
+    while True:
+        now = time.perf_counter()
+        if now >= end: break
+        if now < next_tick:
+            time.sleep(min(next_tick, end) - now)
+            continue
+        next_tick = max(next_tick + interval, now)
+        for consumer in consumers: consumer.refresh()
+        glFlush()
+
+
+def percentile(values, q):
+    if not values: return 0.0
+    values = sorted(values)
+    return values[min(len(values) - 1, int(q * len(values)))]
+
+
+def run(workload, width, height, sessions, args):
+    backends = start_sessions(sessions, width, height, args.depth, workload)
+    check_torn = workload == 'stress'
+    scheduler = SessionScheduler()
+    ready = threading.Event()
+    atlas = None
+    if args.consumer == 'gl':
+        consumers = [GLConsumer(b, ready, args.upload, not args.no_seqlock, check_torn) for b in backends]
+    elif args.consumer == 'overview':
+        from rdp_overview import ThumbnailAtlas
+        atlas = ThumbnailAtlas()
+        atlas.initialize()
+        consumers = [OverviewConsumer(b, atlas) for b in backends]
+    else:
+        consumers = [HeadlessConsumer(b, not args.no_seqlock, check_torn) for b in backends]
+    for backend, consumer in zip(backends, consumers):
+        scheduler.add(backend, on_frame=consumer.on_frame)
+    hidden = int(round(sessions * args.hidden))
+    for backend in backends[:hidden]: backend.set_visible(False)
+    # 暖機：等工作程序開始穩定發佈，之後重設統計
+    time.sleep(args.warmup)
+    for consumer in consumers: consumer.stats = SessionStats()
+    published = [read_stats(b.shm).active_steps for b in backends]
+    wakeups = scheduler.stats()[1]
+    cpu, start = time.process_time(), time.perf_counter()
+    if args.consumer == 'gl':
+        run_gl_loop(consumers, ready, args.seconds, args.refresh)
+    elif args.consumer == 'overview':
+        run_overview_loop(consumers, atlas, args.seconds, args.thumb_fps, args.view)
+    else:
+        time.sleep(args.seconds)
+    elapsed = time.perf_counter() - start
+    cpu = time.process_time() - cpu
+    wakeups = scheduler.stats()[1] - wakeups
+    published = sum(read_stats(b.shm).active_steps - p for b, p in zip(backends, published))
+    memory = rss_mb()
+    for backend in backends: scheduler.remove(backend)
+    scheduler.stop()
+    if args.consumer != 'headless':
+        for consumer in consumers: consumer.release()
+    if atlas: atlas.release()
+    for backend in backends: backend.close()
+
+    stats = [consumer.stats for consumer in consumers]
+    latencies = [v for s in stats for v in s.latencies]
+    consume = [v for s in stats for v in s.consume]
+    consumed = sum(s.frames for s in stats)
+    return {
+        'workload': workload, 'size': f"{width}x{height}", 'sessions': sessions, 'consumer': args.consumer,
+        'hidden': hidden, 'published_fps': published / elapsed, 'wakeups_per_s': wakeups / elapsed,
+        'consumed_fps': consumed / elapsed,
+        'coalesced': max(0.0, 1 - consumed / published) if published else 0.0,
+        'latency_p50_ms': percentile(latencies, 0.5) * 1000, 'latency_p95_ms': percentile(latencies, 0.95) * 1000,
+        'consume_p50_ms': percentile(consume, 0.5) * 1000, 'upload_mb_s': sum(s.nbytes for s in stats) / elapsed / 1e6,
+        'cpu_percent': cpu / elapsed * 100,
+        'rss_mb': memory, 'torn': sum(s.torn for s in stats), 'seqlock_failed': sum(s.failed for s in stats),
+    }
+
+
+COLUMNS = [('published_fps', '發佈 fps', 9, '.1f'), ('consumed_fps', '處理 fps', 9, '.1f'),
+           ('coalesced', '合併', 6, '.0%'),
+           ('wakeups_per_s', '喚醒/秒', 8, '.0f'),
+           ('latency_p50_ms', '延遲p50', 8, '.2f'), ('latency_p95_ms', '延遲p95', 8, '.2f'),
+           ('consume_p50_ms', '處理ms', 7, '.3f'), ('upload_mb_s', '上傳MB/s', 9, '.1f'),
+           ('cpu_percent', 'CPU%', 6, '.1f'), ('rss_mb', 'RSS MB', 7, '.0f'),
+           ('torn', '撕裂', 5, 'd'), ('seqlock_failed', '失敗', 5, 'd')]
+
+
+def result_key(result):
+    return result['workload'], result['size'], result['sessions'], result.get('hidden', 0), result['consumer']
+
+
+def print_header():
+    print(f"{'工作負載':<10} {'解析度':>10} {'連線':>4} {'隱藏':>4} "
+          + " ".join(f"{title:>{width}}" for _, title, width, _ in COLUMNS))
+
+
+def print_result(result, baseline=None):
+    cells = []
+    for key, _, width, fmt in COLUMNS:
+        value = result[key]
+        cells.append(f"{value:>{width}{fmt}}" if value is not None else f"{'-':>{width}}")
+    print(f"{result['workload']:<10} {result['size']:>10} {result['sessions']:>4} {result['hidden']:>4} "
+          + " ".join(cells))
+    if baseline:
+        deltas = []
+        for key, _, width, _ in COLUMNS:
+            old, new = baseline.get(key), result[key]
+            if not old or new is None or key in ('torn', 'seqlock_failed'): deltas.append(f"{'':>{width}}")
+            else: deltas.append(f"{(new - old) / old:>+{width}.0%}")
+        print(f"{'  vs 基準':<10} {'':>10} {'':>4} {'':>4} " + " ".join(deltas))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--workloads', default='idle,typing,scrolling,video')
+    parser.add_argument('--sizes', default='1280x720,1920x1080')
+    parser.add_argument('--sessions', default='1,4')
+    parser.add_argument('--seconds', type=float, default=5)
+    parser.add_argument('--warmup', type=float, default=1)
+    parser.add_argument('--depth', type=int, choices=(16, 32), default=32)
+    parser.add_argument('--consumer', choices=('headless', 'gl', 'overview'), default='headless')
+    parser.add_argument('--upload', default='auto',
+                        help="gl 消費端的上傳模式 (auto / direct / pbo / pbo-persistent)")
+    parser.add_argument('--refresh', type=float, default=60, help="gl 消費端模擬的螢幕更新率")
+    parser.add_argument('--no-seqlock', action='store_true',
+                        help="不驗證序號直接讀取 (確認撕裂檢查有效)")
+    parser.add_argument('--thumb-fps', type=float, default=5, help="overview 消費端的縮圖更新頻率")
+    parser.add_argument('--view', default='1920x1080', help="overview 消費端的總覽畫面大小 (圖集大小)")
+    parser.add_argument('--hidden', type=float, default=0, help="設為看不到 (暫停畫面輸出) 的連線比例")
+    parser.add_argument('--save', help="把結果存成 JSON，供之後 --compare")
+    parser.add_argument('--compare', help="與之前 --save 的結果比較")
+    args = parser.parse_args()
+
+    workloads = args.workloads.split(',')
+    for workload in workloads:
+        if workload not in WORKLOADS: parser.error(f"未知的工作負載: {workload}")
+    sizes = [tuple(map(int, size.split('x'))) for size in args.sizes.split(',')]
+    args.view = tuple(map(int, args.view.split('x')))
+    counts = [int(n) for n in args.sessions.split(',')]
+    baseline = {}
+    if args.compare:
+        with open(args.compare, encoding='utf-8') as f:
+            baseline = {result_key(r): r for r in json.load(f)['results']}
+
+    context = None
+    if args.consumer != 'headless':
+        from bench_texture_upload import make_context
+        context = make_context()
+        from OpenGL.GL import glGetString, GL_RENDERER
+        print(f"renderer: {glGetString(GL_RENDERER).decode()}")
+    print(f"消費端 {args.consumer}，色深 {args.depth}，每項 {args.seconds:g} 秒"
+          f"{'，不使用 seqlock' if args.no_seqlock else ''}")
+    print_header()
+    results = []
+    for workload in workloads:
+        for width, height in sizes:
+            for count in counts:
+                result = run(workload, width, height, count, args)
+                results.append(result)
+                print_result(result, baseline.get(result_key(result)))
+    if len(results) > 1:
+        # 工作程序啟動的訊息會穿插在上面的表格中，最後再整理一次
+        print()
+        print_header()
+        for result in results: print_result(result, baseline.get(result_key(result)))
+    if args.save:
+        with open(args.save, 'w', encoding='utf-8') as f:
+            json.dump({'args': vars(args), 'results': results}, f, ensure_ascii=False, indent=1)
+    del context
+    torn = sum(result['torn'] for result in results)
+    if torn and not args.no_seqlock: sys.exit(f"\n失敗: 讀到 {torn} 個撕裂的幀")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,155 @@
+"""鍵盤轉換路徑微基準：比較舊的鉤子/_map_key 與查表版本每個按鍵事件的耗時
+
+以 ctypes 緩衝區模擬 KBDLLHOOKSTRUCT，Win32 API (GetForegroundWindow、winId、MapVirtualKeyW、CallNextHookEx)
+以 Python 函式代替，因此量到的是 Python 端的額外負擔；
+實際的 Win32 呼叫只會讓呼叫次數較多的舊路徑更慢。
+
+    python benchmarks/bench_keymap.py [--events 200000]
+"""
+import argparse
+import ctypes
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+from rdp_keymap import (HOOK_KEYS, ScancodeTable, VK_LCONTROL, VK_RCONTROL, VK_LMENU, VK_RMENU,
+                        VK_LWIN, VK_RWIN)
+
+WM_KEYDOWN = 0x0100
+WM_SYSKEYDOWN = 0x0104
+KEY_DOWN_MESSAGES = frozenset((WM_KEYDOWN, WM_SYSKEYDOWN))
+LLKHF_EXTENDED = 0x01
+RDP_HWND = 0x1234
+OTHER_HWND = 0x5678
+
+# 美式鍵盤配置的部分 VK -> 掃描碼
+_US_LAYOUT = {0x41: 0x1E, 0x53: 0x1F, 0x44: 0x20, 0x46: 0x21, 0x20: 0x39, 0x0D: 0x1C,
+              0x25: 0x4B, 0x26: 0x48, 0x27: 0x4D, 0x28: 0x50, 0xA2: 0x1D, 0xA4: 0x38}
+
+
+class KBDLLHOOKSTRUCT(ctypes.Structure):
+    _fields_ = [
+        ("vkCode", ctypes.c_uint32),
+        ("scanCode", ctypes.c_uint32),
+        ("flags", ctypes.c_uint32),
+        ("time", ctypes.c_uint32),
+        ("dwExtraInfo", ctypes.c_void_p),
+    ]
+
+
+class Stubs:
+    """代替 Win32 API 的 Python 函式"""
+    def __init__(self, foreground):
+        self.foreground = foreground
+
+    def GetForegroundWindow(self): return self.foreground
+    def winId(self): return RDP_HWND
+    def CallNextHookEx(self, hook, code, wparam, lparam): return 0
+    def MapVirtualKeyW(self, vk, mode): return _US_LAYOUT.get(vk, 0)
+
+
+class FakeInput:
+    def __init__(self): self.count = 0
+    def key(self, scancode, is_down, is_extended): self.count += 1
+
+
+def legacy_hook(stubs, send, nCode, wParam, lParam):
+    """舊版 GlobalKeyboardHook.hook_callback"""
+    if nCode == 0:
+        kb = KBDLLHOOKSTRUCT.from_address(lParam)
+        vk = kb.vkCode
+        targets = [VK_LCONTROL, VK_RCONTROL, VK_LMENU, VK_RMENU, VK_LWIN, VK_RWIN]
+        if vk in targets:
+            active_hwnd = stubs.GetForegroundWindow()
+            target_hwnd = int(stubs.winId())
+            if active_hwnd == target_hwnd:
+                is_down = wParam in [WM_KEYDOWN, WM_SYSKEYDOWN]
+                scancode = 0
+                is_ext = (kb.flags & LLKHF_EXTENDED) != 0
+                if vk in [VK_LCONTROL, VK_RCONTROL]:
+                    scancode = 0x1D
+                    is_ext = (vk == VK_RCONTROL)
+                elif vk in [VK_LMENU, VK_RMENU]:
+                    scancode = 0x38
+                    is_ext = (vk == VK_RMENU)
+                elif vk == VK_LWIN:
+                    scancode = 0x5B
+                    is_ext = True
+                elif vk == VK_RWIN:
+                    scancode = 0x5C
+                    is_ext = True
+                if scancode > 0:
+                    send.key(scancode, is_down, is_ext)
+                return 1
+    return stubs.CallNextHookEx(None, nCode, wParam, lParam)
+
+
+def fast_hook(stubs, send, target_hwnd, nCode, wParam, lParam):
+    """與 GlobalKeyboardHook.hook_callback 相同的邏輯"""
+    if nCode == 0 and target_hwnd:
+        key = HOOK_KEYS.get(ctypes.c_uint32.from_address(lParam).value)
+        if key is not None and stubs.GetForegroundWindow() == target_hwnd:
+            send.key(key[0], wParam in KEY_DOWN_MESSAGES, key[1])
+            return 1
+    return stubs.CallNextHookEx(None, nCode, wParam, lParam)
+
+
+# 舊版 _map_key 每次以十個 Qt.Key 屬性建立清單再比對，這裡以 VK 代替 Qt.Key，
+# 同樣每次建立清單
+_EXTENDED_KEYS = (0x26, 0x28, 0x25, 0x27, 0x2D, 0x2E, 0x24, 0x23, 0x21, 0x22)
+
+
+def legacy_map_key(stubs, vk):
+    if vk > 0:
+        sc = stubs.MapVirtualKeyW(vk, 0)
+        ext = vk in [_EXTENDED_KEYS[0], _EXTENDED_KEYS[1], _EXTENDED_KEYS[2], _EXTENDED_KEYS[3], _EXTENDED_KEYS[4],
+                     _EXTENDED_KEYS[5], _EXTENDED_KEYS[6], _EXTENDED_KEYS[7], _EXTENDED_KEYS[8], _EXTENDED_KEYS[9]]
+        return sc, ext
+    return 0, False
+
+
+def time_per_event(fn, events):
+    start = time.perf_counter()
+    for args in events: fn(*args)
+    return (time.perf_counter() - start) / len(events) * 1e9
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--events', type=int, default=200000)
+    args = parser.parse_args()
+
+    letters = [0x41, 0x53, 0x44, 0x46, 0x20, 0x0D]
+    modifiers = [VK_LCONTROL, VK_LMENU]
+    structs = {vk: KBDLLHOOKSTRUCT(vkCode=vk) for vk in letters + modifiers + [0x26, 0x28]}
+    address = {vk: ctypes.addressof(s) for vk, s in structs.items()}
+
+    def hook_events(vks):
+        return [(0, WM_KEYDOWN if i % 2 == 0 else 0x0101, address[vks[i % len(vks)]]) for i in range(args.events)]
+
+    send = FakeInput()
+    table = ScancodeTable(Stubs(0).MapVirtualKeyW)
+    scenarios = [
+        ("鉤子：一般按鍵，RDP 視窗在背景", letters, OTHER_HWND, 0),
+        ("鉤子：一般按鍵，RDP 視窗在前景", letters, RDP_HWND, RDP_HWND),
+        ("鉤子：修飾鍵，RDP 視窗在前景", modifiers, RDP_HWND, RDP_HWND),
+    ]
+    print(f"{'路徑':<28} {'舊版 ns':>9} {'查表 ns':>9} {'倍數':>6}")
+    for name, vks, foreground, target in scenarios:
+        stubs = Stubs(foreground)
+        events = hook_events(vks)
+        legacy = time_per_event(lambda n, w, l: legacy_hook(stubs, send, n, w, l), events)
+        fast = time_per_event(lambda n, w, l: fast_hook(stubs, send, target, n, w, l), events)
+        print(f"{name:<28} {legacy:>9.0f} {fast:>9.0f} {legacy / fast:>6.1f}")
+
+    stubs = Stubs(RDP_HWND)
+    vks = [(letters + [0x26, 0x28])[i % 8] for i in range(args.events)]
+    legacy = time_per_event(lambda vk: legacy_map_key(stubs, vk), [(vk,) for vk in vks])
+    fast = time_per_event(table.lookup, [(vk,) for vk in vks])
+    print(f"{'_map_key':<28} {legacy:>9.0f} {fast:>9.0f} {legacy / fast:>6.1f}")
+
+
+if __name__ == "__main__":
+    main()
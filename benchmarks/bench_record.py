@@ -0,0 +1,192 @@
+"""錄影吞吐量基準測試：靜態桌面與全畫面動態兩種情境
+
+以 SyntheticProducer 依設定的幀率發佈畫面，Recorder 錄到暫存檔，量測：
+擷取端 (seqlock 讀取區段內複製) 每幀耗時、寫入端 (圖塊比對 + 壓縮) 每幀耗時、丟幀數，
+以及輸出大小與直接存原始畫面的比較。發佈端即代表繪製路徑，
+錄影只在自己的執行緒中工作。
+
+    python benchmarks/bench_record.py [--size 1920x1080] [--fps 30] [--seconds 5] [--lossless]
+
+畫面至少 640x360；發佈端發生例外時以非零結束代碼結束。
+"""
+import argparse
+import os
+import sys
+import tempfile
+import threading
+import time
+
+import numpy as np
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+# desktop_frame 的視窗與文字列、static_desktop 的時鐘需要的最小畫面
+MIN_WIDTH, MIN_HEIGHT = 640, 360
+
+from rdp_record import Recorder, RecordingPlayer
+from rdp_session import RdpSession
+from rdp_shm import ShmMapping, SyntheticProducer
+
+
+class SyntheticBackend:
+    """RdpSession 需要的最小後端"""
+    def __init__(self, producer):
+        self.mapping = ShmMapping(producer.open)
+        self.mapping.remap()
+
+    def send_input_batch(self, events): pass
+    def close(self): self.mapping.close()
+
+
+class TimedSource:
+    """記錄擷取端在讀取區段內花費的時間"""
+    def __init__(self, session):
+        self.session = session
+        self.seconds = 0.0
+        self.calls = 0
+
+    def read(self, fn):
+        start = time.perf_counter()
+        try:
+            return self.session.read(fn)
+        finally:
+            self.seconds += time.perf_counter() - start
+            self.calls += 1
+
+
+class TimedRecorder(Recorder):
+    write_seconds = 0.0
+
+    def _write_frame(self, *item):
+        start = time.perf_counter()
+        super()._write_frame(*item)
+        self.write_seconds += time.perf_counter() - start
+
+
+def desktop_frame(width, height):
+    """類似桌面的畫面：純色背景、視窗與幾列「文字」"""
+    frame = np.empty((height, width, 4), np.uint8)
+    frame[:] = (90, 60, 20, 255)
+    frame[80:height - 120, 160:width - 160] = (240, 240, 240, 255)
+    rng = np.random.default_rng(1)
+    for row in range(120, height - 200, 24):
+        frame[row:row + 12, 200:width - 400] = rng.integers(0, 2, (12, width - 600, 1), np.uint8) * 200 + 30
+    return frame
+
+
+def static_desktop(producer, frame, i):
+    """靜態桌面 (位置依畫面大小)：每幀只有游標閃爍與輸入文字的一小塊，
+    每秒更新一次時鐘"""
+    span = producer.width // 2
+    caret_y = producer.height * 3 // 8
+    if i % 15 == 0:
+        color = (0, 0, 0, 255) if i % 30 else (240, 240, 240, 255)
+        producer.fill_rect(producer.width // 6 + (i // 15) * 9 % span, caret_y, 2, 18, color)
+    producer.write_rect(producer.width // 8 + (i * 9) % span, caret_y + 30, 8, 16,
+                        np.ascontiguousarray(frame[120:136, 200:208]))
+    if i % 30 == 0:
+        clock = np.ascontiguousarray(frame[120:140, 200:300])
+        producer.write_rect(producer.width - 120, producer.height - 30, 100, 20, clock)
+
+
+def full_motion(producer, frames, i):
+    """全畫面動態 (影片、捲動)：每幀整張改變"""
+    producer.write_rect(0, 0, producer.width, producer.height, frames[i % len(frames)])
+
+
+def motion_frames(width, height, count=8):
+    """平滑漸層加上少量雜訊，壓縮特性接近影片內容"""
+    rng = np.random.default_rng(2)
+    y, x = np.mgrid[0:height, 0:width]
+    frames = []
+    for k in range(count):
+        base = (np.sin((x + k * 40) / 90.0) + np.cos((y - k * 25) / 70.0)) * 60 + 128
+        frame = np.empty((height, width, 4), np.uint8)
+        for c in range(3):
+            frame[:, :, c] = np.clip(base + c * 20 + rng.integers(-8, 8, (height, width)), 0, 255)
+        frame[:, :, 3] = 255
+        frames.append(frame)
+    return frames
+
+
+def run(name, width, height, fps, seconds, paint, content, lossy):
+    producer = SyntheticProducer(width, height)
+    producer.write_rect(0, 0, width, height, desktop_frame(width, height))
+    producer.step()
+    session = RdpSession(SyntheticBackend(producer))
+    source = TimedSource(session)
+    path = tempfile.mktemp(suffix='.rdprec')
+    recorder = TimedRecorder(source, path, lossy=lossy)
+    stop = threading.Event()
+    frames = 0
+    errors = []
+
+    def publisher():
+        nonlocal frames
+        period = 1.0 / fps
+        next_time = time.perf_counter()
+        try:
+            while not stop.is_set():
+                paint(producer, content, frames)
+                producer.step()
+                recorder.notify()
+                frames += 1
+                next_time += period
+                delay = next_time - time.perf_counter()
+                if delay > 0: time.sleep(delay)
+        except Exception as e:
+            errors.append(e)
+            stop.set()
+            raise
+
+    thread = threading.Thread(target=publisher)
+    thread.start()
+    stop.wait(seconds)
+    stop.set()
+    thread.join()
+    stopped = time.perf_counter()
+    recorder.stop()
+    drain = time.perf_counter() - stopped
+    if errors:
+        if os.path.exists(path): os.remove(path)
+        session.close()
+        producer.close()
+        sys.exit(f"失敗: {name} 的發佈端發生例外: {errors[0]!r}")
+
+    raw = width * height * 4 * frames
+    size = os.path.getsize(path)
+    with RecordingPlayer(path) as player:
+        start = time.perf_counter()
+        decoded = sum(1 for _ in player.frames())
+        decode = (time.perf_counter() - start) / max(decoded, 1) * 1000
+    os.remove(path)
+    session.close()
+    producer.close()
+    written = recorder.captured
+    print(f"{name:<12} {frames:>5} {written:>5} {recorder.dropped:>5} "
+          f"{source.seconds / max(source.calls, 1) * 1000:>8.2f} "
+          f"{recorder.write_seconds / max(written, 1) * 1000:>8.2f} {decode:>8.2f} "
+          f"{raw / seconds / 1e6:>9.1f} {size / seconds / 1e6:>9.2f} {raw / size:>8.0f}x {drain:>6.2f}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--size', default='1920x1080')
+    parser.add_argument('--fps', type=int, default=30)
+    parser.add_argument('--seconds', type=float, default=5)
+    parser.add_argument('--lossless', action='store_true', help="動態畫面也只用 zlib (不使用 JPEG)")
+    args = parser.parse_args()
+    width, height = map(int, args.size.split('x'))
+    if width < MIN_WIDTH or height < MIN_HEIGHT: parser.error(f"--size 至少 {MIN_WIDTH}x{MIN_HEIGHT}")
+
+    print(f"{args.size} @ {args.fps} fps，{args.seconds:g} 秒")
+    print(f"{'情境':<12} {'發佈':>5} {'錄下':>5} {'丟幀':>5} "
+          f"{'擷取 ms':>8} {'寫入 ms':>8} {'播放 ms':>8} "
+          f"{'原始 MB/s':>9} {'輸出 MB/s':>9} {'壓縮比':>9} {'收尾 s':>6}")
+    lossy = not args.lossless
+    run("靜態桌面", width, height, args.fps, args.seconds, static_desktop, desktop_frame(width, height), lossy)
+    run("全畫面動態", width, height, args.fps, args.seconds, full_motion, motion_frames(width, height), lossy)
+
+
+if __name__ == "__main__":
+    main()
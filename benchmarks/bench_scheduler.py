@@ -0,0 +1,140 @@
+"""排程器基準測試：比較「每連線兩條執行緒」與共用 SessionScheduler 的喚醒次數與 CPU
+
+以管線 (pipe) 模擬 FreeRDP 的事件句柄，一條流量執行緒依設定的比例讓部分連線
+以固定幀率產生活動，其餘連線保持閒置。舊模式為每個連線一條 5 ms 逾時的心跳迴圈
++ 一條等待幀事件的監看執行緒。
+
+    python benchmarks/bench_scheduler.py [--sessions 1,4,16,32] [--seconds 3] [--active 0.25] [--fps 30]
+"""
+import argparse
+import os
+import select
+import sys
+import threading
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+from rdp_scheduler import POLL_FRAME, POLL_IDLE, SelectWaiter, SessionScheduler
+
+
+class FakeSession:
+    """模擬 RdpBackend：讀取端 fd 可讀代表有網路資料，poll() 讀完後回報發佈了一幀"""
+    def __init__(self):
+        self.read_fd, self.write_fd = os.pipe()
+        os.set_blocking(self.read_fd, False)
+        os.set_blocking(self.write_fd, False)
+
+    def get_event_handles(self): return [self.read_fd]
+
+    def poll(self):
+        try:
+            data = os.read(self.read_fd, 4096)
+        except BlockingIOError:
+            return POLL_IDLE
+        return POLL_FRAME if data else POLL_IDLE
+
+    def send(self):
+        try:
+            os.write(self.write_fd, b'\1')
+        except BlockingIOError:
+            pass
+
+    def close(self):
+        os.close(self.read_fd); os.close(self.write_fd)
+
+
+class Counter:
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.frames = 0
+
+    def frame(self, session=None):
+        with self.lock: self.frames += 1
+
+
+def traffic(sessions, active_ratio, fps, stop):
+    """讓前 active_ratio 比例的連線以 fps 產生活動"""
+    active = sessions[:max(1, int(len(sessions) * active_ratio))] if active_ratio > 0 else []
+    interval = 1.0 / fps
+    next_t = time.perf_counter()
+    while not stop.is_set():
+        for s in active: s.send()
+        next_t += interval
+        time.sleep(max(0.0, next_t - time.perf_counter()))
+
+
+def run_legacy(sessions, counter, stop):
+    """舊架構：HeartbeatThread (5 ms 等待 + step) 與 FrameWatcherThread (等待幀事件)"""
+    wakeups = [0]
+    lock = threading.Lock()
+
+    def count():
+        with lock: wakeups[0] += 1
+
+    threads = []
+    for s in sessions:
+        frame_r, frame_w = os.pipe()
+
+        def heartbeat(s=s, frame_w=frame_w):
+            while not stop.is_set():
+                select.select([s.read_fd], [], [], 0.005)
+                count()
+                if s.poll() == POLL_FRAME: os.write(frame_w, b'\1')
+
+        def watcher(frame_r=frame_r):
+            while not stop.is_set():
+                ready, _, _ = select.select([frame_r], [], [], 0.5)
+                count()
+                if ready:
+                    os.read(frame_r, 4096)
+                    counter.frame()
+
+        threads += [threading.Thread(target=heartbeat, daemon=True), threading.Thread(target=watcher, daemon=True)]
+    for t in threads: t.start()
+    return len(threads), lambda: wakeups[0], lambda: [t.join() for t in threads]
+
+
+def run_scheduler(sessions, counter, stop):
+    scheduler = SessionScheduler(waiter_factory=SelectWaiter)
+    for s in sessions: scheduler.add(s, on_frame=counter.frame)
+    return len(scheduler.loops), lambda: scheduler.stats()[1], scheduler.stop
+
+
+def measure(mode, count, seconds, active_ratio, fps):
+    sessions = [FakeSession() for _ in range(count)]
+    counter = Counter()
+    stop = threading.Event()
+    runner = run_legacy if mode == 'legacy' else run_scheduler
+    threads, wakeups, shutdown = runner(sessions, counter, stop)
+    feeder = threading.Thread(target=traffic, args=(sessions, active_ratio, fps, stop), daemon=True)
+    time.sleep(0.2)  # 暖機
+    w0, f0, cpu0, t0 = wakeups(), counter.frames, time.process_time(), time.perf_counter()
+    feeder.start()
+    time.sleep(seconds)
+    w1, f1, cpu1, t1 = wakeups(), counter.frames, time.process_time(), time.perf_counter()
+    stop.set()
+    shutdown()
+    feeder.join()
+    for s in sessions: s.close()
+    elapsed = t1 - t0
+    return threads, (w1 - w0) / elapsed, (f1 - f0) / elapsed, (cpu1 - cpu0) / elapsed * 100
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--sessions', default='1,4,16,32')
+    parser.add_argument('--seconds', type=float, default=3.0)
+    parser.add_argument('--active', type=float, default=0.25, help='有畫面活動的連線比例')
+    parser.add_argument('--fps', type=float, default=30.0)
+    args = parser.parse_args()
+
+    print(f"{'sessions':>8} {'mode':>10} {'threads':>8} {'wakeups/s':>10} {'frames/s':>9} {'cpu %':>7}")
+    for count in (int(n) for n in args.sessions.split(',')):
+        for mode in ('legacy', 'scheduler'):
+            threads, wakeups, frames, cpu = measure(mode, count, args.seconds, args.active, args.fps)
+            print(f"{count:>8} {mode:>10} {threads:>8} {wakeups:>10.0f} {frames:>9.1f} {cpu:>7.1f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,106 @@
+"""seqlock 撕裂壓力測試：另一個程序不間斷地寫入，讀取端不得讀到混了兩幀的畫面
+
+寫入端在子程序中以 rdp_shm.SyntheticProducer 對一般的檔案映射 (mmap) 寫入：每一幀把整個畫面
+填成即將發佈的 frameId 的低位元組，再發佈標頭 (與 DLL 相同的 seqlock 寫入區段)。
+主程序映射同一個檔案，在 read_consistent 內抽樣讀取各列，
+檢查是否都等於標頭 frameId 的低位元組。
+
+讀到任何撕裂的畫面時以非零結束代碼結束，可放在 CI 中。
+--no-seqlock 略過序號驗證直接讀取，應該會讀到撕裂，用來確認檢查本身有效。
+
+    python benchmarks/bench_seqlock.py [--seconds 3] [--size 640x360] [--rows 16] [--no-seqlock]
+"""
+import argparse
+import mmap
+import multiprocessing
+import os
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+from rdp_shm import SHM_HEADER_SIZE, SyntheticProducer, calc_shm_size, read_consistent, read_header
+
+
+def writer_main(path, width, height, stop):
+    """子程序：不間斷地以單一顏色填滿整個畫面並發佈"""
+    def alloc(size, generation):
+        with open(path, 'r+b') as f:
+            return mmap.mmap(f.fileno(), size)
+    producer = SyntheticProducer(width, height, alloc=alloc)
+    while not stop.is_set():
+        value = (producer.frame_id + 1) & 0xFF
+        producer.fill_rect(0, 0, width, height, bytes((value,)) * producer.bpp)
+        producer.step()
+    producer.close()
+
+
+def torn_rows(buf, header, rows):
+    """抽樣檢查的列中，內容不是 frameId 低位元組的列數"""
+    expected = bytes((header.frame_id & 0xFF,))
+    row_bytes = header.width * 4
+    step = max(1, header.height // rows)
+    torn = 0
+    for y in range(0, header.height, step):
+        offset = SHM_HEADER_SIZE + y * header.stride
+        if buf[offset:offset + row_bytes].strip(expected): torn += 1
+    return torn
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--seconds', type=float, default=3.0)
+    parser.add_argument('--size', default='640x360')
+    parser.add_argument('--rows', type=int, default=16, help="每幀抽樣檢查的列數")
+    parser.add_argument('--no-seqlock', action='store_true',
+                        help="不驗證序號直接讀取 (確認撕裂檢查有效)")
+    args = parser.parse_args()
+    width, height = map(int, args.size.split('x'))
+
+    size = calc_shm_size(width, height)
+    fd, path = tempfile.mkstemp(prefix='rdpseqlock_')
+    with os.fdopen(fd, 'wb') as f: f.truncate(size)
+    with open(path, 'r+b') as f: buf = mmap.mmap(f.fileno(), size)
+
+    context = multiprocessing.get_context('spawn')
+    stop = context.Event()
+    writer = context.Process(target=writer_main, args=(path, width, height, stop), daemon=True)
+    writer.start()
+    checked = torn = failed = 0
+    last_fid = None
+    try:
+        # 等寫入端發佈第一幀
+        deadline = time.time() + 10
+        while read_header(buf).width == 0 and time.time() < deadline: time.sleep(0.01)
+        end = time.time() + args.seconds
+        while time.time() < end:
+            if args.no_seqlock:
+                header = read_header(buf)
+                ok, result = True, torn_rows(buf, header, args.rows)
+            else:
+                ok, result = read_consistent(buf, lambda header, attempt: (header, torn_rows(buf, header, args.rows)))
+                if ok: header, result = result
+            if not ok:
+                failed += 1
+                continue
+            if header.frame_id == last_fid: continue
+            last_fid = header.frame_id
+            checked += 1
+            if result: torn += 1
+    finally:
+        stop.set()
+        writer.join(5)
+        if writer.is_alive(): writer.terminate()
+        buf.close()
+        os.remove(path)
+
+    print(f"{width}x{height}，{args.seconds:g} 秒{'，不使用 seqlock' if args.no_seqlock else ''}："
+          f"檢查 {checked} 幀，撕裂 {torn} 幀，被寫入端打斷而放棄 {failed} 次")
+    if checked == 0: sys.exit("失敗: 沒有讀到任何幀")
+    if torn and not args.no_seqlock: sys.exit(f"失敗: 讀到 {torn} 個撕裂的幀")
+    print("通過" if not args.no_seqlock else "(--no-seqlock 時預期會讀到撕裂)")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,112 @@
+"""啟動時間基準測試：從啟動 Python 到登入對話框顯示的時間 (冷啟動)
+
+每一輪啟動新的子程序，與 rdp_client_gpu.main() 相同地匯入啟動程式、建立 QApplication
+並顯示登入對話框，量測從建立子程序到對話框畫出的時間，
+並檢查此時沒有匯入較重的模組 (PyOpenGL、numpy、OpenCV、PySide6 OpenGL、連線視窗)
+也沒有載入 RdpBridge.dll，這些應該在對話框顯示後才於背景載入。
+第一輪以 -X importtime 執行，列出本身耗時最多的匯入。
+
+超過 --budget-ms 或對話框顯示前匯入了較重的模組時以非零結束代碼結束，
+可放在 CI 中防止啟動變慢。
+
+    python benchmarks/bench_startup.py [--runs 5] [--budget-ms 1500] [--top 10]
+
+在 Linux 上以 QT_QPA_PLATFORM=offscreen 執行，不需視窗與 RdpBridge.dll。
+"""
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+import time
+
+ROOT = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..')
+
+# 對話框顯示前不應匯入的模組
+HEAVY_MODULES = ('OpenGL', 'numpy', 'cv2', 'PySide6.QtOpenGL', 'PySide6.QtOpenGLWidgets',
+                 'rdp_window', 'rdp_render', 'rdp_texture', 'rdp_session', 'rdp_record', 'rdp_overview')
+
+# 子程序：重現 rdp_client_gpu.main() 顯示對話框前的步驟，輸出一行 JSON 結果
+CHILD = r"""
+import json, sys, time
+import rdp_client_gpu
+from rdp_metrics import startup
+startup.mark("匯入對話框")
+from PySide6.QtWidgets import QApplication
+app = QApplication(sys.argv)
+startup.mark("建立 QApplication")
+dialog = rdp_client_gpu.show_login_dialog()
+app.processEvents()
+shown = time.time()
+heavy = sorted(m for m in sys.modules if any(m == h or m.startswith(h + '.') for h in HEAVY))
+backend = sys.modules.get('rdp_backend')
+print("RESULT " + json.dumps({'shown': shown, 'phases': startup.phases, 'heavy': heavy,
+                              'bridge_loaded': getattr(backend, '_bridge', None) is not None}))
+"""
+
+
+def run_once(importtime=False):
+    env = dict(os.environ)
+    env.setdefault('QT_QPA_PLATFORM', 'offscreen')
+    args = [sys.executable] + (['-X', 'importtime'] if importtime else [])
+    args += ['-c', f"HEAVY = {HEAVY_MODULES!r}\n" + CHILD]
+    start = time.time()
+    proc = subprocess.run(args, cwd=ROOT, env=env, capture_output=True, text=True, encoding='utf-8')
+    lines = [line for line in proc.stdout.splitlines() if line.startswith("RESULT ")]
+    if proc.returncode != 0 or not lines:
+        sys.exit(f"子程序失敗 (結束代碼 {proc.returncode}):\n{proc.stderr[-2000:]}")
+    result = json.loads(lines[-1][len("RESULT "):])
+    result['to_dialog'] = result['shown'] - start
+    result['importtime'] = proc.stderr if importtime else ""
+    return result
+
+
+def top_imports(stderr, count):
+    """解析 -X importtime 的輸出，
+    回傳本身 (不含其匯入的模組) 耗時最多的匯入 [(模組, 毫秒)]"""
+    entries = []
+    for line in stderr.splitlines():
+        if not line.startswith("import time:") or "cumulative" in line: continue
+        own, _, name = line[len("import time:"):].split("|")
+        entries.append((name.strip(), int(own) / 1000))
+    return sorted(entries, key=lambda entry: -entry[1])[:count]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--runs', type=int, default=5)
+    parser.add_argument('--budget-ms', type=float, default=1500,
+                        help="對話框顯示時間 (中位數) 的上限，0 為不檢查")
+    parser.add_argument('--top', type=int, default=10, help="列出耗時最多的前幾個匯入")
+    args = parser.parse_args()
+
+    results = [run_once(importtime=(i == 0)) for i in range(args.runs + 1)]
+    # 第一輪 (-X importtime) 只用來列出匯入耗時，也順便讓檔案系統快取暖機
+    profile, results = results[0], results[1:]
+    times = [result['to_dialog'] * 1000 for result in results]
+    median = statistics.median(times)
+
+    print(f"{'階段':<16}{'中位數 (ms)':>12}")
+    for phase in results[0]['phases']:
+        print(f"{phase:<16}{statistics.median(result['phases'][phase] * 1000 for result in results):>12.0f}")
+    print(f"{'對話框顯示':<16}{median:>12.0f}   "
+          f"(最小 {min(times):.0f} / 最大 {max(times):.0f}，{args.runs} 輪，含直譯器啟動)")
+
+    print("\n本身耗時最多的匯入 (-X importtime)：")
+    for name, ms in top_imports(profile['importtime'], args.top):
+        print(f"  {name:<40}{ms:>8.1f} ms")
+
+    failures = []
+    heavy = sorted({module for result in results for module in result['heavy']})
+    if heavy: failures.append(f"對話框顯示前匯入了較重的模組: {', '.join(heavy)}")
+    if any(result['bridge_loaded'] for result in results): failures.append("對話框顯示前載入了 RdpBridge.dll")
+    if args.budget_ms and median > args.budget_ms:
+        failures.append(f"對話框顯示時間 {median:.0f} ms 超過上限 {args.budget_ms:.0f} ms")
+    for failure in failures: print(f"\n失敗: {failure}")
+    if failures: sys.exit(1)
+    print("\n通過")
+
+
+if __name__ == '__main__':
+    main()
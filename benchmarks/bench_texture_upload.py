@@ -0,0 +1,117 @@
+"""紋理上傳基準測試：比較 direct / pbo / pbo-persistent 各解析度的每幀上傳時間
+
+在無視窗環境下建立離屏 GL context (Qt offscreen，失敗時改用 EGL surfaceless，例如 Mesa llvmpipe)，
+以 SyntheticProducer 產生畫面，量測 GUI 執行緒被阻塞的時間 (cpu)
+與含 glFinish 的總時間 (total)。
+
+    python benchmarks/bench_texture_upload.py [--frames 60] [--damage 0.1]
+"""
+import argparse
+import ctypes
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+SIZES = [(800, 600), (1920, 1080), (2560, 1440), (3840, 2160)]
+MODES = ['direct', 'pbo', 'pbo-persistent']
+
+
+def _qt_context():
+    os.environ.setdefault('QT_QPA_PLATFORM', 'offscreen')
+    # Linux 上 Qt offscreen 以 EGL 建立 context，
+    # PyOpenGL 要用同一平台才查得到目前的 context (頂點陣列等需要)
+    if sys.platform.startswith('linux'): os.environ.setdefault('PYOPENGL_PLATFORM', 'egl')
+    from PySide6.QtGui import QGuiApplication, QOffscreenSurface, QOpenGLContext
+    app = QGuiApplication.instance() or QGuiApplication(sys.argv[:1])
+    ctx = QOpenGLContext()
+    surface = QOffscreenSurface()
+    surface.create()
+    if not ctx.create() or not ctx.makeCurrent(surface): return None
+    return app, ctx, surface
+
+
+def _egl_context():
+    os.environ['PYOPENGL_PLATFORM'] = 'egl'
+    os.environ.setdefault('EGL_PLATFORM', 'surfaceless')
+    from OpenGL import EGL
+    dpy = EGL.eglGetDisplay(EGL.EGL_DEFAULT_DISPLAY)
+    major, minor = EGL.EGLint(), EGL.EGLint()
+    if not EGL.eglInitialize(dpy, ctypes.pointer(major), ctypes.pointer(minor)): return None
+    attrs = (EGL.EGLint * 5)(EGL.EGL_SURFACE_TYPE, EGL.EGL_PBUFFER_BIT,
+                             EGL.EGL_RENDERABLE_TYPE, EGL.EGL_OPENGL_BIT, EGL.EGL_NONE)
+    config, count = EGL.EGLConfig(), EGL.EGLint()
+    if not EGL.eglChooseConfig(dpy, attrs, ctypes.pointer(config), 1, ctypes.pointer(count)) or not count.value:
+        return None
+    EGL.eglBindAPI(EGL.EGL_OPENGL_API)
+    size = (EGL.EGLint * 5)(EGL.EGL_WIDTH, 16, EGL.EGL_HEIGHT, 16, EGL.EGL_NONE)
+    surface = EGL.eglCreatePbufferSurface(dpy, config, size)
+    ctx = EGL.eglCreateContext(dpy, config, EGL.EGL_NO_CONTEXT, None)
+    if not EGL.eglMakeCurrent(dpy, surface, surface, ctx): return None
+    return dpy, ctx, surface
+
+
+def make_context():
+    """建立並綁定一個離屏 GL context，回傳需保持存活的物件"""
+    try:
+        handle = _qt_context()
+        if handle: return handle
+    except ImportError:
+        pass
+    handle = _egl_context()
+    if not handle: sys.exit("無法建立離屏 OpenGL context")
+    return handle
+
+
+def run(frames, damage_ratio):
+    from OpenGL.GL import glGenTextures, glDeleteTextures, glFinish, glGetString, GL_RENDERER
+    from rdp_shm import SHM_HEADER_SIZE, SyntheticProducer, read_header, plan_upload
+    from rdp_texture import create_uploader
+
+    print(f"renderer: {glGetString(GL_RENDERER).decode()}")
+    print(f"{'size':>10} {'mode':>15} {'damage':>7} {'cpu ms':>8} {'total ms':>9} {'MB/s':>8}")
+    for width, height in SIZES:
+        producer = SyntheticProducer(width, height)
+        pixel_ptr = ctypes.addressof(ctypes.c_char.from_buffer(producer.shm)) + SHM_HEADER_SIZE
+        dw, dh = max(1, int(width * damage_ratio ** 0.5)), max(1, int(height * damage_ratio ** 0.5))
+        for mode in MODES:
+            texture_id = glGenTextures(1)
+            uploader = create_uploader(texture_id, mode)
+            if uploader.mode != mode:
+                print(f"{width}x{height:<5} {mode:>15}  (不支援)")
+                glDeleteTextures([texture_id])
+                continue
+            last_fid = 0
+            cpu = total = 0.0
+            uploaded = 0
+            for i in range(frames + 1):
+                producer.fill_rect((i * 37) % (width - dw + 1), (i * 23) % (height - dh + 1), dw, dh,
+                                   bytes((i & 0xFF, 0x40, 0x80, 0xFF)))
+                producer.step()
+                header = read_header(producer.shm)
+                rects = plan_upload(header, last_fid, uploader.width, uploader.height)
+                last_fid = header.frame_id
+                t0 = time.perf_counter()
+                uploader.upload(pixel_ptr, header.width, header.height, header.stride, rects)
+                t1 = time.perf_counter()
+                glFinish()
+                t2 = time.perf_counter()
+                if i == 0: continue  # 第一幀為配置紋理的整張上傳
+                cpu += t1 - t0
+                total += t2 - t0
+                uploaded += sum(w * h * 4 for _, _, w, h in rects)
+            uploader.release()
+            glDeleteTextures([texture_id])
+            print(f"{width}x{height:<5} {mode:>15} {damage_ratio:>7.2f} {cpu / frames * 1000:>8.3f} "
+                  f"{total / frames * 1000:>9.3f} {uploaded / total / 1e6 if total else 0:>8.1f}")
+        producer.close()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--frames', type=int, default=60)
+    parser.add_argument('--damage', type=float, default=1.0, help='每幀變動面積比例 (1.0 = 整張)')
+    args = parser.parse_args()
+    handle = make_context()
+    run(args.frames, args.damage)
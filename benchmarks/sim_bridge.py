@@ -0,0 +1,291 @@
+"""模擬的 RdpBridge：依腳本產生畫面的發佈端，供端對端基準測試使用
+
+SimulatedBridge 在工作程序 (rdp_worker) 中取代 RdpBackend：繪製執行緒以 SyntheticProducer
+依工作負載寫入與 DLL 相同的標頭 + 像素版面配置 (具名共享記憶體)，每發佈一幀就喚醒
+工作程序的排程器。主程序拿到的是一般的 WorkerBackend，消費端走 MappedBackend.check_new_frame
+等與實際連線相同的程式碼；
+發佈端在另一個程序，不與消費端搶 GIL，也能測出跨程序同時讀寫時的撕裂。
+
+每幀左上角的前 8 bytes 為發佈時的 time.perf_counter() (系統層級的單調時鐘，跨程序可比較)，
+消費端在 seqlock 讀取區段內讀出即可算出發佈到處理完成的延遲。
+標頭的接收量以繪製面積除以 SIM_COMPRESSION 模擬，處理時間為繪製耗時，
+供 rdp_profile.LinkMonitor 使用；
+set_frame_rate 與 DLL 相同，上限內的繪製合併到下一次發佈。
+
+工作負載：
+    idle       閒置桌面：每 0.5 秒游標閃爍、每秒更新時鐘
+    typing     打字：每秒 12 個字元加上游標
+    scrolling  捲動：內容區域 (約 80%) 每幀上移 20 列
+    video      全畫面動態：每幀改變整個畫面
+    stress     撕裂測試：不間斷地以單一顏色 (frameId 的低位元組) 填滿整個畫面
+"""
+import mmap
+import os
+import struct
+import sys
+import tempfile
+import threading
+import time
+
+import numpy as np
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+from rdp_scheduler import POLL_FRAME, POLL_IDLE
+from rdp_shm import SHM_FORMAT_BGRA32, SHM_FORMAT_RGB565, SyntheticProducer, write_link_stats
+from rdp_worker import Win32Event
+
+WORKLOADS = ('idle', 'typing', 'scrolling', 'video', 'stress')
+# 各工作負載的目標幀率 (None 為不限速)
+WORKLOAD_FPS = {'idle': 10, 'typing': 30, 'scrolling': 30, 'video': 30, 'stress': None}
+# 模擬的壓縮率：伺服器送出的資料量 = 繪製的像素位元組 / SIM_COMPRESSION
+SIM_COMPRESSION = 20
+
+_STAMP = struct.Struct('<d')
+STAMP_BYTES = _STAMP.size
+
+_SHM_DIR = '/dev/shm' if os.path.isdir('/dev/shm') else tempfile.gettempdir()
+
+
+def shm_base(index):
+    """模擬連線的共享記憶體基底名稱 (實際名稱為 <基底>_<世代>)"""
+    if sys.platform == 'win32': return f"Local\\RdpBenchShm_{os.getpid()}_{index}"
+    return os.path.join(_SHM_DIR, f"rdpbench_{os.getpid()}_{index}")
+
+
+def read_stamp(view):
+    """從畫面 (frame_view 的陣列) 讀出發佈時間"""
+    pixel_bytes = view.itemsize * (view.shape[2] if view.ndim == 3 else 1)
+    return _STAMP.unpack(view[0, :STAMP_BYTES // pixel_bytes].tobytes())[0]
+
+
+class Workload:
+    """依腳本繪製的畫面內容；paint(i) 繪製第 i 幀 (不含時間戳記)，
+    回傳 False 表示這個 tick 不發佈"""
+    def __init__(self, producer, seed=1):
+        self.producer = producer
+        self.rng = np.random.default_rng(seed)
+        self.width, self.height = producer.width, producer.height
+        self.bpp = producer.bpp
+
+    def pixel(self, b, g, r):
+        if self.producer.format == SHM_FORMAT_RGB565:
+            return (((r >> 3) << 11) | ((g >> 2) << 5) | (b >> 3)).to_bytes(2, 'little')
+        return bytes((b, g, r, 255))
+
+    def block(self, h, w):
+        """隨機內容的像素區塊 (連續記憶體)"""
+        return self.rng.integers(0, 256, (h, w * self.bpp), np.uint8)
+
+    def setup(self):
+        self.producer.fill_rect(0, 0, self.width, self.height, self.pixel(90, 60, 20))
+
+    def paint(self, i):
+        raise NotImplementedError
+
+
+class IdleWorkload(Workload):
+    def paint(self, i):
+        if i % 5 == 0:
+            color = self.pixel(0, 0, 0) if i % 10 else self.pixel(240, 240, 240)
+            self.producer.fill_rect(self.width // 3, self.height // 2, 2, 18, color)
+        if i % 10 == 0:
+            self.producer.write_rect(self.width - 120, self.height - 30, 100, 20, self.block(20, 100))
+        return i % 5 == 0
+
+
+class TypingWorkload(Workload):
+    def paint(self, i):
+        if i % 15 == 0:
+            color = self.pixel(0, 0, 0) if i % 30 else self.pixel(240, 240, 240)
+            self.producer.fill_rect(self.width // 4, self.height // 3, 2, 18, color)
+        typed = i % 3 == 0 and self.width > 200
+        if typed:
+            column = (i // 3) % ((self.width // 2) // 9)
+            self.producer.write_rect(self.width // 4 + column * 9, self.height // 3 + 24, 8, 16, self.block(16, 8))
+        return typed or i % 15 == 0
+
+
+class ScrollingWorkload(Workload):
+    STEP = 20
+
+    def setup(self):
+        super().setup()
+        self.x, self.y = self.width // 10, self.height // 10
+        self.w, self.h = self.width - 2 * self.x, self.height - 2 * self.y
+        # 兩頁高的文件，捲到底時從頭開始
+        self.page = self.block(self.h * 2, self.w)
+
+    def paint(self, i):
+        offset = (i * self.STEP) % self.h
+        self.producer.write_rect(self.x, self.y, self.w, self.h,
+                                 np.ascontiguousarray(self.page[offset:offset + self.h]))
+        return True
+
+
+class VideoWorkload(Workload):
+    def setup(self):
+        super().setup()
+        self.frames = [self.block(self.height, self.width) for _ in range(4)]
+
+    def paint(self, i):
+        self.producer.write_rect(0, 0, self.width, self.height, self.frames[i % len(self.frames)])
+        return True
+
+
+class StressWorkload(Workload):
+    """整個畫面填成同一個值 (即將發佈的 frameId 的低位元組)，
+    消費端檢查讀到的畫面是否混了兩幀"""
+    def paint(self, i):
+        value = (self.producer.frame_id + 1) & 0xFF
+        self.producer.fill_rect(0, 0, self.width, self.height, bytes((value,)) * self.bpp)
+        return True
+
+
+WORKLOAD_CLASSES = {'idle': IdleWorkload, 'typing': TypingWorkload, 'scrolling': ScrollingWorkload,
+                    'video': VideoWorkload, 'stress': StressWorkload}
+
+
+def frame_is_torn(view, frame_id, rows=16):
+    """stress 工作負載：
+    抽樣檢查各列 (跳過有時間戳記的第一列) 是否都是 frameId 的低位元組"""
+    expected = frame_id & 0xFF
+    step = max(1, (view.shape[0] - 1) // rows)
+    sample = view[1::step].view(np.uint8)
+    return bool((sample != expected).any())
+
+
+def _named_alloc(base):
+    if sys.platform == 'win32':
+        return lambda size, generation: mmap.mmap(-1, size, tagname=f"{base}_{generation}")
+
+    def alloc(size, generation):
+        with open(f"{base}_{generation}", 'w+b') as f:
+            f.truncate(size)
+            return mmap.mmap(f.fileno(), size)
+    return alloc
+
+
+class SimulatedBridge:
+    """在工作程序中取代 RdpBackend 的模擬發佈端 (排程器介面 + 具名共享記憶體)"""
+    def __init__(self, config):
+        self.base = config['shm_base']
+        fmt = SHM_FORMAT_RGB565 if config['color_depth'] == 16 else SHM_FORMAT_BGRA32
+        self.producer = SyntheticProducer(config['width'], config['height'], fmt=fmt, alloc=_named_alloc(self.base))
+        self.shm_name = f"{self.base}_{self.producer.generation}"
+        self.workload = WORKLOAD_CLASSES[config['workload']](self.producer, config.get('seed', 1))
+        self.workload.setup()
+        self.fps = config.get('fps') or WORKLOAD_FPS[config['workload']]
+        # 喚醒工作程序的排程器：Windows 為事件 (WaitForMultipleObjects)，其他平台為管線 (select)
+        if sys.platform == 'win32':
+            self.event = Win32Event(None, create=True)
+        else:
+            self.read_fd, self.write_fd = os.pipe()
+            os.set_blocking(self.read_fd, False)
+            os.set_blocking(self.write_fd, False)
+        self.lock = threading.Lock()
+        self.published = 0
+        self.running = True
+        # set_visible(False) 模擬 Suppress Output：伺服器停止送出畫面，恢復時整張重繪
+        self.visible = True
+        self.refresh = False
+        # set_frame_rate 的發佈間隔 (秒)，held 為上限內尚未發佈的繪製
+        self.frame_interval = 0
+        self.last_publish = 0
+        self.held = False
+        self.received = 0
+        self.busy = 0.0
+        self._publish()
+        self.thread = threading.Thread(target=self._paint_loop, daemon=True, name="SimulatedBridge")
+        self.thread.start()
+
+    def _publish(self):
+        now = time.perf_counter()
+        if self.frame_interval and now - self.last_publish < self.frame_interval:
+            self.held = True
+            return False
+        producer, damage = self.producer, self.producer.damage
+        area = producer.width * producer.height if damage.full else sum(w * h for _, _, w, h in damage.rects)
+        self.received += area * producer.bpp // SIM_COMPRESSION
+        write_link_stats(producer.shm, self.received // 1024, int(self.busy * 1e6))
+        producer.write_rect(0, 0, STAMP_BYTES // producer.bpp, 1, _STAMP.pack(now))
+        producer.step()
+        self.published += 1
+        self.last_publish, self.held = now, False
+        return True
+
+    def _paint_loop(self):
+        period = 1.0 / self.fps if self.fps else 0
+        next_time = time.perf_counter()
+        i = 0
+        while self.running:
+            with self.lock:
+                published = False
+                if self.visible:
+                    start = time.perf_counter()
+                    published = self.workload.paint(i) or self.refresh or self.held
+                    self.busy += time.perf_counter() - start
+                    self.refresh = False
+                if published: published = self._publish()
+            if published: self._wake()
+            i += 1
+            if not period:
+                time.sleep(0)
+                continue
+            next_time += period
+            delay = next_time - time.perf_counter()
+            if delay > 0: time.sleep(delay)
+
+    def _wake(self):
+        if sys.platform == 'win32':
+            self.event.set()
+            return
+        try:
+            os.write(self.write_fd, b'\x01')
+        except BlockingIOError:
+            pass  # 管線已滿，排程器本來就會被喚醒
+
+    def get_event_handles(self):
+        return [self.event.handle] if sys.platform == 'win32' else [self.read_fd]
+
+    def poll(self):
+        if sys.platform != 'win32':
+            try:
+                while os.read(self.read_fd, 4096): pass
+            except BlockingIOError:
+                pass
+        with self.lock:
+            published, self.published = self.published, 0
+        return POLL_FRAME if published else POLL_IDLE
+
+    def send_input_batch(self, events): pass
+    def sync_locks(self, num_lock, caps_lock, scroll_lock): pass
+
+    def set_visible(self, visible):
+        with self.lock:
+            if visible and not self.visible: self.refresh = True
+            self.visible = visible
+
+    def set_frame_rate(self, fps):
+        with self.lock:
+            self.frame_interval = 1.0 / fps if fps > 0 else 0
+
+    def close(self):
+        self.running = False
+        self.thread.join()
+        self.producer.close()
+        if sys.platform == 'win32':
+            self.event.close()
+        else:
+            os.close(self.read_fd)
+            os.close(self.write_fd)
+            for generation in range(1, self.producer.generation + 1):
+                try:
+                    os.remove(f"{self.base}_{generation}")
+                except FileNotFoundError:
+                    pass
+
+
+def create_simulated_bridge(config, job, reuse):
+    """rdp_worker.WorkerBackend 的 factory"""
+    return SimulatedBridge(config)
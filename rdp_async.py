@@ -0,0 +1,217 @@
+"""asyncio 介面
+
+讓 asyncio 服務直接控制 RDP 連線，不需要 Qt 事件迴圈：握手在連線執行緒池進行，
+畫面與斷線由共用的 SessionScheduler 偵測後以 call_soon_threadsafe 轉回事件迴圈，
+因此一個事件迴圈可同時處理大量連線，不為每個連線建立執行緒或任務。
+
+    session = await connect("192.168.1.201", username="Admin", password="...")
+    async for header in session.frames():      # 消費端較慢時只拿到最新的一幀
+        ...
+        await session.click(100, 200)
+    await session.wait_closed()
+"""
+import asyncio
+import threading
+
+from rdp_connect import ConnectPool, STATE_CONNECTED, STATE_CANCELLED, FINAL_STATES
+from rdp_input import InputQueue
+from rdp_metrics import registry
+from rdp_session import RdpSession, default_scheduler
+from rdp_worker import connect_backend
+
+_pool = None
+_pool_lock = threading.Lock()
+
+
+def default_pool():
+    """asyncio 連線共用的連線執行緒池 (第一次使用時建立)"""
+    global _pool
+    with _pool_lock:
+        if _pool is None:
+            _pool = ConnectPool(connect_backend)
+        return _pool
+
+
+class AsyncSession:
+    """RdpSession 的 asyncio 包裝，所有方法都必須在建立它的事件迴圈中呼叫"""
+    def __init__(self, session, loop=None):
+        self.session = session
+        self.loop = loop or asyncio.get_running_loop()
+        # 每次通知換一個新的 Event：等待者持有舊的 (已 set) Event，
+        # 不會因其他等待者 clear 而漏掉通知
+        self._frame_event = asyncio.Event()
+        self._notify_pending = False
+        self._closed = self.loop.create_future()
+        # 滑鼠移動合併到下一次事件迴圈迭代再送出
+        self.input = InputQueue(session.send, schedule=self.loop.call_soon)
+        session.add_listener(self._on_session_event)
+        if not session.connected: self._on_disconnect()
+
+    # --- 排程器執行緒 -> 事件迴圈 ---
+
+    def _on_session_event(self, session, connected):
+        try:
+            if not connected:
+                self.loop.call_soon_threadsafe(self._on_disconnect)
+            elif not self._notify_pending:
+                # 迴圈還沒處理上一次通知時不再排入，事件迴圈忙碌時不會堆積
+                self._notify_pending = True
+                self.loop.call_soon_threadsafe(self._wake)
+        except RuntimeError:
+            pass  # 事件迴圈已關閉
+
+    def _wake(self):
+        self._notify_pending = False
+        event, self._frame_event = self._frame_event, asyncio.Event()
+        event.set()
+
+    def _on_disconnect(self):
+        if not self._closed.done(): self._closed.set_result(None)
+        self._wake()
+
+    # --- 畫面 ---
+
+    @property
+    def connected(self):
+        return not self._closed.done()
+
+    def frame(self):
+        return self.session.frame()
+
+    def capture(self):
+        return self.session.capture()
+
+    async def wait_for_frame(self, after_fid=None, timeout=None):
+        """等待 frameId 與 after_fid 不同的畫面並回傳其 FrameHeader，逾時回傳 None，
+        斷線拋出 ConnectionError"""
+        if after_fid is None: after_fid = self.session.frame_id
+        try:
+            return await asyncio.wait_for(self._next_frame(after_fid), timeout)
+        except asyncio.TimeoutError:
+            return None
+
+    async def _next_frame(self, after_fid):
+        while True:
+            event = self._frame_event
+            header = self.session.header()
+            if header.width and header.frame_id != after_fid: return header
+            if not self.connected: raise ConnectionError("RDP 連線已中斷")
+            await event.wait()
+
+    async def frames(self):
+        """新幀通知的非同步迭代器，連線中斷時結束
+
+        不做緩衝：消費端處理較慢時中間的幀會被略過，下一次只拿到最新的 FrameHeader。
+        """
+        last = None
+        while True:
+            try:
+                header = await self._next_frame(last)
+            except ConnectionError:
+                return
+            last = header.frame_id
+            yield header
+
+    async def wait_closed(self):
+        """等待連線中斷或被關閉"""
+        await asyncio.shield(self._closed)
+
+    # --- 輸入 ---
+
+    async def move(self, x, y):
+        self.input.mouse_move(x, y)
+
+    async def send(self, events):
+        self.input.flush()
+        self.session.send(events)
+
+    async def click(self, x, y, button='left'):
+        self.input.flush()
+        self.session.click(x, y, button)
+
+    async def mouse_down(self, x, y, button='left'):
+        self.input.flush()
+        self.session.mouse_down(x, y, button)
+
+    async def mouse_up(self, x, y, button='left'):
+        self.input.flush()
+        self.session.mouse_up(x, y, button)
+
+    async def scroll(self, x, y, steps):
+        self.input.flush()
+        self.session.scroll(x, y, steps)
+
+    async def key_down(self, scancode, extended=False):
+        self.input.flush()
+        self.session.key_down(scancode, extended)
+
+    async def key_up(self, scancode, extended=False):
+        self.input.flush()
+        self.session.key_up(scancode, extended)
+
+    async def press(self, scancode, extended=False):
+        self.input.flush()
+        self.session.press(scancode, extended)
+
+    async def set_visible(self, visible):
+        """暫停 (False) 或恢復 (True) 伺服器送出畫面，暫停期間 frames() 不會產生新幀"""
+        self.session.set_visible(visible)
+
+    async def set_frame_rate(self, fps):
+        """發佈幀率上限 (0 為不限)，frames() 產生新幀的速率不會超過上限"""
+        self.session.set_frame_rate(fps)
+
+    # --- 結束 ---
+
+    async def close(self):
+        """送出剩餘輸入並關閉連線；移除排程器需等待其迴圈，
+        放到執行緒中避免阻塞事件迴圈"""
+        self.input.flush()
+        await self.loop.run_in_executor(None, self.session.close)
+        self._on_disconnect()
+
+    async def __aenter__(self): return self
+    async def __aexit__(self, *exc): await self.close()
+
+
+def _close_if_connected(job, state):
+    if state == STATE_CONNECTED: job.result.close()
+
+
+async def connect(server, port=3389, username="", password="", width=1024, height=768, color_depth=32,
+                  on_progress=None, pool=None, scheduler=None, worker=False, profile=None):
+    """在連線執行緒池中建立連線並回傳 AsyncSession
+
+    on_progress(state) 在事件迴圈中收到連線階段 (rdp_connect.STATE_*)；取消這個協程會中斷握手。
+    worker 為真時連線在獨立的工作程序中執行 (rdp_worker)；profile 為 rdp_profile.PROFILES 的名稱。
+    連線失敗時拋出 ConnectionError。
+    """
+    loop = asyncio.get_running_loop()
+    config = {'server': server, 'port': port, 'username': username, 'password': password,
+              'width': width, 'height': height, 'color_depth': color_depth, 'worker': worker, 'profile': profile}
+    done = loop.create_future()
+
+    def on_state(job, state):
+        def deliver():
+            if on_progress: on_progress(state)
+            if state in FINAL_STATES and not done.done(): done.set_result(state)
+        try:
+            loop.call_soon_threadsafe(deliver)
+        except RuntimeError:
+            pass  # 事件迴圈已關閉
+
+    job = (pool or default_pool()).submit(config)
+    job.add_listener(on_state)
+    try:
+        state = await done
+    except asyncio.CancelledError:
+        # 握手進行中取消時由 ConnectPool 釋放連線；已經 (或隨後才) 連線完成、
+        # 結果還沒送回事件迴圈時，job.cancel() 不再有作用，連線沒有交給任何人，
+        # 在這裡釋放 (也涵蓋 asyncio.wait_for 逾時)
+        job.cancel()
+        job.add_listener(_close_if_connected)
+        raise
+    if state == STATE_CANCELLED: raise ConnectionError(f"連線到 {server} 已取消")
+    if state != STATE_CONNECTED: raise ConnectionError(f"連線到 {server} 失敗: {job.error}") from job.error
+    session = RdpSession(job.result, scheduler or default_scheduler(), metrics=registry.register(server))
+    return AsyncSession(session, loop)
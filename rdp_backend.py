@@ -0,0 +1,166 @@
+"""RdpBridge.dll 的 ctypes 綁定與連線後端
+
+不依賴 Qt 與 OpenGL，GUI (rdp_window.py) 與無視窗的 RdpSession 共用。
+DLL 在第一次建立連線時才載入，單純匯入本模組不需要 DLL 存在。
+"""
+import ctypes
+import os
+import sys
+import threading
+
+from rdp_shm import SHM_HEADER_SIZE, ShmMapping, open_named_shm, read_header, read_stats
+from rdp_input import RdpbInputEvent, key_flags, pack_events
+from rdp_profile import RdpbProfile, to_native
+
+# --- DLL 設定 ---
+# 相對於本模組而非工作目錄，從其他目錄啟動 (捷徑、工作程序) 也找得到
+DLL_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "libs", "rdp")
+DLL_PATH = os.path.join(DLL_DIR, "RdpBridge.dll")
+
+RdpbProgressCallback = ctypes.CFUNCTYPE(None, ctypes.c_void_p, ctypes.c_int)
+
+_bridge = None
+_bridge_lock = threading.Lock()
+_dll_directory = None
+
+
+def load_bridge(path=DLL_PATH):
+    """載入 RdpBridge.dll 並定義 C 函數簽章 (只載入一次)，找不到 DLL 時拋出 OSError"""
+    global _bridge, _dll_directory
+    with _bridge_lock:
+        if _bridge is not None: return _bridge
+        if sys.platform == 'win32' and _dll_directory is None:
+            # FreeRDP、OpenSSL、FFmpeg 等相依 DLL 與 RdpBridge.dll 放在同一個資料夾
+            _dll_directory = os.add_dll_directory(os.path.dirname(os.path.abspath(path)))
+        rdp = ctypes.CDLL(path)
+        # 定義 C 函數簽章
+        rdp.rdpb_connect.argtypes = [ctypes.c_char_p, ctypes.c_int, ctypes.c_char_p, ctypes.c_char_p,
+                                     ctypes.c_int, ctypes.c_int, ctypes.c_int]
+        rdp.rdpb_connect.restype = ctypes.c_void_p
+        rdp.rdpb_job_new.argtypes = [RdpbProgressCallback, ctypes.c_void_p]
+        rdp.rdpb_job_new.restype = ctypes.c_void_p
+        rdp.rdpb_job_cancel.argtypes = [ctypes.c_void_p]
+        rdp.rdpb_job_free.argtypes = [ctypes.c_void_p]
+        rdp.rdpb_job_set_shm.argtypes = [ctypes.c_void_p, ctypes.c_char_p, ctypes.c_uint]
+        rdp.rdpb_job_set_profile.argtypes = [ctypes.c_void_p, ctypes.POINTER(RdpbProfile)]
+        rdp.rdpb_connect_with_job.argtypes = [ctypes.c_void_p, ctypes.c_char_p, ctypes.c_int, ctypes.c_char_p,
+                                              ctypes.c_char_p, ctypes.c_int, ctypes.c_int, ctypes.c_int]
+        rdp.rdpb_connect_with_job.restype = ctypes.c_void_p
+        rdp.rdpb_step.argtypes = [ctypes.c_void_p]
+        rdp.rdpb_step.restype = ctypes.c_int
+        rdp.rdpb_get_event_handles.argtypes = [ctypes.c_void_p, ctypes.POINTER(ctypes.c_void_p), ctypes.c_int]
+        rdp.rdpb_get_event_handles.restype = ctypes.c_int
+        rdp.rdpb_poll.argtypes = [ctypes.c_void_p]
+        rdp.rdpb_poll.restype = ctypes.c_int
+        rdp.rdpb_send_scancode.argtypes = [ctypes.c_void_p, ctypes.c_int, ctypes.c_int]
+        rdp.rdpb_send_mouse.argtypes = [ctypes.c_void_p, ctypes.c_int, ctypes.c_int, ctypes.c_int]
+        rdp.rdpb_send_input_batch.argtypes = [ctypes.c_void_p, ctypes.POINTER(RdpbInputEvent), ctypes.c_int]
+        rdp.rdpb_send_input_batch.restype = ctypes.c_int
+        rdp.rdpb_free.argtypes = [ctypes.c_void_p]
+        rdp.rdpb_get_shm_name.argtypes = [ctypes.c_void_p]
+        rdp.rdpb_get_shm_name.restype = ctypes.c_char_p
+        rdp.rdpb_sync_locks.argtypes = [ctypes.c_void_p, ctypes.c_int]
+        rdp.rdpb_set_visibility.argtypes = [ctypes.c_void_p, ctypes.c_int]
+        rdp.rdpb_set_visibility.restype = ctypes.c_int
+        rdp.rdpb_set_frame_rate.argtypes = [ctypes.c_void_p, ctypes.c_int]
+        rdp.rdpb_get_event_name.argtypes = [ctypes.c_void_p]
+        rdp.rdpb_get_event_name.restype = ctypes.c_char_p
+        _bridge = rdp
+        return rdp
+
+
+class MappedBackend:
+    """以共享記憶體提供畫面的後端共用介面，子類別需設定 mapping (ShmMapping) 與 shm_name"""
+    @property
+    def shm(self): return self.mapping.buf
+    def check_new_frame(self, last_fid):
+        """回傳最新的 FrameHeader，沒有新幀時回傳 None"""
+        if not self.shm: return None
+        if self.mapping.check():
+            print(f"[SHM] 已重新映射 {self.shm_name} ({self.mapping.map_size} bytes)")
+        header = read_header(self.shm)
+        if header.width == 0 or header.frame_id == last_fid: return None
+        return header
+    def get_frame_stats(self):
+        """發佈端統計：最新幀合併的繪製次數、
+        閒置/活動的 step 計數與累計的接收量/處理時間"""
+        return read_stats(self.shm) if self.shm else None
+    def get_shm_address(self): return self.mapping.address
+    def get_pixel_address(self): return self.mapping.address + SHM_HEADER_SIZE
+    def shm_reuse(self):
+        """重新連線時交給新實例的 (共享記憶體基底名稱, 世代)，沒有映射時回傳 None"""
+        if self.shm is None: return None
+        return self.shm_name.rsplit('_', 1)[0], self.mapping.generation
+
+
+class RdpBackend(MappedBackend):
+    def __init__(self, ip, port, user, password, width, height, color_depth, job=None, reuse=None, profile=None):
+        """建立連線 (阻塞直到握手完成)；傳入 ConnectJob 時回報進度並可由其取消
+
+        reuse 為已斷線、但仍保留映射的舊後端 (或其 shm_reuse() 的結果)：新實例以同一個名稱
+        開啟同一塊共享記憶體，不重新配置，畫面緩衝保留最後一幀直到新連線開始繪製。
+        profile 為 rdp_profile.Profile，None 時使用 DLL 內建的預設 (與 balanced 相同)。
+        """
+        self.rdp = load_bridge()
+        if job is None and profile is None:
+            self.instance = self.rdp.rdpb_connect(ip.encode(), port, user.encode(), password.encode(),
+                                                  width, height, color_depth)
+        else:
+            if job is None: progress = RdpbProgressCallback()
+            else: progress = RdpbProgressCallback(lambda user_data, state: job.report_native(state))
+            native_job = self.rdp.rdpb_job_new(progress, None)
+            if reuse is not None and not isinstance(reuse, tuple): reuse = reuse.shm_reuse()
+            if reuse is not None: self.rdp.rdpb_job_set_shm(native_job, reuse[0].encode(), reuse[1])
+            if profile is not None: self.rdp.rdpb_job_set_profile(native_job, ctypes.byref(to_native(profile)))
+            if job is not None: job.attach_native(lambda: self.rdp.rdpb_job_cancel(native_job))
+            try:
+                self.instance = self.rdp.rdpb_connect_with_job(native_job, ip.encode(), port, user.encode(),
+                                                               password.encode(), width, height, color_depth)
+            finally:
+                if job is not None: job.attach_native(None)
+                self.rdp.rdpb_job_free(native_job)
+        if not self.instance: raise Exception("RDP 連線失敗！")
+        self.event_name = self.rdp.rdpb_get_event_name(self.instance).decode('utf-8')
+        self._handles = (ctypes.c_void_p * 64)()
+        # 映射大小依標頭的 mapSize 決定，解析度變更時 DLL 換代，由 check_new_frame 重新映射
+        self.mapping = ShmMapping(self._open_shm)
+        if not self.mapping.remap():
+            self.rdp.rdpb_free(self.instance); self.instance = None
+            raise Exception("共享記憶體版本與 RdpBridge.dll 不符！")
+    def _open_shm(self, size):
+        self.shm_name = self.rdp.rdpb_get_shm_name(self.instance).decode('utf-8')
+        return open_named_shm(self.shm_name, size)
+    def step(self): return self.rdp.rdpb_step(self.instance) if self.instance else 0
+    def get_event_handles(self):
+        if not self.instance: return []
+        count = self.rdp.rdpb_get_event_handles(self.instance, self._handles, len(self._handles))
+        return self._handles[:count]
+    def poll(self): return self.rdp.rdpb_poll(self.instance) if self.instance else 0
+    def send_mouse(self, flags, x, y): 
+        if self.instance: self.rdp.rdpb_send_mouse(self.instance, flags, x, y)
+    def send_scancode(self, scancode, is_down, is_extended):
+        if self.instance: self.rdp.rdpb_send_scancode(self.instance, scancode, key_flags(is_down, is_extended))
+    def send_input_batch(self, events):
+        """依序送出 (type, flags, x, y) 事件清單，一次 DLL 呼叫"""
+        if self.instance: self.rdp.rdpb_send_input_batch(self.instance, pack_events(events), len(events))
+    def sync_locks(self, num_lock, caps_lock, scroll_lock):
+        if not self.instance: return
+        flags = 0
+        if scroll_lock: flags |= 1
+        if num_lock:    flags |= 2
+        if caps_lock:   flags |= 4
+        self.rdp.rdpb_sync_locks(self.instance, flags)
+    def set_visible(self, visible):
+        """visible 為 False 時要求伺服器暫停送出畫面 (Suppress Output)，
+        為 True 時恢復並整張重繪"""
+        if self.instance: self.rdp.rdpb_set_visibility(self.instance, int(bool(visible)))
+    def set_frame_rate(self, fps):
+        """發佈幀率上限 (0 為不限)，連線中即時生效；
+        伺服器的編碼設定要到重新連線才會改變"""
+        if self.instance: self.rdp.rdpb_set_frame_rate(self.instance, int(fps))
+    def close_instance(self):
+        """只釋放 DLL 實例；映射保留到重新連線的新實例接手同一塊共享記憶體為止"""
+        if self.instance: self.rdp.rdpb_free(self.instance); self.instance = None
+    def close(self):
+        self.close_instance()
+        self.mapping.close()
@@ -0,0 +1,181 @@
+"""背景連線
+
+rdpb_connect 包含 TCP/TLS/NLA 握手與失敗後的手動登入重試，可能耗時數秒。
+ConnectPool 將連線放到背景執行緒池，多個連線可同時建立，UI 執行緒不會被阻塞；
+每個連線以 ConnectJob 追蹤進度並可隨時取消；Backoff 提供斷線後自動重新連線的重試間隔。
+"""
+import random
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+# 連線進度 (ConnectJob.state)
+STATE_PENDING = 'pending'        # 等待工作執行緒
+STATE_RESOLVING = 'resolving'    # 解析主機名稱並建立 TCP 連線
+STATE_TLS = 'tls'                # TLS 握手
+STATE_NLA = 'nla'                # NLA (CredSSP) 驗證
+STATE_FALLBACK = 'fallback'      # NLA 失敗，改以手動登入重試
+STATE_CONNECTED = 'connected'
+STATE_FAILED = 'failed'
+STATE_CANCELLED = 'cancelled'
+FINAL_STATES = (STATE_CONNECTED, STATE_FAILED, STATE_CANCELLED)
+
+# RdpBridge.h 的 RDPB_CONNECT_* 對應
+NATIVE_STATES = {0: STATE_RESOLVING, 1: STATE_TLS, 2: STATE_NLA, 3: STATE_FALLBACK, 4: STATE_CONNECTED}
+
+STATE_LABELS = {
+    STATE_PENDING: "等待中",
+    STATE_RESOLVING: "正在連線",
+    STATE_TLS: "TLS 握手",
+    STATE_NLA: "NLA 驗證",
+    STATE_FALLBACK: "改用手動登入",
+    STATE_CONNECTED: "已連線",
+    STATE_FAILED: "連線失敗",
+    STATE_CANCELLED: "已取消",
+}
+
+# 同時進行握手的上限
+MAX_CONNECT_WORKERS = 8
+
+# 自動重新連線的退避間隔 (秒)：第一次很快重試 (短暫的 Wi-Fi/VPN 中斷)，之後加倍到上限
+RECONNECT_BASE_DELAY = 0.5
+RECONNECT_MAX_DELAY = 30.0
+RECONNECT_JITTER = 0.5
+
+
+class ConnectJob:
+    """單一連線的進度、結果與取消
+
+    監聽函式 (job, state) 在狀態改變的執行緒中呼叫，通常是工作執行緒；
+    需要更新 UI 時請透過 Qt signal 轉回主執行緒。
+    options 為傳給 connect_fn 的額外參數 (例如重新連線時要接手的舊連線)。
+    """
+    def __init__(self, config, options=None):
+        self.config = config
+        self.options = options or {}
+        self.state = STATE_PENDING
+        self.result = None
+        self.error = None
+        self.cancelled = False
+        self._listeners = []
+        self._lock = threading.Lock()
+        self._native_cancel = None
+        self._done = threading.Event()
+
+    def add_listener(self, fn):
+        with self._lock:
+            self._listeners.append(fn)
+            state = self.state
+        # 已經有進度時立即通知一次，避免註冊太晚錯過結果
+        if state != STATE_PENDING: fn(self, state)
+
+    def set_state(self, state):
+        with self._lock:
+            if self.state in FINAL_STATES or state == self.state: return
+            self.state = state
+            listeners = list(self._listeners)
+        for fn in listeners: fn(self, state)
+
+    def report_native(self, code):
+        """原生進度回呼 (RDPB_CONNECT_*)；最終狀態由 ConnectPool 在取得結果後設定"""
+        state = NATIVE_STATES.get(code)
+        if state and state not in FINAL_STATES: self.set_state(state)
+
+    def attach_native(self, cancel_fn):
+        """連線期間登記原生取消函式 (rdpb_job_cancel)，傳入 None 解除"""
+        with self._lock:
+            self._native_cancel = cancel_fn
+            cancelled = self.cancelled
+        if cancelled and cancel_fn: cancel_fn()
+
+    def cancel(self):
+        with self._lock:
+            if self.state in FINAL_STATES: return
+            self.cancelled = True
+            cancel_fn = self._native_cancel
+            pending = self.state == STATE_PENDING
+        if cancel_fn: cancel_fn()
+        if pending: self._finish(STATE_CANCELLED)
+
+    def _finish(self, state, result=None, error=None):
+        self.result, self.error = result, error
+        self.set_state(state)
+        self._done.set()
+
+    def done(self):
+        return self._done.is_set()
+
+    def wait(self, timeout=None):
+        """等待連線結束，回傳是否已結束"""
+        return self._done.wait(timeout)
+
+
+class ConnectPool:
+    """以執行緒池建立連線
+
+    connect_fn(job) 在工作執行緒中執行並回傳已連線的物件 (例如 RdpBackend)，
+    失敗時拋出例外；連線期間可呼叫 job.report_native() 回報進度、job.attach_native() 登記取消。
+    """
+    def __init__(self, connect_fn, max_workers=MAX_CONNECT_WORKERS):
+        self.connect_fn = connect_fn
+        self.executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="RdpConnect")
+        self.jobs = set()
+        self.lock = threading.Lock()
+
+    def submit(self, config, **options):
+        job = ConnectJob(config, options)
+        with self.lock: self.jobs.add(job)
+        self.executor.submit(self._run, job)
+        return job
+
+    def _run(self, job):
+        try:
+            self._connect(job)
+        finally:
+            with self.lock: self.jobs.discard(job)
+
+    def _connect(self, job):
+        if job.cancelled: return
+        try:
+            result = self.connect_fn(job)
+        except Exception as e:
+            job._finish(STATE_CANCELLED if job.cancelled else STATE_FAILED, error=e)
+            return
+        if job.cancelled:
+            # 取消時握手剛好完成：釋放連線，不交給呼叫端
+            close = getattr(result, 'close', None)
+            if close: close()
+            job._finish(STATE_CANCELLED)
+            return
+        job._finish(STATE_CONNECTED, result=result)
+
+    def shutdown(self):
+        """取消所有未完成的連線並停止接受新工作"""
+        with self.lock: jobs = list(self.jobs)
+        for job in jobs: job.cancel()
+        self.executor.shutdown(wait=False, cancel_futures=True)
+
+
+class Backoff:
+    """指數退避加隨機抖動
+
+    第 n 次重試等待 min(cap, base * factor^n) 再乘上 [1 - jitter, 1) 的隨機比例，
+    避免同一台伺服器的多個連線在網路恢復的同一瞬間一起重連。
+    """
+    def __init__(self, base=RECONNECT_BASE_DELAY, cap=RECONNECT_MAX_DELAY, factor=2.0, jitter=RECONNECT_JITTER,
+                 rng=random.random):
+        self.base = base
+        self.cap = cap
+        self.factor = factor
+        self.jitter = jitter
+        self.rng = rng
+        self.attempts = 0
+
+    def next_delay(self):
+        """回傳下一次重試前的等待秒數並累計次數"""
+        delay = min(self.cap, self.base * self.factor ** min(self.attempts, 32))
+        self.attempts += 1
+        return delay * (1.0 - self.jitter * self.rng())
+
+    def reset(self):
+        """連線成功後呼叫，下次斷線重新從 base 開始"""
+        self.attempts = 0
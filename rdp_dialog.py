@@ -2,6 +2,8 @@ from PySide6.QtWidgets import (QDialog, QVBoxLayout, QHBoxLayout, QLabel,
                                QLineEdit, QPushButton, QFormLayout, QSpinBox, 
                                QCheckBox, QComboBox, QMessageBox)
 
+from rdp_profile import DEFAULT_PROFILE, PROFILE_CHOICES
+
 class RDPLoginDialog(QDialog):
     def __init__(self, parent=None):
         super().__init__(parent)
@@ -43,6 +45,22 @@ class RDPLoginDialog(QDialog):
         form.addRow("解析度:", self.res_input) # 改用單一欄位
         form.addRow("色彩深度 (Bit):", self.color_input)
 
+        # 圖形管線設定檔：編碼 (H.264/AVC444)、快取、桌面效果與幀率上限，
+        # 自動調整時依連線狀況切換
+        self.profile_input = QComboBox()
+        for name, label in PROFILE_CHOICES: self.profile_input.addItem(label, name)
+        self.profile_input.setCurrentIndex(self.profile_input.findData(DEFAULT_PROFILE))
+        form.addRow("連線設定檔:", self.profile_input)
+
+        # 短暫斷線 (Wi-Fi/VPN) 時保留視窗與畫面，在背景以退避間隔重新連線
+        self.reconnect_input = QCheckBox("斷線時自動重新連線")
+        self.reconnect_input.setChecked(True)
+        form.addRow("", self.reconnect_input)
+
+        # 連線在獨立的工作程序中執行：多核心並行，RdpBridge.dll 當掉只影響這個連線
+        self.worker_input = QCheckBox("在獨立程序中執行連線")
+        form.addRow("", self.worker_input)
+
         layout.addLayout(form)
 
         btn_layout = QHBoxLayout()
@@ -78,7 +96,10 @@ class RDPLoginDialog(QDialog):
             'password': self.pwd_input.text(),
             'width': width,
             'height': height,
-            'color_depth': int(self.color_input.currentText())
+            'color_depth': int(self.color_input.currentText()),
+            'auto_reconnect': self.reconnect_input.isChecked(),
+            'worker': self.worker_input.isChecked(),
+            'profile': self.profile_input.currentData()
         }
         self.accept()
 
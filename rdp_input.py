@@ -0,0 +1,98 @@
+"""輸入事件佇列
+
+Qt 的滑鼠移動事件頻率跟著滑鼠回報率 (高回報率滑鼠每秒 500~1000 次)，逐一呼叫
+rdpb_send_mouse 代表每個事件一次 ctypes 呼叫與一個 FreeRDP 輸入 PDU。
+InputQueue 將連續的移動合併為最後的位置，在下一個 tick 以 rdpb_send_input_batch
+一次送出；按鈕、滾輪與鍵盤事件立即送出，排在它之前的移動會先一起送出，
+事件之間的先後順序不變。
+"""
+import ctypes
+
+# 與 RdpBridge.h 的 RDPB_INPUT_* 一致
+INPUT_MOUSE = 0
+INPUT_KEYBOARD = 1
+
+# rdpb_send_mouse 的 flags：0 為移動
+MOUSE_MOVE = 0
+
+# 移動事件最長延遲 (毫秒)，約為 120 Hz 的一幀
+MOVE_FLUSH_MS = 8
+
+
+class RdpbInputEvent(ctypes.Structure):
+    """與 RdpBridge.h 的 RdpbInputEvent 一致；鍵盤事件的 x 為掃描碼"""
+    _fields_ = [
+        ('type', ctypes.c_int),
+        ('flags', ctypes.c_int),
+        ('x', ctypes.c_int),
+        ('y', ctypes.c_int),
+    ]
+
+
+def pack_events(events):
+    """將 (type, flags, x, y) 清單轉為 RdpbInputEvent 陣列"""
+    array = (RdpbInputEvent * len(events))()
+    for i, (kind, flags, x, y) in enumerate(events):
+        ev = array[i]
+        ev.type, ev.flags, ev.x, ev.y = kind, flags, x, y
+    return array
+
+
+def key_flags(is_down, is_extended):
+    """rdpb_send_scancode 的 flags"""
+    return (1 if is_down else 0) | (2 if is_extended else 0)
+
+
+class InputQueue:
+    """合併滑鼠移動、批次送出輸入事件
+
+    send_batch(events) 收到依序排列的 (type, flags, x, y) 清單；schedule(fn) 安排稍後 (下一個 tick)
+    呼叫 fn，為 None 時移動事件留在佇列中直到呼叫端 flush() 或下一個非移動事件。
+    只能在同一個執行緒 (UI 執行緒) 使用。
+    """
+    def __init__(self, send_batch, schedule=None):
+        self.send_batch = send_batch
+        self.schedule = schedule
+        self.pending = []
+        self.scheduled = False
+        self.received = 0   # 收到的事件數
+        self.sent = 0       # 合併後實際送出的事件數
+        self.batches = 0    # send_batch 呼叫次數
+
+    def mouse_move(self, x, y):
+        self.received += 1
+        event = (INPUT_MOUSE, MOUSE_MOVE, x, y)
+        # 只合併緊接著的移動，之前若有按鈕事件則保留在它之後
+        if self.pending and self.pending[-1][0] == INPUT_MOUSE and self.pending[-1][1] == MOUSE_MOVE:
+            self.pending[-1] = event
+        else:
+            self.pending.append(event)
+        if self.schedule and not self.scheduled:
+            self.scheduled = True
+            self.schedule(self._tick)
+
+    def mouse(self, flags, x, y):
+        if flags == MOUSE_MOVE:
+            self.mouse_move(x, y)
+        else:
+            self._push((INPUT_MOUSE, flags, x, y))
+
+    def key(self, scancode, is_down, is_extended):
+        self._push((INPUT_KEYBOARD, key_flags(is_down, is_extended), scancode, 0))
+
+    def _push(self, event):
+        self.received += 1
+        self.pending.append(event)
+        self.flush()
+
+    def _tick(self):
+        self.scheduled = False
+        self.flush()
+
+    def flush(self):
+        """送出佇列中的所有事件"""
+        if not self.pending: return
+        events, self.pending = self.pending, []
+        self.sent += len(events)
+        self.batches += 1
+        self.send_batch(events)
@@ -0,0 +1,59 @@
+"""鍵盤掃描碼查表
+
+全域鍵盤鉤子對整台電腦的每一次按鍵都會執行，鉤子處理得慢會拖慢所有程式的打字；
+因此 VK -> (掃描碼, 是否為延伸鍵) 事先算好，按鍵時只做一次查表，
+不再逐次建立清單或呼叫 MapVirtualKeyW。
+"""
+
+# 虛擬鍵代碼 (Virtual Keys)
+VK_LCONTROL = 0xA2
+VK_RCONTROL = 0xA3
+VK_LMENU    = 0xA4  # Left Alt
+VK_RMENU    = 0xA5  # Right Alt
+VK_LWIN     = 0x5B
+VK_RWIN     = 0x5C
+
+# MapVirtualKeyW 的轉換模式：VK -> 掃描碼
+MAPVK_VK_TO_VSC = 0
+
+# 全域鉤子攔截的修飾鍵與送往遠端的 RDP 掃描碼 (右 Ctrl/Alt 與 Win 鍵為延伸鍵)
+HOOK_KEYS = {
+    VK_LCONTROL: (0x1D, False),
+    VK_RCONTROL: (0x1D, True),
+    VK_LMENU: (0x38, False),
+    VK_RMENU: (0x38, True),
+    VK_LWIN: (0x5B, True),
+    VK_RWIN: (0x5C, True),
+}
+
+# 需要加上延伸旗標的一般按鍵：方向鍵、Insert/Delete、Home/End、PageUp/PageDown
+EXTENDED_VKS = frozenset((
+    0x25, 0x26, 0x27, 0x28,  # Left, Up, Right, Down
+    0x2D, 0x2E,              # Insert, Delete
+    0x24, 0x23,              # Home, End
+    0x21, 0x22,              # PageUp (Prior), PageDown (Next)
+))
+
+NO_KEY = (0, False)
+
+
+class ScancodeTable:
+    """VK -> (掃描碼, 是否為延伸鍵) 查表
+
+    map_vk(vk, mode) 通常為 user32.MapVirtualKeyW；掃描碼依目前的鍵盤配置而定，
+    切換輸入語言後需呼叫 rebuild()。查詢回傳事先建好的 tuple，不配置新物件。
+    """
+    def __init__(self, map_vk):
+        self.map_vk = map_vk
+        self.table = ()
+        self.rebuild()
+
+    def rebuild(self):
+        table = [NO_KEY]
+        for vk in range(1, 256):
+            scancode = self.map_vk(vk, MAPVK_VK_TO_VSC)
+            table.append((scancode, vk in EXTENDED_VKS) if scancode else NO_KEY)
+        self.table = tuple(table)
+
+    def lookup(self, vk):
+        return self.table[vk] if 0 < vk < 256 else NO_KEY
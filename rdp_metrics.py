@@ -0,0 +1,259 @@
+"""效能統計
+
+每個連線一個 SessionMetrics，記錄畫面管線各階段的計數與耗時：
+    發佈   排程器 poll 的次數與耗時 (rdpb_poll 內含 rdpb_step)、發佈的幀數
+    上傳   上傳的幀數與位元組數、glTexSubImage2D (上傳器) 耗時
+    呈現   畫面交換次數、paintGL 耗時
+    輸入   收到/送出的事件數、佇列深度，以及送出輸入到下一次發佈新幀的延遲
+           (遠端畫面的回應時間)
+計數只做整數加法、耗時只附加到固定長度的 deque，可以常駐開啟。
+
+MetricsRegistry 集中所有連線，snapshot() 取得可序列化的字典，prometheus() 輸出 Prometheus
+文字格式，MetricsExporter 定期寫到檔案 (.prom 可給 node_exporter 的 textfile collector
+讀取，其他副檔名為 JSON Lines)。
+"""
+import json
+import os
+import threading
+import time
+from collections import deque
+
+# 計算百分位數保留的最近樣本數
+RECENT_SAMPLES = 256
+# 送出輸入後超過這個時間 (秒) 都沒有新幀，視為畫面沒有反應，不列入延遲
+INPUT_LATENCY_TIMEOUT = 2.0
+# MetricsExporter 預設的寫入間隔 (秒)
+EXPORT_INTERVAL = 5.0
+
+_POLL_FRAME = 2  # rdp_scheduler.POLL_FRAME
+
+
+class Timing:
+    """耗時統計：累計次數、總和、最大值，最近 RECENT_SAMPLES 個樣本用來計算百分位數"""
+    __slots__ = ('count', 'total', 'max', 'recent')
+
+    def __init__(self):
+        self.count = 0
+        self.total = 0.0
+        self.max = 0.0
+        self.recent = deque(maxlen=RECENT_SAMPLES)
+
+    def add(self, seconds):
+        self.count += 1
+        self.total += seconds
+        if seconds > self.max: self.max = seconds
+        self.recent.append(seconds)
+
+    def percentile(self, q):
+        samples = sorted(self.recent)
+        if not samples: return 0.0
+        return samples[min(len(samples) - 1, int(q * len(samples)))]
+
+    def snapshot(self):
+        return {'count': self.count, 'sum': self.total, 'max': self.max,
+                'p50': self.percentile(0.5), 'p95': self.percentile(0.95)}
+
+
+class SessionMetrics:
+    """單一連線的統計；各方法在產生事件的執行緒呼叫 (排程器或 UI 執行緒)"""
+    COUNTERS = ('polls', 'frames_published', 'frames_uploaded', 'frames_presented', 'bytes_uploaded',
+                'input_events', 'input_batches')
+    TIMINGS = ('poll', 'upload', 'paint', 'input_latency')
+
+    def __init__(self, name):
+        self.name = name
+        for counter in self.COUNTERS: setattr(self, counter, 0)
+        self.timings = {timing: Timing() for timing in self.TIMINGS}
+        # 額外的即時數值 (名稱 -> 無參數函式)，例如輸入佇列深度
+        self.gauges = {}
+        self._input_sent = None
+
+    # --- 排程器執行緒 ---
+
+    def polled(self, seconds, result):
+        """排程器 poll 過一次；result 為 POLL_FRAME 時表示發佈了新幀"""
+        self.polls += 1
+        self.timings['poll'].add(seconds)
+        if result != _POLL_FRAME: return
+        self.frames_published += 1
+        sent, self._input_sent = self._input_sent, None
+        if sent is not None:
+            latency = time.perf_counter() - sent
+            if latency < INPUT_LATENCY_TIMEOUT: self.timings['input_latency'].add(latency)
+
+    # --- UI 執行緒 ---
+
+    def input_sent(self, events):
+        self.input_events += len(events)
+        self.input_batches += 1
+        # 只量測第一筆未回應的輸入，連續輸入期間不會把延遲重設為最後一筆
+        if self._input_sent is None: self._input_sent = time.perf_counter()
+
+    def uploaded(self, seconds, nbytes):
+        self.frames_uploaded += 1
+        self.bytes_uploaded += nbytes
+        self.timings['upload'].add(seconds)
+
+    def presented(self):
+        self.frames_presented += 1
+
+    def painted(self, seconds):
+        self.timings['paint'].add(seconds)
+
+    def snapshot(self):
+        data = {'session': self.name}
+        for counter in self.COUNTERS: data[counter] = getattr(self, counter)
+        for name, timing in self.timings.items(): data[name] = timing.snapshot()
+        for name, fn in list(self.gauges.items()):
+            try:
+                data[name] = fn()
+            except Exception:
+                data[name] = None  # 連線正在切換，下一次再讀
+        return data
+
+
+def rates(previous, current, seconds):
+    """兩次 snapshot 之間各計數的每秒變化量"""
+    if not previous or seconds <= 0: return {}
+    return {counter: (current[counter] - previous[counter]) / seconds for counter in SessionMetrics.COUNTERS}
+
+
+class MetricsRegistry:
+    """所有連線的統計；gauges 放不屬於單一連線的數值 (例如排程器執行緒數)"""
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._sessions = []
+        self.gauges = {}
+
+    def register(self, name):
+        """建立連線的統計，名稱重複時加上序號"""
+        with self._lock:
+            names = {session.name for session in self._sessions}
+            unique, index = name, 2
+            while unique in names:
+                unique, index = f"{name}#{index}", index + 1
+            metrics = SessionMetrics(unique)
+            self._sessions.append(metrics)
+        return metrics
+
+    def unregister(self, metrics):
+        with self._lock:
+            if metrics in self._sessions: self._sessions.remove(metrics)
+
+    def sessions(self):
+        with self._lock: return list(self._sessions)
+
+    def snapshot(self):
+        data = {'time': time.time(), 'sessions': [session.snapshot() for session in self.sessions()]}
+        for name, fn in list(self.gauges.items()): data[name] = fn()
+        return data
+
+    def json_line(self):
+        return json.dumps(self.snapshot(), ensure_ascii=False)
+
+    def prometheus(self):
+        """Prometheus 文字格式 (計數為 counter，耗時為 summary，單位為秒)"""
+        snapshot = self.snapshot()
+        lines = []
+        for name, value in snapshot.items():
+            if name in ('time', 'sessions') or not isinstance(value, (int, float)): continue
+            lines += [f"# TYPE rdp_{name} gauge", f"rdp_{name} {value}"]
+        sessions = snapshot['sessions']
+        for counter in SessionMetrics.COUNTERS:
+            lines.append(f"# TYPE rdp_{counter}_total counter")
+            for session in sessions:
+                lines.append(f'rdp_{counter}_total{{session="{_escape(session["session"])}"}} {session[counter]}')
+        for timing in SessionMetrics.TIMINGS:
+            metric = f"rdp_{timing}_seconds"
+            lines.append(f"# TYPE {metric} summary")
+            for session in sessions:
+                label, data = _escape(session['session']), session[timing]
+                lines.append(f'{metric}{{session="{label}",quantile="0.5"}} {data["p50"]:.6f}')
+                lines.append(f'{metric}{{session="{label}",quantile="0.95"}} {data["p95"]:.6f}')
+                lines.append(f'{metric}_sum{{session="{label}"}} {data["sum"]:.6f}')
+                lines.append(f'{metric}_count{{session="{label}"}} {data["count"]}')
+        gauges = sorted({name for session in sessions for name in session
+                         if name not in SessionMetrics.COUNTERS and name not in SessionMetrics.TIMINGS
+                         and name != 'session'})
+        for name in gauges:
+            lines.append(f"# TYPE rdp_{name} gauge")
+            for session in sessions:
+                value = session.get(name)
+                if isinstance(value, (int, float)):
+                    lines.append(f'rdp_{name}{{session="{_escape(session["session"])}"}} {value}')
+        return "\n".join(lines) + "\n"
+
+
+def _escape(value):
+    return value.replace('\\', '\\\\').replace('"', '\\"')
+
+
+class MetricsExporter(threading.Thread):
+    """定期把統計寫到檔案：.prom 每次整個覆寫 (先寫暫存檔再改名)，
+    其他副檔名附加一行 JSON"""
+    def __init__(self, registry, path, interval=EXPORT_INTERVAL):
+        super().__init__(daemon=True, name="RdpMetricsExporter")
+        self.registry = registry
+        self.path = path
+        self.interval = interval
+        self.finished = threading.Event()
+
+    def run(self):
+        while not self.finished.wait(self.interval):
+            self.export()
+
+    def export(self):
+        try:
+            if self.path.endswith('.prom'):
+                temp = self.path + '.tmp'
+                with open(temp, 'w', encoding='utf-8') as f: f.write(self.registry.prometheus())
+                os.replace(temp, self.path)
+            else:
+                with open(self.path, 'a', encoding='utf-8') as f: f.write(self.registry.json_line() + "\n")
+        except OSError as e:
+            print(f"[Metrics] 無法寫入 {self.path}: {e}")
+
+    def stop(self):
+        self.finished.set()
+        if threading.current_thread() is not self: self.join()
+        self.export()
+
+
+def format_overlay(snapshot, rate):
+    """視窗疊加層的文字 (每秒數值來自 rates())"""
+    def ms(name, key='p50'): return snapshot[name][key] * 1000
+    lines = [
+        f"發佈 {rate.get('frames_published', 0):5.1f} fps   上傳 {rate.get('frames_uploaded', 0):5.1f} fps   "
+        f"呈現 {rate.get('frames_presented', 0):5.1f} fps",
+        f"上傳 {rate.get('bytes_uploaded', 0) / 1e6:6.2f} MB/s   "
+        f"每次 {ms('upload'):5.2f} ms (p95 {ms('upload', 'p95'):5.2f})",
+        f"paintGL {ms('paint'):5.2f} ms (p95 {ms('paint', 'p95'):5.2f})",
+        f"poll {rate.get('polls', 0):5.0f} 次/秒   每次 {ms('poll'):5.2f} ms (p95 {ms('poll', 'p95'):5.2f})",
+        f"輸入 {rate.get('input_events', 0):5.0f} 事件/秒   佇列 {snapshot.get('input_queue', 0) or 0}   "
+        f"回應 {ms('input_latency'):5.1f} ms (p95 {ms('input_latency', 'p95'):5.1f})",
+        f"接收 {snapshot.get('link_kbps', 0) or 0:6.0f} kbps   "
+        f"處理事件 {snapshot.get('busy_percent', 0) or 0:5.1f}%",
+    ]
+    return "\n".join(lines)
+
+
+class StartupTimer:
+    """啟動各階段距離開始計時 (本模組匯入時) 的時間，可在不同執行緒標記；
+    每個階段只記錄第一次"""
+    def __init__(self):
+        self.start = time.perf_counter()
+        self.phases = {}
+        self._lock = threading.Lock()
+
+    def mark(self, name):
+        elapsed = time.perf_counter() - self.start
+        with self._lock:
+            if name in self.phases: return
+            self.phases[name] = elapsed
+        print(f"[Startup] {name}: {elapsed * 1000:.0f} ms")
+
+
+# GUI 與無視窗連線共用的統計
+registry = MetricsRegistry()
+# 啟動程式 (rdp_client_gpu.py) 最先匯入本模組，從那時開始計時
+startup = StartupTimer()
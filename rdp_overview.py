@@ -0,0 +1,386 @@
+"""多連線總覽
+
+在單一 GL 視圖中以即時縮圖顯示所有連線，取代開著多個全尺寸視窗監看：
+    來源   每個連線一張全解析度的來源紋理，只上傳自上次更新以來變動的區域
+           (FramePacer 在排程器執行緒累積各幀的髒矩形)
+    圖集   所有縮圖共用一張與總覽畫面同尺寸的圖集紋理，有變動的連線才以 shader
+           縮小濾波重畫它的格子 (FBO)
+    節奏   以固定的較低頻率 (預設每秒 5 次) 更新，期間的多幀合併為一次上傳
+    呈現   每次繪製只畫一張圖集紋理；按一下縮圖切換到該連線的視窗
+不支援 FBO 時退回每次繪製都從來源紋理直接縮小到畫面。
+
+OverviewWindow 的 sessions_fn 回傳目前的連線視窗清單，連線視窗需提供：
+title、backend、rdp_widget (連線完成前為 None，其 frame_listeners 收到排程器執行緒的新幀標頭)、
+show_rdp() 與 set_in_overview(watched) (總覽看得到時伺服器需持續送出畫面)。
+"""
+import math
+import time
+
+from OpenGL.GL import (
+    glGenTextures, glDeleteTextures, glBindTexture, glTexImage2D, glTexParameteri,
+    glGenFramebuffers, glDeleteFramebuffers, glBindFramebuffer, glFramebufferTexture2D, glCheckFramebufferStatus,
+    glEnable, glDisable, glScissor, glClear, glClearColor, glViewport,
+    GL_TEXTURE_2D, GL_TEXTURE_MIN_FILTER, GL_TEXTURE_MAG_FILTER, GL_LINEAR, GL_RGBA, GL_UNSIGNED_BYTE,
+    GL_FRAMEBUFFER, GL_COLOR_ATTACHMENT0, GL_FRAMEBUFFER_COMPLETE, GL_SCISSOR_TEST, GL_COLOR_BUFFER_BIT,
+)
+from OpenGL.error import GLError, NullFunctionError
+from PySide6.QtCore import QEvent, Qt, QTimer
+from PySide6.QtGui import QAction
+from PySide6.QtOpenGLWidgets import QOpenGLWidget
+from PySide6.QtWidgets import QLabel, QMainWindow, QMenu
+
+from rdp_metrics import registry
+from rdp_pacer import FramePacer
+from rdp_render import FrameRenderer, compute_viewport
+from rdp_shm import BYTES_PER_PIXEL, read_consistent
+from rdp_texture import DirectUploader
+
+# 預設與可選的縮圖更新頻率 (次/秒)
+THUMBNAIL_FPS = 5
+THUMBNAIL_RATES = (1, 2, 5, 10, 30)
+# 縮圖之間與外框的間距 (裝置像素)
+TILE_GAP = 6
+# 格子的背景色 (沒有畫面時)
+TILE_BACKGROUND = (0.12, 0.12, 0.12)
+
+
+def grid_layout(count, width, height, aspect=16 / 9, gap=TILE_GAP):
+    """把 count 個格子排進 width x height，選擇讓縮圖 (維持 aspect) 最大的欄數
+
+    回傳 [(x, y, w, h)]，以左上角為原點；空間不夠時回傳空清單。
+    """
+    if count <= 0 or width <= 0 or height <= 0: return []
+    best = None
+    for columns in range(1, count + 1):
+        rows = math.ceil(count / columns)
+        cell_w = (width - gap * (columns + 1)) / columns
+        cell_h = (height - gap * (rows + 1)) / rows
+        if cell_w < 1 or cell_h < 1: continue
+        size = min(cell_w, cell_h * aspect)
+        if best is None or size > best[0]: best = (size, columns, cell_w, cell_h)
+    if best is None: return []
+    _, columns, cell_w, cell_h = best
+    return [(int(gap + (i % columns) * (cell_w + gap)), int(gap + (i // columns) * (cell_h + gap)),
+             int(cell_w), int(cell_h)) for i in range(count)]
+
+
+class ThumbnailTile:
+    """一個連線的縮圖：全解析度的來源紋理 (只上傳變動區域) 與在圖集中的格子"""
+    def __init__(self, session):
+        self.session = session
+        self.pacer = FramePacer()
+        self.backend = None
+        self.texture_id = None
+        self.uploader = None
+        self.last_fid = 0
+        self.force_full = True
+        # 排程器執行緒設定：有新幀尚未更新到圖集
+        self.changed = True
+        # 圖集中的格子需要重畫 (版面改變或圖集重新配置)
+        self.stale = True
+        self.rect = (0, 0, 0, 0)
+        # 掛上 notify 的連線畫面元件與顯示標題的標籤
+        self.widget = None
+        self.label = None
+
+    def notify(self, header):
+        """排程器執行緒：記錄新幀的髒矩形"""
+        if self.pacer.add(header): self.changed = True
+
+    @property
+    def size(self):
+        return (self.uploader.width, self.uploader.height) if self.uploader else (0, 0)
+
+    def release(self):
+        if self.texture_id is not None:
+            glDeleteTextures([self.texture_id])
+            self.texture_id = self.uploader = None
+
+
+class ThumbnailAtlas:
+    """所有縮圖共用的圖集紋理 (與總覽畫面同尺寸，裝置像素)；
+    呼叫端必須已經 makeCurrent()"""
+    def __init__(self):
+        self.renderer = FrameRenderer()
+        self.texture_id = None
+        self.fbo = None
+        self.width = 0
+        self.height = 0
+
+    def initialize(self):
+        self.renderer.initialize()
+        try:
+            self.fbo = glGenFramebuffers(1)
+        except (GLError, NullFunctionError) as e:
+            print(f"[Overview] 不支援 FBO，縮圖改為每次繪製時直接縮小: {e}")
+            self.fbo = None
+            return
+        self.texture_id = _new_texture()
+
+    def resize(self, width, height):
+        """依畫面尺寸重新配置圖集，回傳內容是否被清除 (之後每個格子都要重畫)"""
+        if self.fbo is None or (width, height) == (self.width, self.height): return False
+        glBindTexture(GL_TEXTURE_2D, self.texture_id)
+        glTexImage2D(GL_TEXTURE_2D, 0, GL_RGBA, width, height, 0, GL_RGBA, GL_UNSIGNED_BYTE, None)
+        glBindTexture(GL_TEXTURE_2D, 0)
+        glBindFramebuffer(GL_FRAMEBUFFER, self.fbo)
+        glFramebufferTexture2D(GL_FRAMEBUFFER, GL_COLOR_ATTACHMENT0, GL_TEXTURE_2D, self.texture_id, 0)
+        if glCheckFramebufferStatus(GL_FRAMEBUFFER) != GL_FRAMEBUFFER_COMPLETE:
+            print("[Overview] 圖集 FBO 不完整，縮圖改為每次繪製時直接縮小")
+            glFramebufferTexture2D(GL_FRAMEBUFFER, GL_COLOR_ATTACHMENT0, GL_TEXTURE_2D, 0, 0)
+            glDeleteFramebuffers(1, [self.fbo])
+            self.fbo = None
+            return False
+        glViewport(0, 0, width, height)
+        glClearColor(0, 0, 0, 1)
+        glClear(GL_COLOR_BUFFER_BIT)
+        self.width, self.height = width, height
+        return True
+
+    def upload(self, tile):
+        """把 tile 自上次更新以來變動的區域上傳到來源紋理，
+        回傳上傳的位元組數 (0 表示沒有新幀)"""
+        tile.changed = False
+        tile.pacer.begin()
+        backend = tile.session.backend
+        if backend is not tile.backend:
+            # 重新連線換了後端：整張上傳
+            tile.backend, tile.force_full = backend, True
+        if backend is None or not backend.shm: return 0
+        header = backend.check_new_frame(tile.last_fid)
+        if header is None: return 0
+        if tile.texture_id is None:
+            tile.texture_id = _new_texture()
+            tile.uploader = DirectUploader(tile.texture_id)
+        ok, nbytes = read_consistent(backend.shm,
+                                     lambda header, attempt: self._upload_frame(tile, backend, header, attempt))
+        if not ok:
+            # 一直被寫入端打斷：下一次整張上傳
+            tile.force_full = True
+            tile.changed = True
+            return 0
+        tile.force_full = False
+        if nbytes: tile.stale = True
+        return nbytes
+
+    def _upload_frame(self, tile, backend, header, attempt):
+        width, height = tile.size
+        rects = tile.pacer.plan(header, tile.last_fid, width, height, force_full=tile.force_full or attempt > 0)
+        tile.last_fid = header.frame_id
+        tile.pacer.commit(header.frame_id)
+        if not rects: return 0
+        tile.uploader.upload(backend.get_pixel_address(), header.width, header.height, header.stride, rects,
+                             header.format)
+        return sum(w * h for _, _, w, h in rects) * BYTES_PER_PIXEL[header.format]
+
+    def draw_tile(self, tile):
+        """以 shader 縮小濾波把來源紋理畫進圖集中的格子 (維持長寬比)"""
+        glBindFramebuffer(GL_FRAMEBUFFER, self.fbo)
+        self._draw_cell(tile, 1.0, 0, flip=True)
+        tile.stale = False
+
+    def _draw_cell(self, tile, dpr, surface_h, flip):
+        x, y, w, h = tile.rect
+        if w <= 0 or h <= 0: return
+        scissor_y = y if flip else int(surface_h * dpr) - y - h
+        glEnable(GL_SCISSOR_TEST)
+        glScissor(x, scissor_y, w, h)
+        glClearColor(*TILE_BACKGROUND, 1)
+        glClear(GL_COLOR_BUFFER_BIT)
+        glDisable(GL_SCISSOR_TEST)
+        tex_w, tex_h = tile.size
+        if not tex_w: return
+        vx, vy, vw, vh = compute_viewport(tex_w, tex_h, w, h)
+        # 格子以裝置像素計算，轉回 draw() 使用的邏輯座標
+        self.renderer.draw(tile.texture_id, tex_w, tex_h, ((x + vx) / dpr, (y + vy) / dpr, vw / dpr, vh / dpr),
+                           surface_h, dpr, clear=False, flip=flip)
+
+    def present(self, framebuffer, tiles, surface_w, surface_h, dpr=1.0):
+        """畫到視窗 (framebuffer)：有圖集時只畫一張紋理，
+        否則每個格子直接從來源紋理縮小"""
+        glBindFramebuffer(GL_FRAMEBUFFER, framebuffer)
+        if self.fbo is not None:
+            self.renderer.draw(self.texture_id, self.width, self.height, (0, 0, surface_w, surface_h), surface_h, dpr)
+            return
+        glViewport(0, 0, int(surface_w * dpr), int(surface_h * dpr))
+        glClearColor(0, 0, 0, 1)
+        glClear(GL_COLOR_BUFFER_BIT)
+        for tile in tiles: self._draw_cell(tile, dpr, surface_h, flip=False)
+
+    def release(self):
+        self.renderer.release()
+        if self.fbo is not None:
+            glDeleteFramebuffers(1, [self.fbo])
+            self.fbo = None
+        if self.texture_id is not None:
+            glDeleteTextures([self.texture_id])
+            self.texture_id = None
+        self.width = self.height = 0
+
+
+def _new_texture():
+    texture_id = glGenTextures(1)
+    glBindTexture(GL_TEXTURE_2D, texture_id)
+    glTexParameteri(GL_TEXTURE_2D, GL_TEXTURE_MIN_FILTER, GL_LINEAR)
+    glTexParameteri(GL_TEXTURE_2D, GL_TEXTURE_MAG_FILTER, GL_LINEAR)
+    glBindTexture(GL_TEXTURE_2D, 0)
+    return texture_id
+
+
+class OverviewWidget(QOpenGLWidget):
+    """以縮圖格狀顯示 sessions_fn() 回傳的所有連線；按一下縮圖切換到該連線，
+    右鍵選擇更新頻率"""
+    def __init__(self, sessions_fn, fps=THUMBNAIL_FPS):
+        super().__init__()
+        self.sessions_fn = sessions_fn
+        self.atlas = ThumbnailAtlas()
+        self.tiles = []
+        self.fps = fps
+        self.watching = False
+        self.timer = QTimer(self)
+        self.timer.timeout.connect(self.tick)
+        # 上傳與繪製共用一個統計項目，可與各連線視窗的上傳量比較
+        self.metrics = registry.register("overview")
+        self.frameSwapped.connect(self.metrics.presented)
+
+    def set_watching(self, watching):
+        """總覽看得到時才更新；看得到的連線要求伺服器持續送出畫面"""
+        self.watching = watching
+        self.sync_tiles()
+        for tile in self.tiles: tile.session.set_in_overview(watching)
+        if watching:
+            self.timer.start(int(1000 / self.fps))
+            self.update()
+        else:
+            self.timer.stop()
+
+    def set_fps(self, fps):
+        self.fps = fps
+        if self.timer.isActive(): self.timer.start(int(1000 / fps))
+        print(f"[Overview] 縮圖更新頻率: {fps} 次/秒")
+
+    def sync_tiles(self):
+        """依目前的連線增減縮圖，連線完成後掛上新幀通知"""
+        sessions = list(self.sessions_fn())
+        removed = [tile for tile in self.tiles if tile.session not in sessions]
+        if removed:
+            self.makeCurrent()
+            for tile in removed: self._drop_tile(tile)
+            self.doneCurrent()
+        known = {id(tile.session) for tile in self.tiles}
+        for session in sessions:
+            if id(session) in known: continue
+            tile = ThumbnailTile(session)
+            tile.label = QLabel(self)
+            tile.label.setStyleSheet("background: rgba(0, 0, 0, 160); color: white; padding: 2px 4px;")
+            tile.label.show()
+            self.tiles.append(tile)
+            if self.watching: session.set_in_overview(True)
+        for tile in self.tiles:
+            widget = tile.session.rdp_widget
+            if widget is not None and widget is not tile.widget:
+                # 排程器執行緒走訪 frame_listeners，整個換掉而不是原地修改
+                widget.frame_listeners = widget.frame_listeners + (tile.notify,)
+                tile.widget, tile.changed = widget, True
+            if tile.label.text() != tile.session.title:
+                tile.label.setText(tile.session.title)
+                tile.label.adjustSize()
+        if removed or len(self.tiles) != len(known): self.relayout()
+
+    def _drop_tile(self, tile):
+        if tile.widget is not None:
+            tile.widget.frame_listeners = tuple(fn for fn in tile.widget.frame_listeners if fn != tile.notify)
+            tile.widget = None
+        tile.release()
+        tile.label.deleteLater()
+        self.tiles.remove(tile)
+
+    def release_tiles(self):
+        self.makeCurrent()
+        for tile in list(self.tiles): self._drop_tile(tile)
+        self.doneCurrent()
+
+    def relayout(self):
+        dpr = self.devicePixelRatioF()
+        cells = grid_layout(len(self.tiles), int(self.width() * dpr), int(self.height() * dpr))
+        for tile, rect in zip(self.tiles, cells or [(0, 0, 0, 0)] * len(self.tiles)):
+            if rect != tile.rect: tile.rect, tile.stale = rect, True
+            tile.label.move(int(rect[0] / dpr), int(rect[1] / dpr))
+        self.update()
+
+    def tick(self):
+        self.sync_tiles()
+        if any(tile.changed or tile.stale for tile in self.tiles): self.update()
+
+    def initializeGL(self):
+        self.atlas.initialize()
+
+    def resizeGL(self, width, height):
+        self.relayout()
+
+    def paintGL(self):
+        start = time.perf_counter()
+        dpr = self.devicePixelRatioF()
+        if self.atlas.resize(int(self.width() * dpr), int(self.height() * dpr)):
+            for tile in self.tiles: tile.stale = True
+        nbytes = 0
+        for tile in self.tiles:
+            if tile.changed: nbytes += self.atlas.upload(tile)
+            if tile.stale and self.atlas.fbo is not None: self.atlas.draw_tile(tile)
+        if nbytes: self.metrics.uploaded(time.perf_counter() - start, nbytes)
+        # 畫到 FBO 後要換回 Qt 的 framebuffer
+        self.atlas.present(self.defaultFramebufferObject(), self.tiles, self.width(), self.height(), dpr)
+        self.metrics.painted(time.perf_counter() - start)
+
+    def tile_at(self, pos):
+        dpr = self.devicePixelRatioF()
+        x, y = pos.x() * dpr, pos.y() * dpr
+        for tile in self.tiles:
+            tx, ty, tw, th = tile.rect
+            if tx <= x < tx + tw and ty <= y < ty + th: return tile
+        return None
+
+    def mousePressEvent(self, event):
+        tile = self.tile_at(event.position())
+        if event.button() == Qt.MouseButton.LeftButton and tile: tile.session.show_rdp()
+
+    def contextMenuEvent(self, event):
+        menu = QMenu(self)
+        for fps in THUMBNAIL_RATES:
+            action = QAction(f"每秒更新 {fps} 次", menu, checkable=True)
+            action.setChecked(fps == self.fps)
+            action.triggered.connect(lambda checked, fps=fps: self.set_fps(fps))
+            menu.addAction(action)
+        menu.exec(event.globalPos())
+
+
+class OverviewWindow(QMainWindow):
+    """總覽視窗；關閉時只隱藏，
+    釋放縮圖並讓各連線恢復依自己的視窗決定是否接收畫面"""
+    def __init__(self, sessions_fn, fps=THUMBNAIL_FPS):
+        super().__init__()
+        self.setWindowTitle("RDP 總覽")
+        self.resize(1280, 720)
+        self.view = OverviewWidget(sessions_fn, fps)
+        self.setCentralWidget(self.view)
+
+    def update_watching(self):
+        watching = self.isVisible() and not self.isMinimized()
+        if watching != self.view.watching: self.view.set_watching(watching)
+
+    def showEvent(self, event):
+        super().showEvent(event)
+        self.update_watching()
+
+    def hideEvent(self, event):
+        super().hideEvent(event)
+        self.update_watching()
+
+    def changeEvent(self, event):
+        super().changeEvent(event)
+        if event.type() == QEvent.Type.WindowStateChange: self.update_watching()
+
+    def closeEvent(self, event):
+        self.view.set_watching(False)
+        self.view.release_tiles()
+        super().closeEvent(event)
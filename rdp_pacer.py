@@ -0,0 +1,132 @@
+"""畫面節奏控制 (frame pacing)
+
+伺服器短時間內連續發佈多幀 (捲動、影片) 時，每一幀都上傳紋理
+只會在同一次螢幕更新內被覆蓋。FramePacer 讓上傳對齊畫面呈現：
+上一次上傳的畫面尚未交換 (frameSwapped) 前的通知只記錄下來，交換後一次上傳最新的幀；
+期間每一幀的髒矩形在排程器執行緒累積，合併上傳時仍只上傳變動的區域。
+幀的到達比螢幕更新慢時上一次交換早已完成，收到通知立即上傳，不增加延遲。
+"""
+import threading
+from collections import namedtuple
+
+from rdp_shm import DamageAccumulator
+
+_FID_MASK = 0xFFFFFFFF
+# 記錄的幀數上限 (視窗隱藏時不上傳)，超過時改為整張上傳
+MAX_PENDING_FRAMES = 256
+# 預設的螢幕更新率，取得不到實際數值時使用
+DEFAULT_REFRESH_RATE = 60.0
+
+# frames: 發佈的幀數；uploads: 上傳次數；coalesced: 併入後續上傳、未單獨上傳的幀數；
+# deferrals: 等待畫面交換而延後上傳的次數
+PacerStats = namedtuple('PacerStats', 'frames uploads coalesced deferrals')
+
+
+class FramePacer:
+    """合併兩次上傳之間的通知與髒矩形
+
+    add() 在排程器執行緒呼叫，其餘方法在 UI 執行緒呼叫：
+        check_frame: begin() -> ready() 為 False 時 defer() -> plan() -> commit() / uploaded()
+        frameSwapped: swapped() 回傳 True 時再執行一次 check_frame
+    """
+    def __init__(self, refresh_rate=DEFAULT_REFRESH_RATE):
+        self._lock = threading.Lock()
+        self._pending = []  # 上次上傳之後發佈的 (frameId, damage)
+        self._notified = False
+        self.swap_pending = False
+        self.deferred = False
+        self._swap_requested = 0.0
+        self.set_refresh_rate(refresh_rate)
+        self.frames = 0
+        self.uploads = 0
+        self.deferrals = 0
+
+    def set_refresh_rate(self, hz):
+        self.refresh_interval = 1.0 / (hz if hz and hz > 0 else DEFAULT_REFRESH_RATE)
+        # 畫面交換的通知沒有來 (視窗被遮住、最小化) 時最多等兩次更新
+        self.max_wait = 2 * self.refresh_interval
+
+    def reset(self):
+        """換了發佈端 (重新連線)：丟棄記錄，下一次整張上傳"""
+        with self._lock: self._pending = []
+        self.swap_pending = False
+
+    # --- 排程器執行緒 ---
+
+    def add(self, header):
+        """記錄新幀的髒矩形 (header 為 None 表示讀不到)，回傳是否需要喚醒 UI 執行緒"""
+        with self._lock:
+            self.frames += 1
+            # 讀不到的幀不記錄，之後因 frameId 不連續而整張上傳
+            if header is not None: self._pending.append((header.frame_id, header.damage))
+            if len(self._pending) > MAX_PENDING_FRAMES: self._pending = [(self._pending[-1][0], None)]
+            if self._notified: return False
+            self._notified = True
+            return True
+
+    # --- UI 執行緒 ---
+
+    def begin(self):
+        """開始處理通知，之後的新幀會再次喚醒"""
+        with self._lock: self._notified = False
+
+    def ready(self, now):
+        """上一次上傳的畫面已交換 (或等待逾時) 時可以上傳"""
+        if self.swap_pending and now - self._swap_requested < self.max_wait: return False
+        self.swap_pending = False
+        return True
+
+    def defer(self):
+        """延後到畫面交換後再上傳，期間的新幀不再喚醒 UI 執行緒；
+        回傳是否為第一次延後"""
+        with self._lock: self._notified = True
+        self.deferrals += 1
+        first, self.deferred = not self.deferred, True
+        return first
+
+    def swapped(self):
+        """畫面已交換，回傳是否有延後的上傳要處理"""
+        self.swap_pending = False
+        deferred, self.deferred = self.deferred, False
+        return deferred
+
+    def plan(self, header, last_fid, tex_width, tex_height, force_full=False):
+        """在 seqlock 讀取區段內決定要上傳的矩形 (與 rdp_shm.plan_upload 相同的回傳值)
+
+        last_fid 之後到 header 的每一幀都有記錄時上傳其髒矩形的聯集，否則整張上傳。
+        """
+        if header.width == 0: return None
+        full = ((0, 0, header.width, header.height),)
+        if force_full or header.width != tex_width or header.height != tex_height: return full
+        if header.frame_id == last_fid: return None
+        target = (header.frame_id - last_fid) & _FID_MASK
+        with self._lock: pending = list(self._pending)
+        damages = {}
+        for fid, damage in pending:
+            distance = (fid - last_fid) & _FID_MASK
+            if 1 <= distance <= target: damages[distance] = damage
+        # 讀取區段內的標頭一定是最新的
+        damages[target] = header.damage
+        if len(damages) != target: return full
+        merged = DamageAccumulator(header.width, header.height)
+        merged.full = False
+        for distance in range(1, target + 1):
+            if damages[distance] is None: return full
+            for rect in damages[distance]: merged.add(*rect)
+        rects = merged.take()
+        if rects is None: return full
+        return rects or None
+
+    def commit(self, fid):
+        """frameId 為 fid 的畫面已上傳，丟棄它與之前的記錄"""
+        with self._lock:
+            self._pending = [(f, d) for f, d in self._pending if 0 < (f - fid) & _FID_MASK < 0x80000000]
+
+    def uploaded(self, now):
+        """已上傳並要求重繪，交換前的通知延後處理"""
+        self.uploads += 1
+        self.swap_pending = True
+        self._swap_requested = now
+
+    def stats(self):
+        return PacerStats(self.frames, self.uploads, max(0, self.frames - self.uploads), self.deferrals)
@@ -0,0 +1,167 @@
+"""連線設定檔：圖形管線的編碼、快取與幀率，以及依連線狀況自動切換的控制器
+
+RdpBridge 原本對每個連線都開啟 H.264/AVC444、精簡用戶端與小型快取。這組設定在窄頻寬的
+連線上合適，但在區域網路上 H.264 解碼反而是瓶頸，低階機器也負擔不起 AVC444。
+設定檔在握手前 (PreConnect) 套用，連線後只有發佈幀率上限可以即時調整：
+    balanced  平衡 (預設)：與先前固定的設定相同
+    lan       區域網路：不用 H.264 (伺服器改用 RemoteFX/Planar 等無損編碼)、
+              不壓縮、保留桌面效果
+    wan       廣域網路：H.264 + AVC444、壓縮、關閉桌面效果、最多 30 fps
+    low_cpu   低 CPU：不用 H.264、關閉桌面效果、最多 15 fps
+    auto      自動調整：從平衡開始，由 AdaptiveController 依解碼時間、幀率與接收量選擇
+
+LinkMonitor 以共享記憶體標頭的累計計數 (rdp_shm.FrameStats) 計算每段時間的幀率、接收頻寬與
+處理事件的 CPU 比例。AdaptiveController 在持續受 CPU 或連線限制時切換設定檔：
+只有幀率上限不同時立即生效 (rdpb_set_frame_rate)；編碼或快取不同時 (needs_reconnect)
+需要重新握手，視窗沿用原本的紋理與共享記憶體重新連線。
+閒置後回到起始設定檔時不為此中斷連線，編碼設定留到下一次重新連線。
+來回切換時等待時間加倍，避免在兩個設定檔之間擺盪。
+"""
+import ctypes
+import time
+from collections import namedtuple
+
+# 與 FreeRDP 的 CONNECTION_TYPE_* 一致 (0 為不指定)
+CONNECTION_TYPE_MODEM = 1
+CONNECTION_TYPE_BROADBAND_LOW = 2
+CONNECTION_TYPE_LAN = 6
+
+# desktop_effects：-1 保留 FreeRDP 的預設
+EFFECTS_DEFAULT = -1
+
+# 自動調整取樣間隔 (秒)
+ADAPT_INTERVAL = 5
+# 處理事件 (接收、解碼、繪製) 占用的時間比例超過 CPU_HIGH 或每幀超過 DECODE_SLOW_MS
+# 視為受 CPU 限制
+CPU_HIGH = 0.5
+CPU_LOW = 0.15
+DECODE_SLOW_MS = 25
+# CPU 閒置、接收量超過 LINK_MIN_KBPS 但幀率低於 LINK_SLOW_FPS 視為受連線限制
+LINK_SLOW_FPS = 8
+LINK_MIN_KBPS = 1000
+# 連續幾個樣本都受限才切換，連續幾個樣本都閒置才回到起始設定檔
+HOLD_SAMPLES = 3
+RECOVER_SAMPLES = 24
+# 兩次切換的最短間隔 (秒)，切回曾離開的設定檔時加倍 (最多 MAX_BACKOFF 倍)
+MIN_SWITCH_INTERVAL = 60
+MAX_BACKOFF = 16
+
+Profile = namedtuple('Profile', ['name', 'label', 'h264', 'avc444', 'thin_client', 'compression', 'caches',
+                                 'connection_type', 'desktop_effects', 'frame_rate'])
+
+PROFILES = {
+    'balanced': Profile('balanced', "平衡", True, True, True, True, False, 0, EFFECTS_DEFAULT, 0),
+    'lan': Profile('lan', "區域網路", False, False, False, False, True, CONNECTION_TYPE_LAN, 1, 0),
+    'wan': Profile('wan', "廣域網路", True, True, True, True, True, CONNECTION_TYPE_BROADBAND_LOW, 0, 30),
+    'low_cpu': Profile('low_cpu', "低 CPU", False, False, True, True, True, 0, 0, 15),
+}
+DEFAULT_PROFILE = 'balanced'
+AUTO_PROFILE = 'auto'
+# 登入對話框的選項 (名稱, 顯示文字)
+PROFILE_CHOICES = ((AUTO_PROFILE, "自動調整"),) + tuple((p.name, p.label) for p in PROFILES.values())
+
+
+class RdpbProfile(ctypes.Structure):
+    """與 RdpBridge.h 的 RdpbProfile 一致"""
+    _fields_ = [(name, ctypes.c_int) for name in Profile._fields[2:]]
+
+
+def to_native(profile):
+    """Profile 轉為傳給 rdpb_job_set_profile 的 RdpbProfile"""
+    return RdpbProfile(*(int(value) for value in profile[2:]))
+
+
+def profile_for(config):
+    """連線設定 (config['profile']) 對應的設定檔；
+    自動調整時使用控制器目前的選擇 (config['adaptive_profile'])"""
+    name = config.get('profile') or DEFAULT_PROFILE
+    if name == AUTO_PROFILE: name = config.get('adaptive_profile') or DEFAULT_PROFILE
+    if name not in PROFILES: raise ValueError(f"未知的連線設定檔: {name}")
+    return PROFILES[name]
+
+
+# 握手時協商、連線中無法更換的欄位
+NEGOTIATED_FIELDS = tuple(field for field in Profile._fields if field not in ('name', 'label', 'frame_rate'))
+
+
+def needs_reconnect(current, profile):
+    """從 current 換成 profile 是否需要重新連線 (編碼、快取等協商的設定不同)"""
+    return any(getattr(current, field) != getattr(profile, field) for field in NEGOTIATED_FIELDS)
+
+
+# seconds: 樣本涵蓋的時間；fps: 發佈幀率；kbps: 接收頻寬；busy: 處理事件的時間比例；
+# decode_ms: 每幀處理時間
+LinkSample = namedtuple('LinkSample', ['seconds', 'fps', 'kbps', 'busy', 'decode_ms'])
+
+
+def _delta(current, previous):
+    """32 位元累計計數的差值 (溢位後從 0 繼續)，計數被重設 (新的 DLL 實例) 時回傳 None"""
+    delta = (current - previous) & 0xFFFFFFFF
+    return None if delta >= 0x80000000 else delta
+
+
+class LinkMonitor:
+    """由相鄰兩次 FrameStats 計算連線狀況"""
+    def __init__(self):
+        self.reset()
+
+    def reset(self):
+        """重新連線後計數換成新實例的，下一次取樣只作為基準"""
+        self.last = None
+        self.last_time = None
+
+    def sample(self, stats, now=None):
+        """加入一次統計，回傳與上一次之間的 LinkSample；第一次、
+        計數重設或沒有統計時回傳 None"""
+        now = time.monotonic() if now is None else now
+        previous, previous_time = self.last, self.last_time
+        self.last, self.last_time = stats, now
+        if stats is None or previous is None or now <= previous_time: return None
+        deltas = [_delta(getattr(stats, field), getattr(previous, field))
+                  for field in ('active_steps', 'received_kib', 'busy_us')]
+        if None in deltas: return None
+        frames, kib, busy_us = deltas
+        seconds = now - previous_time
+        return LinkSample(seconds, frames / seconds, kib * 8.192 / seconds, busy_us / 1e6 / seconds,
+                          busy_us / 1000 / frames if frames else 0.0)
+
+
+class AdaptiveController:
+    """依 LinkSample 決定設定檔：受 CPU 限制改用低 CPU，受連線限制改用廣域網路，
+    長時間閒置回到起始設定檔"""
+    def __init__(self, start=DEFAULT_PROFILE):
+        self.start = start
+        self.current = start
+        self.pressure = None
+        self.count = 0
+        self.last_switch = None
+        self.returns = 0
+
+    def classify(self, sample):
+        """回傳這個樣本建議的設定檔 (CPU 優先於連線)，沒有受限時回傳 None，
+        閒置時回傳起始設定檔"""
+        if sample.busy >= CPU_HIGH or (sample.fps > 0 and sample.decode_ms >= DECODE_SLOW_MS):
+            return 'low_cpu'
+        if sample.busy < CPU_LOW and sample.kbps >= LINK_MIN_KBPS and sample.fps < LINK_SLOW_FPS:
+            return 'wan'
+        if sample.busy < CPU_LOW and sample.kbps < LINK_MIN_KBPS:
+            return self.start
+        return None
+
+    def update(self, sample, now=None):
+        """加入一個樣本，需要切換時回傳新的 Profile，否則回傳 None"""
+        if sample is None: return None
+        now = time.monotonic() if now is None else now
+        target = self.classify(sample)
+        # 已經為了 CPU 降到低 CPU，連線受限也不換回需要 H.264 解碼的設定檔
+        if target == 'wan' and self.current == 'low_cpu': target = None
+        if target != self.pressure: self.pressure, self.count = target, 0
+        self.count += 1
+        if target is None or target == self.current: return None
+        if self.count < (RECOVER_SAMPLES if target == self.start else HOLD_SAMPLES): return None
+        interval = MIN_SWITCH_INTERVAL * min(MAX_BACKOFF, 2 ** self.returns)
+        if self.last_switch is not None and now - self.last_switch < interval: return None
+        # 切回起始設定檔後又再次受限即為擺盪，下一次切換等待更久
+        if target == self.start: self.returns += 1
+        self.current, self.last_switch, self.count = target, now, 0
+        return PROFILES[target]
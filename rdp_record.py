@@ -0,0 +1,526 @@
+"""連線錄影與播放
+
+直接存下共享記憶體的原始畫面在 1080p30 約 250 MB/s。Recorder 只存關鍵幀 (整張畫面) 與
+圖塊層級的差異：擷取執行緒在 seqlock 讀取區段內複製 DLL 回報的髒矩形，寫入執行緒
+逐一比對 64x64 圖塊，只壓縮 (zlib) 內容真的改變的圖塊；大面積變動 (影片、捲動) 的幀
+改以 JPEG 儲存。兩者之間是有上限的佇列，寫入端跟不上時丟幀並在下一次擷取整張畫面，
+錄影永遠不會拖慢繪製路徑。
+輸入事件附帶時間戳記一併寫入。
+
+    recorder = Recorder(session, "session.rdprec")
+    ...
+    recorder.stop()
+
+    with RecordingPlayer("session.rdprec") as player:
+        pixels = player.seek(12.5)             # (height, width, 4) BGRA
+
+PlaybackBackend 把錄影寫入模擬的共享記憶體，讓 RdpGLWidget 像播放即時連線一樣呈現。
+
+檔案格式：MAGIC 之後為連續的記錄，每筆為 <type:u8><time:f64><length:u32> 加上內容
+    REC_KEYFRAME  width, height, format, frameId (u32 x4) + zlib(整張像素，每列 width * bpp bytes)
+    REC_DELTA     frameId (u32), count (u32), count 個 (x, y, w, h) (u16 x4) + zlib(各圖塊像素依序串接)
+    REC_INPUT     count (u32), count 個 (type, flags, x, y) (i32 x4)
+    REC_LOSSY     與 REC_KEYFRAME 相同的欄位 + JPEG (大面積變動的幀，需要 opencv-python)
+"""
+import bisect
+import os
+import queue
+import struct
+import threading
+import time
+import zlib
+from collections import namedtuple
+
+import numpy as np
+
+from rdp_shm import BYTES_PER_PIXEL, SHM_FORMAT_RGB565, SHM_HEADER_SIZE, ShmMapping, SyntheticProducer, read_header
+
+try:
+    import cv2
+except ImportError:
+    cv2 = None
+
+MAGIC = b'RDPREC\x00\x01'
+REC_KEYFRAME = 1
+REC_DELTA = 2
+REC_INPUT = 3
+REC_LOSSY = 4
+
+# 比對與儲存差異的圖塊邊長 (像素)
+TILE_SIZE = 64
+# 關鍵幀間隔 (秒)，決定播放時跳轉需要重播的差異數量
+KEYFRAME_INTERVAL = 10.0
+# 擷取與寫入之間的佇列長度，滿了就丟幀
+QUEUE_SIZE = 8
+# 擷取頻率上限
+MAX_FPS = 30
+# zlib 壓縮等級：桌面畫面以 1 即可取得大部分的壓縮率
+ZLIB_LEVEL = 1
+# 一幀改變的面積超過此比例時視為動態畫面，以 JPEG 儲存 (需要 opencv-python)
+MOTION_AREA = 0.5
+JPEG_QUALITY = 85
+
+_RECORD_STRUCT = struct.Struct('<BdI')
+_KEYFRAME_STRUCT = struct.Struct('<IIII')
+_DELTA_STRUCT = struct.Struct('<II')
+_TILE_STRUCT = struct.Struct('<HHHH')
+_U32_STRUCT = struct.Struct('<I')
+_INPUT_STRUCT = struct.Struct('<iiii')
+
+Record = namedtuple('Record', 'type time offset length')
+
+
+def _tiles(rect, tile):
+    """把矩形切成對齊圖塊格線的子矩形"""
+    x, y, w, h = rect
+    for ty in range(y - y % tile, y + h, tile):
+        for tx in range(x - x % tile, x + w, tile):
+            left, top = max(tx, x), max(ty, y)
+            yield left, top, min(tx + tile, x + w) - left, min(ty + tile, y + h) - top
+
+
+class Recorder:
+    """錄製 RdpSession 的畫面與輸入
+
+    notify() 只喚醒擷取執行緒，可在排程器執行緒或 UI 執行緒呼叫；source 為 RdpSession 時
+    自動註冊其畫面與輸入通知，不經由 RdpSession 送出的輸入以 log_input() 記錄。
+    """
+    def __init__(self, source, path, keyframe_interval=KEYFRAME_INTERVAL, queue_size=QUEUE_SIZE,
+                 max_fps=MAX_FPS, tile=TILE_SIZE, level=ZLIB_LEVEL, lossy=True, jpeg_quality=JPEG_QUALITY):
+        self.source = source
+        self.path = path
+        self.keyframe_interval = keyframe_interval
+        self.min_interval = 1.0 / max_fps if max_fps else 0
+        self.tile = tile
+        self.level = level
+        self.lossy = lossy and cv2 is not None
+        self.jpeg_quality = jpeg_quality
+        self.file = open(path, 'wb')
+        self.file.write(MAGIC)
+        self.queue = queue.Queue(queue_size)
+        self.start = time.monotonic()
+        self.last_fid = None
+        # 擷取執行緒下一次需要整張畫面 (開始、丟幀、換來源或解析度變更)
+        self._want_full = True
+        self._wake = threading.Event()
+        self._stop_event = threading.Event()
+        self._inputs = []
+        self._input_lock = threading.Lock()
+        self.stopped = False
+        # 寫入執行緒的狀態：播放端重建出的畫面與最後一張關鍵幀的時間
+        self._canvas = None
+        self._canvas_format = None
+        self._last_keyframe = None
+        # 播放端目前顯示的是有損的畫面，變動停止後需要一張無損關鍵幀
+        self._lossy_shown = False
+        # 統計
+        self.captured = 0
+        self.dropped = 0
+        self.keyframes = 0
+        self.lossy_frames = 0
+        self.deltas = 0
+        self.tiles_written = 0
+        self.captured_bytes = 0
+        self.written_bytes = len(MAGIC)
+        self._listen(source)
+        self._capture_thread = threading.Thread(target=self._capture_loop, name="RecorderCapture", daemon=True)
+        self._writer_thread = threading.Thread(target=self._write_loop, name="RecorderWriter", daemon=True)
+        self._capture_thread.start()
+        self._writer_thread.start()
+
+    def _listen(self, source):
+        if hasattr(source, 'add_listener'):
+            source.add_listener(self._on_session_event)
+            source.add_input_listener(self.log_input)
+
+    def _unlisten(self, source):
+        if hasattr(source, 'remove_listener'):
+            source.remove_listener(self._on_session_event)
+            source.remove_input_listener(self.log_input)
+
+    def _on_session_event(self, session, connected):
+        if connected: self.notify()
+
+    def set_source(self, source):
+        """換上新的來源 (重新連線後)，下一次擷取整張畫面"""
+        self._unlisten(self.source)
+        self.source = source
+        self.last_fid = None
+        self._want_full = True
+        self._listen(source)
+        self.notify()
+
+    # --- 擷取端 ---
+
+    def notify(self):
+        """有新幀時呼叫，不做任何複製"""
+        self._wake.set()
+
+    def log_input(self, events):
+        """記錄一批 (type, flags, x, y) 輸入事件"""
+        t = time.monotonic() - self.start
+        with self._input_lock: self._inputs.append((t, list(events)))
+
+    def _capture_loop(self):
+        self.notify()
+        while not self._stop_event.is_set():
+            self._wake.wait()
+            self._wake.clear()
+            if self._stop_event.is_set(): break
+            started = time.monotonic()
+            self._capture()
+            # 限制擷取頻率：期間的通知合併為一次擷取
+            if self._stop_event.wait(max(0, started + self.min_interval - time.monotonic())): break
+
+    def _capture(self):
+        try:
+            ok, item = self.source.read(self._grab)
+        except (ValueError, OSError) as e:
+            print(f"[Record] 讀取畫面失敗: {e}")
+            return
+        if not ok or item is None: return
+        self.last_fid = item[1]
+        try:
+            self.queue.put_nowait(item)
+        except queue.Full:
+            # 寫入端跟不上：丟掉這一幀，之後的髒矩形無法補回遺漏的變化，
+            # 因此下一次擷取整張
+            self.dropped += 1
+            self._want_full = True
+            return
+        self.captured += 1
+        self.captured_bytes += sum(block.nbytes for block in item[7])
+        if item[5]: self._want_full = False
+
+    def _grab(self, header, view):
+        """在 seqlock 讀取區段內複製髒矩形 (或整張畫面)"""
+        if view is None or header.frame_id == self.last_fid: return None
+        consecutive = self.last_fid is not None and header.frame_id == (self.last_fid + 1) & 0xFFFFFFFF
+        full = self._want_full or not consecutive or header.damage is None
+        rects = ((0, 0, header.width, header.height),) if full else header.damage
+        # copy() 一定複製 (整張連續的畫面時 ascontiguousarray 會直接回傳共享記憶體的視圖)
+        blocks = [view[y:y + h, x:x + w].copy().view(np.uint8).reshape(h, -1) for x, y, w, h in rects]
+        return (time.monotonic() - self.start, header.frame_id, header.width, header.height, header.format,
+                full, rects, blocks)
+
+    # --- 寫入端 ---
+
+    def _write_record(self, rec_type, t, payload):
+        self.file.write(_RECORD_STRUCT.pack(rec_type, t, len(payload)))
+        self.file.write(payload)
+        self.written_bytes += _RECORD_STRUCT.size + len(payload)
+
+    def _write_inputs(self):
+        with self._input_lock: inputs, self._inputs = self._inputs, []
+        for t, events in inputs:
+            payload = _U32_STRUCT.pack(len(events)) + b''.join(_INPUT_STRUCT.pack(*e) for e in events)
+            self._write_record(REC_INPUT, t, payload)
+
+    def _write_loop(self):
+        while True:
+            item = self.queue.get()
+            if item is None: break
+            try:
+                self._write_inputs()
+                self._write_frame(*item)
+            except OSError as e:
+                print(f"[Record] 寫入 {self.path} 失敗: {e}")
+        try:
+            self._write_inputs()
+        except OSError as e:
+            print(f"[Record] 寫入 {self.path} 失敗: {e}")
+        self.file.close()
+
+    def _write_frame(self, t, fid, width, height, fmt, full, rects, blocks):
+        bpp = BYTES_PER_PIXEL[fmt]
+        if self._canvas is None or self._canvas.shape != (height, width * bpp) or fmt != self._canvas_format:
+            # 第一幀或解析度/格式變更：需要整張畫面作為關鍵幀
+            if not full:
+                self._want_full = True
+                return
+            self._canvas, self._canvas_format = blocks[0], fmt
+            self._write_keyframe(t, fid)
+            return
+        canvas = self._canvas
+        changed = []
+        for (x, y, w, h), block in zip(rects, blocks):
+            for tx, ty, tw, th in _tiles((x, y, w, h), self.tile):
+                src = block[ty - y:ty - y + th, (tx - x) * bpp:(tx - x + tw) * bpp]
+                dst = canvas[ty:ty + th, tx * bpp:(tx + tw) * bpp]
+                if np.array_equal(src, dst): continue
+                dst[...] = src
+                changed.append((tx, ty, tw, th))
+        if not changed: return
+        # canvas 永遠是最新的完整畫面，關鍵幀直接由它產生，不需要再擷取整張
+        if self.lossy and sum(w * h for _, _, w, h in changed) >= MOTION_AREA * width * height:
+            self._write_lossy(t, fid, width, height, fmt)
+        elif self._lossy_shown or t - self._last_keyframe >= self.keyframe_interval:
+            self._write_keyframe(t, fid)
+        else:
+            data = [np.ascontiguousarray(canvas[y:y + h, x * bpp:(x + w) * bpp]) for x, y, w, h in changed]
+            self._write_record(REC_DELTA, t, _DELTA_STRUCT.pack(fid, len(changed))
+                               + b''.join(_TILE_STRUCT.pack(*r) for r in changed)
+                               + zlib.compress(b''.join(data), self.level))
+            self.deltas += 1
+            self.tiles_written += len(changed)
+
+    def _write_keyframe(self, t, fid):
+        height, row = self._canvas.shape
+        width = row // BYTES_PER_PIXEL[self._canvas_format]
+        self._write_record(REC_KEYFRAME, t, _KEYFRAME_STRUCT.pack(width, height, self._canvas_format, fid)
+                           + zlib.compress(self._canvas, self.level))
+        self._last_keyframe = t
+        self._lossy_shown = False
+        self.keyframes += 1
+
+    def _write_lossy(self, t, fid, width, height, fmt):
+        """大面積變動 (影片、捲動) 以 JPEG 存整張畫面，壓縮比 zlib 快十倍以上；
+        變動停止後補一張無損關鍵幀"""
+        if fmt == SHM_FORMAT_RGB565: bgr = cv2.cvtColor(self._canvas.reshape(height, width, 2), cv2.COLOR_BGR5652BGR)
+        else: bgr = cv2.cvtColor(self._canvas.reshape(height, width, 4), cv2.COLOR_BGRA2BGR)
+        ok, jpeg = cv2.imencode('.jpg', bgr, [cv2.IMWRITE_JPEG_QUALITY, self.jpeg_quality])
+        if not ok:
+            self._write_keyframe(t, fid)
+            return
+        self._write_record(REC_LOSSY, t, _KEYFRAME_STRUCT.pack(width, height, fmt, fid) + jpeg.tobytes())
+        self._last_keyframe = t
+        self._lossy_shown = True
+        self.lossy_frames += 1
+
+    # --- 結束 ---
+
+    def stop(self):
+        """停止擷取，寫完佇列中的幀後關閉檔案"""
+        if self.stopped: return
+        self.stopped = True
+        self._unlisten(self.source)
+        self._stop_event.set()
+        self._wake.set()
+        self._capture_thread.join()
+        self.queue.put(None)
+        self._writer_thread.join()
+
+    def __enter__(self): return self
+    def __exit__(self, *exc): self.stop()
+
+
+class RecordingPlayer:
+    """讀取錄影檔並重建任意時間點的畫面
+
+    開啟時只掃描記錄標頭建立索引 (輸入事件直接解碼)，畫面內容在需要時才讀取解壓。
+    seek(t) 從 t 之前最近的關鍵幀開始套用差異；往後播放時 advance(t) 只套用新的記錄。
+    """
+    def __init__(self, path):
+        self.file = open(path, 'rb')
+        if self.file.read(len(MAGIC)) != MAGIC:
+            self.file.close()
+            raise ValueError(f"{path} 不是 RDP 錄影檔")
+        self.records = []
+        self.keyframes = []
+        self.inputs = []
+        self._scan()
+        self.keyframe_times = [self.records[i].time for i in self.keyframes]
+        self.duration = max([r.time for r in self.records] + [t for t, _ in self.inputs] + [0])
+        self.canvas = None
+        self.width = self.height = 0
+        self.format = None
+        self.frame_id = 0
+        self.position = 0
+        self.time = 0.0
+
+    def _scan(self):
+        size = os.fstat(self.file.fileno()).st_size
+        offset = len(MAGIC)
+        while True:
+            head = self.file.read(_RECORD_STRUCT.size)
+            # 錄影中斷時最後一筆記錄可能不完整，忽略即可
+            if len(head) < _RECORD_STRUCT.size: break
+            rec_type, t, length = _RECORD_STRUCT.unpack(head)
+            offset += _RECORD_STRUCT.size
+            if rec_type == REC_INPUT:
+                payload = self.file.read(length)
+                if len(payload) < length: break
+                count = _U32_STRUCT.unpack_from(payload)[0]
+                self.inputs.append((t, [_INPUT_STRUCT.unpack_from(payload, 4 + i * _INPUT_STRUCT.size)
+                                        for i in range(count)]))
+            else:
+                if offset + length > size: break
+                self.file.seek(length, 1)
+                if rec_type in (REC_KEYFRAME, REC_LOSSY): self.keyframes.append(len(self.records))
+                self.records.append(Record(rec_type, t, offset, length))
+            offset += length
+        self.inputs.sort(key=lambda item: item[0])
+
+    def _payload(self, rec):
+        self.file.seek(rec.offset)
+        return self.file.read(rec.length)
+
+    def _load_keyframe(self, rec):
+        payload = self._payload(rec)
+        self.width, self.height, self.format, self.frame_id = _KEYFRAME_STRUCT.unpack_from(payload)
+        pixels = zlib.decompress(payload[_KEYFRAME_STRUCT.size:])
+        self.canvas = np.frombuffer(bytearray(pixels), dtype=np.uint8).reshape(self.height, -1)
+
+    def _load_lossy(self, rec):
+        if cv2 is None: raise RuntimeError("播放有損的幀需要 opencv-python")
+        payload = self._payload(rec)
+        self.width, self.height, self.format, self.frame_id = _KEYFRAME_STRUCT.unpack_from(payload)
+        bgr = cv2.imdecode(np.frombuffer(payload, np.uint8, offset=_KEYFRAME_STRUCT.size), cv2.IMREAD_COLOR)
+        if self.format == SHM_FORMAT_RGB565: pixels = cv2.cvtColor(bgr, cv2.COLOR_BGR2BGR565)
+        else: pixels = cv2.cvtColor(bgr, cv2.COLOR_BGR2BGRA)
+        self.canvas = pixels.reshape(self.height, -1)
+
+    def _apply_delta(self, rec):
+        payload = self._payload(rec)
+        self.frame_id, count = _DELTA_STRUCT.unpack_from(payload)
+        off = _DELTA_STRUCT.size
+        rects = [_TILE_STRUCT.unpack_from(payload, off + i * _TILE_STRUCT.size) for i in range(count)]
+        data = zlib.decompress(payload[off + count * _TILE_STRUCT.size:])
+        bpp = BYTES_PER_PIXEL[self.format]
+        pos = 0
+        for x, y, w, h in rects:
+            size = w * h * bpp
+            self.canvas[y:y + h, x * bpp:(x + w) * bpp] = np.frombuffer(data, np.uint8, size, pos).reshape(h, -1)
+            pos += size
+        return rects
+
+    def advance(self, t):
+        """套用時間不超過 t 的記錄，回傳改變的矩形清單 (None 表示整張畫面都換過)"""
+        changed = []
+        while self.position < len(self.records) and self.records[self.position].time <= t:
+            rec = self.records[self.position]
+            self.position += 1
+            if rec.type == REC_KEYFRAME:
+                self._load_keyframe(rec)
+                changed = None
+            elif rec.type == REC_LOSSY:
+                self._load_lossy(rec)
+                changed = None
+            elif self.canvas is not None:
+                rects = self._apply_delta(rec)
+                if changed is not None: changed.extend(rects)
+        self.time = max(self.time, t)
+        return changed
+
+    def seek(self, t):
+        """跳到時間 t 並回傳該時間的畫面 (t 早於第一張關鍵幀時為第一張)；
+        沒有任何畫面時回傳 None"""
+        if not self.keyframes: return None
+        k = self.keyframes[max(0, bisect.bisect_right(self.keyframe_times, t) - 1)]
+        # 目前的畫面已在該關鍵幀之後且不需倒退時直接往後套用
+        if self.canvas is None or self.position <= k or t < self.time:
+            self.position, self.time = k, 0.0
+        self.advance(max(t, self.records[k].time))
+        self.time = t
+        return self.frame()
+
+    def frame(self):
+        """目前的畫面：BGRA32 為 (height, width, 4) uint8，RGB565 為 (height, width) uint16"""
+        if self.canvas is None: return None
+        if BYTES_PER_PIXEL[self.format] == 2: return self.canvas.view('<u2')
+        return self.canvas.reshape(self.height, self.width, 4)
+
+    def frames(self):
+        """依序產生 (time, 畫面, 改變的矩形) ，矩形為 None 表示整張"""
+        self.position, self.time, self.canvas = 0, 0.0, None
+        while self.position < len(self.records):
+            t = self.records[self.position].time
+            changed = self.advance(t)
+            if self.canvas is not None: yield t, self.frame(), changed
+
+    def inputs_between(self, start, end):
+        """時間在 [start, end) 之間的輸入批次 (time, events)"""
+        times = [t for t, _ in self.inputs]
+        return self.inputs[bisect.bisect_left(times, start):bisect.bisect_left(times, end)]
+
+    def close(self):
+        self.file.close()
+
+    def __enter__(self): return self
+    def __exit__(self, *exc): self.close()
+
+
+class PlaybackBackend:
+    """以錄影驅動 RdpGLWidget 的後端
+
+    把重建的畫面寫入模擬的共享記憶體 (SyntheticProducer)，提供與 RdpBackend 相同的畫面介面；
+    輸入一律忽略。tick() 依時鐘推進播放並回傳是否有新幀。
+    """
+    def __init__(self, player, clock=time.monotonic):
+        self.player = player
+        self.clock = clock
+        self.producer = None
+        self.mapping = None
+        self.paused = False
+        self._origin = clock()
+        self._paused_at = 0.0
+        self.seek(0)
+
+    @property
+    def shm(self): return self.mapping.buf if self.mapping else None
+
+    @property
+    def position(self):
+        if self.paused: return self._paused_at
+        return min(self.clock() - self._origin, self.player.duration)
+
+    @property
+    def finished(self): return self.position >= self.player.duration
+
+    def pause(self):
+        if self.paused: return
+        self._paused_at = self.position
+        self.paused = True
+
+    def resume(self):
+        if not self.paused: return
+        if self._paused_at >= self.player.duration: self.seek(0)
+        self._origin = self.clock() - self._paused_at
+        self.paused = False
+
+    def seek(self, t):
+        t = min(max(t, 0.0), self.player.duration)
+        if self.player.seek(t) is not None: self._show(None)
+        self._paused_at = t
+        self._origin = self.clock() - t
+
+    def tick(self):
+        if self.paused: return False
+        changed = self.player.advance(self.position)
+        if changed is not None and not changed: return False
+        self._show(changed)
+        return True
+
+    def _show(self, rects):
+        player = self.player
+        if self.producer is None:
+            self.producer = SyntheticProducer(player.width, player.height, fmt=player.format)
+            self.mapping = ShmMapping(self.producer.open)
+            self.mapping.remap()
+        producer = self.producer
+        if (producer.width, producer.height, producer.format) != (player.width, player.height, player.format):
+            producer.format, producer.bpp = player.format, BYTES_PER_PIXEL[player.format]
+            producer.resize(player.width, player.height)
+            rects = None
+        bpp = producer.bpp
+        for x, y, w, h in rects if rects is not None else ((0, 0, player.width, player.height),):
+            producer.write_rect(x, y, w, h, np.ascontiguousarray(player.canvas[y:y + h, x * bpp:(x + w) * bpp]))
+        producer.publish()
+
+    # --- 與 RdpBackend 相同的畫面介面 ---
+
+    def check_new_frame(self, last_fid):
+        if not self.shm: return None
+        self.mapping.check()
+        header = read_header(self.shm)
+        if header.width == 0 or header.frame_id == last_fid: return None
+        return header
+
+    def get_pixel_address(self): return self.mapping.address + SHM_HEADER_SIZE
+    def send_input_batch(self, events): pass
+    def sync_locks(self, num_lock, caps_lock, scroll_lock): pass
+
+    def close(self):
+        if self.mapping: self.mapping.close()
+        if self.producer: self.producer.close()
+        self.player.close()
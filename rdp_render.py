@@ -0,0 +1,193 @@
+"""GPU 繪製管線
+
+以 VBO + shader 將遠端畫面紋理畫到視窗，縮放與縮小濾波都在 GPU 上完成，
+並提供與繪製相同的座標轉換，讓縮放後的滑鼠點擊仍落在正確位置。
+"""
+import ctypes
+import math
+
+from OpenGL.GL import (
+    glGenBuffers, glDeleteBuffers, glBindBuffer, glBufferData, glUseProgram, glDeleteProgram,
+    glGetAttribLocation, glGetUniformLocation, glUniform1i, glUniform2f,
+    glEnableVertexAttribArray, glDisableVertexAttribArray, glVertexAttribPointer, glDrawArrays,
+    glViewport, glClear, glClearColor, glBindTexture, glTexParameteri, glEnable, glDisable,
+    glBegin, glEnd, glTexCoord2f, glVertex2f,
+    GL_ARRAY_BUFFER, GL_STATIC_DRAW, GL_FLOAT, GL_FALSE, GL_TRIANGLE_STRIP, GL_QUADS,
+    GL_VERTEX_SHADER, GL_FRAGMENT_SHADER, GL_COLOR_BUFFER_BIT,
+    GL_TEXTURE_2D, GL_TEXTURE_MIN_FILTER, GL_TEXTURE_MAG_FILTER, GL_LINEAR, GL_NEAREST,
+)
+from OpenGL.GL.shaders import compileProgram, compileShader
+from OpenGL.error import GLError, NullFunctionError
+
+# 縮放模式
+SCALE_LETTERBOX = 'letterbox'  # 維持長寬比置中，其餘補黑邊
+SCALE_INTEGER = 'integer'      # 整數倍放大 (像素清晰)，視窗小於畫面時退回 letterbox
+SCALE_STRETCH = 'stretch'      # 拉伸填滿視窗 (舊行為)
+SCALE_MODES = (SCALE_LETTERBOX, SCALE_INTEGER, SCALE_STRETCH)
+
+_VERTEX_SHADER = """
+#version 120
+attribute vec2 a_pos;
+attribute vec2 a_uv;
+varying vec2 v_uv;
+void main() {
+    v_uv = a_uv;
+    gl_Position = vec4(a_pos, 0.0, 1.0);
+}
+"""
+
+# 縮小時在每個輸出像素覆蓋的來源範圍內做 4x4 雙線性取樣平均 (近似面積濾波)，
+# 避免單點取樣造成文字閃爍與鋸齒；放大或 1:1 時只取樣一次
+_FRAGMENT_SHADER = """
+#version 120
+uniform sampler2D u_tex;
+uniform vec2 u_texel;
+uniform vec2 u_footprint;
+varying vec2 v_uv;
+void main() {
+    if (max(u_footprint.x, u_footprint.y) <= 1.0) {
+        gl_FragColor = vec4(texture2D(u_tex, v_uv).rgb, 1.0);
+        return;
+    }
+    vec2 span = u_footprint * u_texel;
+    vec3 acc = vec3(0.0);
+    for (int j = 0; j < 4; j++) {
+        for (int i = 0; i < 4; i++) {
+            vec2 offset = (vec2(float(i), float(j)) + 0.5) / 4.0 - 0.5;
+            acc += texture2D(u_tex, v_uv + offset * span).rgb;
+        }
+    }
+    gl_FragColor = vec4(acc / 16.0, 1.0);
+}
+"""
+
+# 三角帶：位置 (x, y) + 紋理座標 (u, v)，紋理第 0 列為畫面頂端
+_QUAD = (ctypes.c_float * 16)(
+    -1.0, 1.0, 0.0, 0.0,
+    1.0, 1.0, 1.0, 0.0,
+    -1.0, -1.0, 0.0, 1.0,
+    1.0, -1.0, 1.0, 1.0,
+)
+# 畫到 FBO 紋理時上下顛倒，讓目標紋理同樣以第 0 列為畫面頂端
+_QUAD_FLIPPED = (ctypes.c_float * 16)(
+    -1.0, -1.0, 0.0, 0.0,
+    1.0, -1.0, 1.0, 0.0,
+    -1.0, 1.0, 0.0, 1.0,
+    1.0, 1.0, 1.0, 1.0,
+)
+
+
+def compute_viewport(src_w, src_h, dst_w, dst_h, mode=SCALE_LETTERBOX):
+    """計算畫面在視窗中的顯示區域 (x, y, w, h)，以視窗左上角為原點"""
+    if src_w <= 0 or src_h <= 0 or mode == SCALE_STRETCH:
+        return 0.0, 0.0, float(dst_w), float(dst_h)
+    scale = min(dst_w / src_w, dst_h / src_h)
+    if mode == SCALE_INTEGER and scale >= 1.0:
+        scale = math.floor(scale)
+    w, h = src_w * scale, src_h * scale
+    return (dst_w - w) / 2.0, (dst_h - h) / 2.0, w, h
+
+
+def map_to_source(x, y, viewport, src_w, src_h):
+    """將視窗座標轉換為遠端桌面座標，顯示區域外的點夾到邊緣"""
+    vx, vy, vw, vh = viewport
+    if src_w <= 0 or src_h <= 0 or vw <= 0 or vh <= 0:
+        return int(x), int(y)
+    sx = int((x - vx) * src_w / vw)
+    sy = int((y - vy) * src_h / vh)
+    return min(max(sx, 0), src_w - 1), min(max(sy, 0), src_h - 1)
+
+
+class FrameRenderer:
+    """以 shader 繪製紋理；shader 不可用時退回固定管線"""
+    def __init__(self):
+        self.program = None
+        self.vbo = None
+        self.vbo_flipped = None
+        self.filter = None
+
+    def initialize(self):
+        try:
+            self.program = compileProgram(compileShader(_VERTEX_SHADER, GL_VERTEX_SHADER),
+                                          compileShader(_FRAGMENT_SHADER, GL_FRAGMENT_SHADER))
+        except (GLError, NullFunctionError, RuntimeError) as e:
+            print(f"[GL] Shader 建立失敗，改用固定管線: {e}")
+            self.program = None
+            return
+        self.a_pos = glGetAttribLocation(self.program, "a_pos")
+        self.a_uv = glGetAttribLocation(self.program, "a_uv")
+        self.u_tex = glGetUniformLocation(self.program, "u_tex")
+        self.u_texel = glGetUniformLocation(self.program, "u_texel")
+        self.u_footprint = glGetUniformLocation(self.program, "u_footprint")
+        self.vbo, self.vbo_flipped = glGenBuffers(2)
+        for vbo, quad in ((self.vbo, _QUAD), (self.vbo_flipped, _QUAD_FLIPPED)):
+            glBindBuffer(GL_ARRAY_BUFFER, vbo)
+            glBufferData(GL_ARRAY_BUFFER, ctypes.sizeof(quad), quad, GL_STATIC_DRAW)
+        glBindBuffer(GL_ARRAY_BUFFER, 0)
+
+    def _set_filter(self, texture_id, mode):
+        # 整數倍縮放用最近點取樣保持像素銳利，其餘用線性
+        gl_filter = GL_NEAREST if mode == SCALE_INTEGER else GL_LINEAR
+        if gl_filter == self.filter: return
+        glTexParameteri(GL_TEXTURE_2D, GL_TEXTURE_MIN_FILTER, gl_filter)
+        glTexParameteri(GL_TEXTURE_2D, GL_TEXTURE_MAG_FILTER, gl_filter)
+        self.filter = gl_filter
+
+    def draw(self, texture_id, tex_w, tex_h, viewport, surface_h, dpr=1.0, mode=SCALE_LETTERBOX, clear=True,
+             flip=False):
+        """清除畫面並將紋理畫在 viewport (視窗邏輯座標) 內；surface_h 為視窗邏輯高度
+
+        flip 為 True 時畫到 FBO 的紋理 (例如縮圖圖集)：viewport 的 y 直接對應紋理的列，
+        畫面上下顛倒，讓目標紋理與來源一樣以第 0 列為畫面頂端，
+        之後可以再以 draw() 畫到視窗。
+        """
+        if clear:
+            glClearColor(0, 0, 0, 1)
+            glClear(GL_COLOR_BUFFER_BIT)
+        if not texture_id or tex_w == 0: return
+        vx, vy, vw, vh = viewport
+        # GL 的視埠原點在左下角
+        y = vy if flip else surface_h - vy - vh
+        glViewport(int(round(vx * dpr)), int(round(y * dpr)), int(round(vw * dpr)), int(round(vh * dpr)))
+        glBindTexture(GL_TEXTURE_2D, texture_id)
+        self._set_filter(texture_id, mode)
+        if self.program is None:
+            self._draw_fixed(flip)
+        else:
+            self._draw_shader(tex_w, tex_h, vw * dpr, vh * dpr, flip)
+        glBindTexture(GL_TEXTURE_2D, 0)
+
+    def _draw_shader(self, tex_w, tex_h, out_w, out_h, flip=False):
+        glUseProgram(self.program)
+        glUniform1i(self.u_tex, 0)
+        glUniform2f(self.u_texel, 1.0 / tex_w, 1.0 / tex_h)
+        glUniform2f(self.u_footprint, tex_w / max(out_w, 1.0), tex_h / max(out_h, 1.0))
+        glBindBuffer(GL_ARRAY_BUFFER, self.vbo_flipped if flip else self.vbo)
+        glEnableVertexAttribArray(self.a_pos)
+        glEnableVertexAttribArray(self.a_uv)
+        glVertexAttribPointer(self.a_pos, 2, GL_FLOAT, GL_FALSE, 16, ctypes.c_void_p(0))
+        glVertexAttribPointer(self.a_uv, 2, GL_FLOAT, GL_FALSE, 16, ctypes.c_void_p(8))
+        glDrawArrays(GL_TRIANGLE_STRIP, 0, 4)
+        glDisableVertexAttribArray(self.a_pos)
+        glDisableVertexAttribArray(self.a_uv)
+        glBindBuffer(GL_ARRAY_BUFFER, 0)
+        glUseProgram(0)
+
+    def _draw_fixed(self, flip=False):
+        top, bottom = (-1, 1) if flip else (1, -1)
+        glEnable(GL_TEXTURE_2D)
+        glBegin(GL_QUADS)
+        glTexCoord2f(0, 0); glVertex2f(-1, top)
+        glTexCoord2f(1, 0); glVertex2f(1, top)
+        glTexCoord2f(1, 1); glVertex2f(1, bottom)
+        glTexCoord2f(0, 1); glVertex2f(-1, bottom)
+        glEnd()
+        glDisable(GL_TEXTURE_2D)
+
+    def release(self):
+        if self.vbo is not None:
+            glDeleteBuffers(2, [self.vbo, self.vbo_flipped])
+            self.vbo = self.vbo_flipped = None
+        if self.program is not None:
+            glDeleteProgram(self.program)
+            self.program = None
@@ -0,0 +1,335 @@
+"""多連線 I/O 排程器
+
+以一個 (或少數幾個) 執行緒同時等待所有連線的 FreeRDP 事件句柄，只在真的有網路/通道
+活動時喚醒並處理對應的連線，取代每個連線各自一條 HeartbeatThread + 一條 FrameWatcherThread。
+
+連線物件需提供：
+    get_event_handles() -> 可等待的句柄清單 (Windows 為 HANDLE，POSIX 為檔案描述元)
+    poll() -> POLL_DISCONNECTED / POLL_IDLE / POLL_FRAME，不可阻塞
+"""
+import os
+import select
+import sys
+import threading
+import time
+
+# 與 RdpBridge.h 的 RDPB_POLL_* 一致
+POLL_DISCONNECTED = 0
+POLL_IDLE = 1
+POLL_FRAME = 2
+
+# WaitForMultipleObjects 最多 64 個句柄，保留一個給喚醒事件
+MAX_WAIT_HANDLES = 63
+# 加入連線時替每個連線多保留的句柄數：通道開啟或幀率上限的計時器會讓句柄清單變長
+HANDLE_HEADROOM = 2
+# 連線超過這個時間 (毫秒) 沒被處理時主動 poll 一次，
+# 讓 FreeRDP 的計時器與斷線檢查照常運作
+IDLE_TIMEOUT_MS = 100
+
+
+class WaitError(OSError):
+    """等待失敗 (例如句柄已失效或超過上限)，迴圈需重新取得句柄"""
+
+
+class Win32Waiter:
+    """以 WaitForMultipleObjects 等待 HANDLE，喚醒事件為自動重設的 Win32 事件"""
+    INFINITE = 0xFFFFFFFF
+    WAIT_ABANDONED_0 = 0x80
+    WAIT_TIMEOUT = 0x102
+    WAIT_FAILED = 0xFFFFFFFF
+
+    def __init__(self):
+        import ctypes
+        from ctypes import wintypes
+        self._ctypes = ctypes
+        self._HANDLE = wintypes.HANDLE
+        self.kernel32 = ctypes.windll.kernel32
+        self.kernel32.CreateEventW.restype = wintypes.HANDLE
+        self.kernel32.WaitForMultipleObjects.argtypes = [wintypes.DWORD, ctypes.POINTER(wintypes.HANDLE),
+                                                         wintypes.BOOL, wintypes.DWORD]
+        self.kernel32.WaitForMultipleObjects.restype = wintypes.DWORD
+        self.kernel32.SetEvent.argtypes = [wintypes.HANDLE]
+        self.kernel32.CloseHandle.argtypes = [wintypes.HANDLE]
+        self.wakeup_handle = self.kernel32.CreateEventW(None, False, False, None)
+
+    def wake(self):
+        self.kernel32.SetEvent(self.wakeup_handle)
+
+    def clear(self):
+        pass  # 自動重設
+
+    def wait(self, handles, timeout_ms):
+        """回傳已就緒的句柄清單，逾時回傳空清單，失敗時拋出 WaitError"""
+        array = (self._HANDLE * len(handles))(*handles)
+        timeout = self.INFINITE if timeout_ms is None else int(timeout_ms)
+        index = self.kernel32.WaitForMultipleObjects(len(handles), array, False, timeout)
+        if index < len(handles): return [handles[index]]
+        if index == self.WAIT_TIMEOUT: return []
+        if self.WAIT_ABANDONED_0 <= index < self.WAIT_ABANDONED_0 + len(handles):
+            raise WaitError(f"句柄 {index - self.WAIT_ABANDONED_0} 已被放棄 (共 {len(handles)} 個)")
+        raise WaitError(f"WaitForMultipleObjects 失敗 (回傳 0x{index:X}，"
+                        f"錯誤碼 {self._ctypes.GetLastError()}，共 {len(handles)} 個句柄)")
+
+    def close(self):
+        if self.wakeup_handle:
+            self.kernel32.CloseHandle(self.wakeup_handle)
+            self.wakeup_handle = None
+
+
+class SelectWaiter:
+    """以 select 等待檔案描述元 (POSIX，供模擬連線與效能測試使用)"""
+    def __init__(self):
+        self.wakeup_handle, self._wakeup_w = os.pipe()
+        os.set_blocking(self.wakeup_handle, False)
+        os.set_blocking(self._wakeup_w, False)
+
+    def wake(self):
+        try:
+            os.write(self._wakeup_w, b'\0')
+        except BlockingIOError:
+            pass  # 管線已滿，迴圈必定會醒來
+
+    def clear(self):
+        try:
+            while os.read(self.wakeup_handle, 4096): pass
+        except BlockingIOError:
+            pass
+
+    def wait(self, handles, timeout_ms):
+        ready, _, _ = select.select(handles, [], [], None if timeout_ms is None else timeout_ms / 1000.0)
+        return ready
+
+    def close(self):
+        if self._wakeup_w is not None:
+            os.close(self.wakeup_handle); os.close(self._wakeup_w)
+            self._wakeup_w = None
+
+
+def default_waiter():
+    return Win32Waiter() if sys.platform == 'win32' else SelectWaiter()
+
+
+class _Entry:
+    __slots__ = ('session', 'on_frame', 'on_disconnect', 'handles', 'last_poll', 'metrics')
+
+    def __init__(self, session, on_frame, on_disconnect, handles, metrics=None):
+        self.session = session
+        self.on_frame = on_frame
+        self.on_disconnect = on_disconnect
+        self.handles = handles
+        self.last_poll = 0.0
+        self.metrics = metrics
+
+
+class SchedulerLoop(threading.Thread):
+    """單一等待迴圈，負責最多 max_handles 個句柄的連線
+
+    連線的句柄變多而超過上限時交給 relocate(entry) 移到其他迴圈 (由 SessionScheduler 提供)。
+    """
+    def __init__(self, waiter_factory, idle_timeout_ms, max_handles, relocate=None):
+        super().__init__(daemon=True, name="RdpScheduler")
+        self.waiter = waiter_factory()
+        self.idle_timeout = idle_timeout_ms / 1000.0
+        self.max_handles = max_handles
+        self.relocate = relocate
+        self.entries = {}
+        self.owner = {}
+        self.handle_count = 0
+        self.lock = threading.Lock()
+        self.pending = []
+        self.running = True
+        self.rotate = 0
+        self.wakeups = 0
+        self.polls = 0
+
+    def has_room(self, count):
+        """加入 count 個句柄的連線後，包含每個連線保留的 HANDLE_HEADROOM 是否仍在上限內"""
+        with self.lock:
+            adding = [entry for op, entry, _ in self.pending if op == 'add']
+        reserved = sum(len(entry.handles) for entry in adding)
+        sessions = len(self.entries) + len(adding) + 1
+        return self.handle_count + reserved + count + sessions * HANDLE_HEADROOM <= self.max_handles
+
+    def _request(self, op, entry):
+        done = threading.Event()
+        with self.lock:
+            self.pending.append((op, entry, done))
+        self.waiter.wake()
+        return done
+
+    def attach(self, entry):
+        return self._request('add', entry)
+
+    def detach(self, session):
+        """移除連線；回傳後迴圈不會再呼叫它的 poll()"""
+        if threading.current_thread() is self:
+            self._remove(session)
+            return
+        self._request('remove', session).wait()
+
+    def stop(self):
+        self.running = False
+        self.waiter.wake()
+        if threading.current_thread() is not self: self.join()
+        self.waiter.close()
+
+    def _apply_pending(self):
+        with self.lock:
+            pending, self.pending = self.pending, []
+        for op, item, done in pending:
+            if op == 'add':
+                self.entries[item.session] = item
+                self._index(item)
+            else:
+                self._remove(item)
+            done.set()
+
+    def _index(self, entry):
+        for handle in entry.handles: self.owner[handle] = entry
+        self.handle_count += len(entry.handles)
+
+    def _unindex(self, entry):
+        for handle in entry.handles: self.owner.pop(handle, None)
+        self.handle_count -= len(entry.handles)
+
+    def _remove(self, session):
+        entry = self.entries.pop(session, None)
+        if entry: self._unindex(entry)
+
+    def _refresh_handles(self, entry):
+        # FreeRDP 的句柄可能在處理事件時改變 (例如通道開啟)，只更新剛處理過的連線
+        handles = limit_handles(entry.session.get_event_handles(), self.max_handles)
+        if handles == entry.handles: return
+        self._unindex(entry)
+        entry.handles = handles
+        self._index(entry)
+        if self.handle_count > self.max_handles and len(self.entries) > 1 and self.relocate:
+            # 超過上限時等待會失敗，把這個連線移到還有空間的迴圈
+            self._remove(entry.session)
+            self.relocate(entry)
+
+    def _rebuild(self):
+        """等待失敗後重新取得所有連線的句柄 (失效的句柄通常已被 FreeRDP 換掉)"""
+        for entry in list(self.entries.values()):
+            if entry.session in self.entries: self._refresh_handles(entry)
+
+    def _service(self, entry, now):
+        entry.last_poll = now
+        self.polls += 1
+        if entry.metrics:
+            start = time.perf_counter()
+            result = entry.session.poll()
+            entry.metrics.polled(time.perf_counter() - start, result)
+        else:
+            result = entry.session.poll()
+        if result == POLL_DISCONNECTED:
+            self._remove(entry.session)
+            if entry.on_disconnect: entry.on_disconnect(entry.session)
+            return
+        if result == POLL_FRAME and entry.on_frame: entry.on_frame(entry.session)
+        self._refresh_handles(entry)
+
+    def run(self):
+        wakeup = self.waiter.wakeup_handle
+        while self.running:
+            self._apply_pending()
+            handles = list(self.owner)
+            # WaitForMultipleObjects 總是回傳最前面的就緒句柄，輪替起點避免後面的連線餓死
+            if handles:
+                self.rotate = (self.rotate + 1) % len(handles)
+                handles = handles[self.rotate:] + handles[:self.rotate]
+            timeout_ms = self.idle_timeout * 1000 if self.entries else None
+            try:
+                ready = self.waiter.wait([wakeup] + handles, timeout_ms)
+            except WaitError as e:
+                # 不當作逾時：否則失效的句柄會讓迴圈空轉。稍候並重建，
+                # 期間由閒置補 poll 處理連線
+                print(f"[Scheduler] {e}，重新取得句柄")
+                time.sleep(self.idle_timeout)
+                self._rebuild()
+                ready = []
+            self.wakeups += 1
+            if not self.running: break
+            now = time.monotonic()
+            serviced = set()
+            for handle in ready:
+                if handle == wakeup:
+                    self.waiter.clear()
+                    continue
+                entry = self.owner.get(handle)
+                if entry is None or entry.session in serviced: continue
+                serviced.add(entry.session)
+                self._service(entry, now)
+            # 長時間沒有活動的連線補 poll 一次
+            for entry in list(self.entries.values()):
+                if entry.session not in serviced and now - entry.last_poll >= self.idle_timeout:
+                    self._service(entry, now)
+
+
+def limit_handles(handles, max_handles):
+    """單一連線的句柄超過一個迴圈能等待的數量時只等待前面的，
+    其餘由閒置補 poll 處理"""
+    if len(handles) <= max_handles: return handles
+    print(f"[Scheduler] 連線的句柄數 {len(handles)} 超過上限 {max_handles}，只等待前 {max_handles} 個")
+    return handles[:max_handles]
+
+
+class SessionScheduler:
+    """以少數幾個等待迴圈驅動所有連線
+
+    每個迴圈最多等待 max_handles 個句柄，滿了才開新的迴圈執行緒。
+    on_frame(session) / on_disconnect(session) 在排程器執行緒中呼叫，
+    需要更新 UI 時請透過 Qt signal 轉回主執行緒。斷線的連線會自動移除。
+    傳入 metrics (rdp_metrics.SessionMetrics) 時記錄每次 poll 的耗時與發佈的幀數。
+    """
+    def __init__(self, waiter_factory=default_waiter, idle_timeout_ms=IDLE_TIMEOUT_MS, max_handles=MAX_WAIT_HANDLES):
+        self.waiter_factory = waiter_factory
+        self.idle_timeout_ms = idle_timeout_ms
+        self.max_handles = max_handles
+        self.loops = []
+        self.session_loop = {}
+        self.lock = threading.Lock()
+
+    def add(self, session, on_frame=None, on_disconnect=None, metrics=None):
+        handles = limit_handles(session.get_event_handles(), self.max_handles)
+        entry = _Entry(session, on_frame, on_disconnect, handles, metrics)
+        with self.lock:
+            loop = self._find_loop(len(entry.handles))
+            self.session_loop[session] = loop
+        loop.attach(entry).wait()
+
+    def _find_loop(self, count, exclude=None):
+        loop = next((l for l in self.loops if l is not exclude and l.has_room(count)), None)
+        if loop is None:
+            loop = SchedulerLoop(self.waiter_factory, self.idle_timeout_ms, self.max_handles, self._relocate)
+            self.loops.append(loop)
+            loop.start()
+        return loop
+
+    def _relocate(self, entry):
+        """在原本的迴圈執行緒中呼叫：
+        連線的句柄變多，移到還有空間的迴圈 (不等待，避免迴圈互相等待)"""
+        with self.lock:
+            old = self.session_loop.get(entry.session)
+            if old is None: return  # 正在被 remove()，不再加入
+            loop = self._find_loop(len(entry.handles), exclude=old)
+            self.session_loop[entry.session] = loop
+            loop.attach(entry)
+
+    def remove(self, session):
+        """停止驅動連線，回傳後即可安全釋放 (rdpb_free)"""
+        with self.lock:
+            loop = self.session_loop.pop(session, None)
+        if loop: loop.detach(session)
+
+    def stop(self):
+        with self.lock:
+            loops, self.loops = self.loops, []
+            self.session_loop.clear()
+        for loop in loops: loop.stop()
+
+    def stats(self):
+        """(執行緒數, 累計喚醒次數, 累計 poll 次數)"""
+        with self.lock:
+            loops = list(self.loops)
+        return len(loops), sum(l.wakeups for l in loops), sum(l.polls for l in loops)
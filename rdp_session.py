@@ -0,0 +1,245 @@
+"""無視窗的 RDP 連線 API
+
+自動化程式不需要 Qt 視窗：RdpSession 直接以 NumPy 陣列讀取共享記憶體中的畫面 (不複製)，
+以 wait_for_frame 等待新幀，並提供滑鼠/鍵盤輸入。連線由共用的 SessionScheduler 驅動，
+不為每個連線建立執行緒，一台主機可同時維持數百個連線。
+
+    session = connect("192.168.1.201", username="Admin", password="...")
+    header = session.wait_for_frame(timeout=10)
+    pixels = session.frame()          # (height, width, 4) BGRA，直接指向共享記憶體
+    session.click(100, 200)
+    session.close()
+
+RdpSession 只需要提供 mapping (ShmMapping) 與 send_input_batch 的後端，
+因此也能以 rdp_shm.SyntheticProducer 模擬的畫面驅動。
+"""
+import threading
+import time
+
+import numpy as np
+
+from rdp_worker import WorkerBackend, create_rdp_backend
+from rdp_metrics import registry
+from rdp_input import INPUT_KEYBOARD, INPUT_MOUSE, MOUSE_MOVE, key_flags
+from rdp_scheduler import SessionScheduler
+from rdp_shm import SHM_FORMAT_BGRA32, SHM_FORMAT_RGB565, SHM_HEADER_SIZE, read_consistent, read_header
+
+# 滑鼠按鍵 -> rdpb_send_mouse 的 (按下, 放開) flags
+BUTTON_FLAGS = {'left': (1, 2), 'right': (3, 4), 'middle': (7, 8)}
+WHEEL_UP = 5
+WHEEL_DOWN = 6
+
+_scheduler = None
+_scheduler_lock = threading.Lock()
+
+
+def default_scheduler():
+    """無視窗連線共用的排程器 (第一次使用時建立)"""
+    global _scheduler
+    with _scheduler_lock:
+        if _scheduler is None: _scheduler = SessionScheduler()
+        return _scheduler
+
+
+def frame_view(buf, header):
+    """以 NumPy 陣列指向 buffer 中的像素 (依 stride，不複製)
+
+    BGRA32 為 (height, width, 4) uint8，RGB565 為 (height, width) uint16；尚未發佈任何幀時回傳 None。
+    """
+    if header.width == 0 or header.height == 0: return None
+    # np.frombuffer 以 memoryview 持有映射，陣列存在期間
+    # mmap 無法被關閉 (解除映射後存取會當掉)
+    pixels = np.frombuffer(buf, dtype=np.uint8, count=header.stride * header.height, offset=SHM_HEADER_SIZE)
+    if header.format == SHM_FORMAT_RGB565:
+        return np.ndarray((header.height, header.width), dtype='<u2', buffer=pixels, strides=(header.stride, 2))
+    if header.format == SHM_FORMAT_BGRA32:
+        return np.ndarray((header.height, header.width, 4), dtype=np.uint8, buffer=pixels,
+                          strides=(header.stride, 4, 1))
+    raise ValueError(f"不支援的像素格式: {header.format}")
+
+
+class RdpSession:
+    """不需視窗的連線：畫面讀取、等待新幀與輸入
+
+    backend 需提供 mapping (ShmMapping) 與 send_input_batch(events)；傳入 scheduler 時由其驅動
+    (backend 另需 poll / get_event_handles)，否則由呼叫端在有新幀時呼叫 notify_frame()。
+    metrics (rdp_metrics.SessionMetrics) 記錄 poll、發佈與輸入，關閉時從 rdp_metrics.registry 移除。
+    """
+    def __init__(self, backend, scheduler=None, metrics=None):
+        self.backend = backend
+        self.mapping = backend.mapping
+        self.connected = True
+        self.scheduler = scheduler
+        self.metrics = metrics
+        self._cond = threading.Condition()
+        self._listeners = []
+        self._input_listeners = []
+        if scheduler is not None:
+            scheduler.add(backend, on_frame=lambda b: self.notify_frame(),
+                          on_disconnect=lambda b: self._on_disconnect(), metrics=metrics)
+
+    # --- 連線事件 (由排程器執行緒呼叫) ---
+
+    def add_listener(self, fn):
+        """註冊 fn(session, connected)：每發佈新幀時以 True 呼叫，斷線時以 False 呼叫一次"""
+        self._listeners.append(fn)
+
+    def remove_listener(self, fn):
+        if fn in self._listeners: self._listeners.remove(fn)
+
+    def add_input_listener(self, fn):
+        """註冊 fn(events)：每次經由 send() 送出輸入時以事件清單呼叫 (錄影用)"""
+        self._input_listeners.append(fn)
+
+    def remove_input_listener(self, fn):
+        if fn in self._input_listeners: self._input_listeners.remove(fn)
+
+    def notify_frame(self):
+        with self._cond: self._cond.notify_all()
+        for fn in self._listeners: fn(self, True)
+
+    def _on_disconnect(self):
+        with self._cond:
+            self.connected = False
+            self._cond.notify_all()
+        for fn in self._listeners: fn(self, False)
+
+    # --- 畫面 ---
+
+    def header(self):
+        """目前的 FrameHeader；發佈端已換代 (解析度變更) 時先重新映射"""
+        with self._cond:
+            self.mapping.check()
+            return read_header(self.mapping.buf)
+
+    @property
+    def frame_id(self):
+        return self.header().frame_id
+
+    def frame(self):
+        """目前畫面的 NumPy 陣列，直接指向共享記憶體 (不複製)
+
+        內容會隨遠端繪製持續變動；解析度變更後舊陣列仍可讀但不再更新，需重新呼叫。
+        需要不會被改寫的畫面時使用 capture()。
+        """
+        with self._cond:
+            self.mapping.check()
+            return frame_view(self.mapping.buf, read_header(self.mapping.buf))
+
+    def capture(self):
+        """複製一張一致的畫面 (seqlock 驗證)，回傳 (FrameHeader, ndarray)；
+        尚無畫面或一直被寫入打斷時回傳 (header, None)"""
+        with self._cond:
+            self.mapping.check()
+            buf = self.mapping.buf
+
+            def copy(header, attempt):
+                view = frame_view(buf, header)
+                return header, None if view is None else view.copy()
+
+            ok, result = read_consistent(buf, copy)
+            return result if ok else (read_header(buf), None)
+
+    def read(self, fn):
+        """在 seqlock 讀取區段內執行 fn(header, view)，只讀取 fn 需要的部分
+
+        回傳 (True, fn 的結果)；一直被寫入端打斷時回傳 (False, None)，fn 可能被呼叫多次。
+        """
+        with self._cond:
+            self.mapping.check()
+            buf = self.mapping.buf
+            return read_consistent(buf, lambda header, attempt: fn(header, frame_view(buf, header)))
+
+    def wait_for_frame(self, after_fid=None, timeout=None):
+        """等待 frameId 與 after_fid 不同的畫面並回傳其 FrameHeader，逾時回傳 None
+
+        after_fid 為 None 時等待目前之後的下一幀；連線中斷時拋出 ConnectionError。
+        """
+        deadline = None if timeout is None else time.monotonic() + timeout
+        with self._cond:
+            if after_fid is None: after_fid = self.header().frame_id
+            while True:
+                header = self.header()
+                if header.width and header.frame_id != after_fid: return header
+                if not self.connected: raise ConnectionError("RDP 連線已中斷")
+                remaining = None if deadline is None else deadline - time.monotonic()
+                if remaining is not None and remaining <= 0: return None
+                self._cond.wait(remaining)
+
+    # --- 輸入 ---
+
+    def send(self, events):
+        """依序送出 (type, flags, x, y) 事件清單，一次 DLL 呼叫"""
+        if not events: return
+        events = list(events)
+        self.backend.send_input_batch(events)
+        if self.metrics: self.metrics.input_sent(events)
+        for fn in self._input_listeners: fn(events)
+
+    def move(self, x, y):
+        self.send(((INPUT_MOUSE, MOUSE_MOVE, x, y),))
+
+    def mouse_down(self, x, y, button='left'):
+        self.send(((INPUT_MOUSE, MOUSE_MOVE, x, y), (INPUT_MOUSE, BUTTON_FLAGS[button][0], x, y)))
+
+    def mouse_up(self, x, y, button='left'):
+        self.send(((INPUT_MOUSE, MOUSE_MOVE, x, y), (INPUT_MOUSE, BUTTON_FLAGS[button][1], x, y)))
+
+    def click(self, x, y, button='left'):
+        down, up = BUTTON_FLAGS[button]
+        self.send(((INPUT_MOUSE, MOUSE_MOVE, x, y), (INPUT_MOUSE, down, x, y), (INPUT_MOUSE, up, x, y)))
+
+    def scroll(self, x, y, steps):
+        """滾輪：steps > 0 向上，每步 120"""
+        flags = WHEEL_UP if steps > 0 else WHEEL_DOWN
+        self.send([(INPUT_MOUSE, MOUSE_MOVE, x, y)] + [(INPUT_MOUSE, flags, x, y)] * abs(steps))
+
+    def key_down(self, scancode, extended=False):
+        self.send(((INPUT_KEYBOARD, key_flags(True, extended), scancode, 0),))
+
+    def key_up(self, scancode, extended=False):
+        self.send(((INPUT_KEYBOARD, key_flags(False, extended), scancode, 0),))
+
+    def press(self, scancode, extended=False):
+        """按下並放開一個鍵"""
+        self.send(((INPUT_KEYBOARD, key_flags(True, extended), scancode, 0),
+                   (INPUT_KEYBOARD, key_flags(False, extended), scancode, 0)))
+
+    def sync_locks(self, num_lock=False, caps_lock=False, scroll_lock=False):
+        self.backend.sync_locks(num_lock, caps_lock, scroll_lock)
+
+    def set_visible(self, visible):
+        """暫停 (False) 或恢復 (True) 伺服器送出畫面 (Suppress Output)；暫停期間不會有新幀，
+        恢復時整張重繪"""
+        self.backend.set_visible(visible)
+
+    def set_frame_rate(self, fps):
+        """發佈幀率上限 (0 為不限)；超過上限的繪製合併到下一幀，
+        伺服器的編碼不受影響"""
+        self.backend.set_frame_rate(fps)
+
+    # --- 結束 ---
+
+    def close(self):
+        if self.scheduler is not None: self.scheduler.remove(self.backend)
+        with self._cond:
+            self.connected = False
+            self._cond.notify_all()
+        self.backend.close()
+        if self.metrics: registry.unregister(self.metrics)
+
+    def __enter__(self): return self
+    def __exit__(self, *exc): self.close()
+
+
+def connect(server, port=3389, username="", password="", width=1024, height=768, color_depth=32, scheduler=None,
+            worker=False, profile=None):
+    """建立無視窗連線 (阻塞直到握手完成)；
+    DLL 在此時才載入 (worker 為真時只在工作程序中載入)
+
+    profile 為 rdp_profile.PROFILES 的名稱 (balanced/lan/wan/low_cpu)，None 時使用預設。
+    """
+    config = {'server': server, 'port': port, 'username': username, 'password': password,
+              'width': width, 'height': height, 'color_depth': color_depth, 'profile': profile}
+    backend = WorkerBackend(config) if worker else create_rdp_backend(config, None, None)
+    return RdpSession(backend, scheduler or default_scheduler(), metrics=registry.register(server))
@@ -0,0 +1,361 @@
+"""RdpBridge 共享記憶體版面配置與讀寫工具
+
+版面配置需與 RdpBridge.c 中的 ShmHeader 保持一致：
+    [0, SHM_HEADER_SIZE)  標頭 (識別碼/版本/映射大小/世代、尺寸、frameId、
+                          seqlock 序號、髒矩形清單)
+    [SHM_HEADER_SIZE, ...) 像素資料 (BGRA32，或 16 位元色深時的 RGB565)
+
+映射大小依協商後的桌面尺寸配置。伺服器變更解析度時發佈端建立新一代的映射
+(名稱 <base>_<generation>)，並更新舊映射標頭的 generation，讀取端據此重新映射。
+
+讀寫之間不使用互斥鎖，而是 seqlock：寫入端在繪製像素或更新標頭前後各遞增一次
+序號 (寫入中為奇數)，讀取端在序號為偶數且讀取前後不變時才視為一致的畫面。
+"""
+import ctypes
+import mmap
+import struct
+import sys
+import time
+from collections import namedtuple
+
+SHM_HEADER_SIZE = 4096
+SHM_MAGIC = 0x42504452  # "RDPB"
+SHM_VERSION = 2
+SHM_MAX_DAMAGE_RECTS = 64
+SHM_DAMAGE_FULL = 0xFFFFFFFF
+# 像素格式 (ShmHeader.format)
+SHM_FORMAT_BGRA32 = 0
+SHM_FORMAT_RGB565 = 1
+BYTES_PER_PIXEL = {SHM_FORMAT_BGRA32: 4, SHM_FORMAT_RGB565: 2}
+# 讀取端被寫入端打斷時的重試次數
+SEQLOCK_RETRIES = 4
+
+# magic, version, mapSize, generation
+_LAYOUT_STRUCT = struct.Struct('<IIII')
+# width, height, stride, frameId, damageCount, coalescedPaints, idleSteps, activeSteps
+_HEADER_STRUCT = struct.Struct('<IIIIIIII')
+_RECT_STRUCT = struct.Struct('<IIII')
+_U32_STRUCT = struct.Struct('<I')
+_GENERATION_OFFSET = 12
+_FRAME_OFFSET = 16
+_IDLE_STEPS_OFFSET = 40
+_SEQ_OFFSET = 48
+_FORMAT_OFFSET = 52
+# receivedKiB, busyUs (原本的保留欄位，舊版 DLL 為 0)
+_LINK_STRUCT = struct.Struct('<II')
+_LINK_OFFSET = 56
+_DAMAGE_OFFSET = 64
+
+# damage 為 None 表示需要整張上傳，否則為 (x, y, w, h) 的 tuple；format 為 SHM_FORMAT_*
+FrameHeader = namedtuple('FrameHeader', ['width', 'height', 'stride', 'frame_id', 'damage', 'format'])
+# coalesced_paints: 最新一幀合併的繪製次數；
+# idle_steps/active_steps: 累計未發佈/有發佈的 rdpb_step 次數
+# received_kib/busy_us: 累計收到的資料量 (KiB) 與處理事件的時間 (微秒)，
+# 32 位元溢位後從 0 繼續
+FrameStats = namedtuple('FrameStats', ['frame_id', 'coalesced_paints', 'idle_steps', 'active_steps',
+                                       'received_kib', 'busy_us'], defaults=(0, 0))
+# map_size: 映射總大小；generation: 映射世代
+ShmLayout = namedtuple('ShmLayout', ['version', 'map_size', 'generation'])
+
+
+def calc_shm_size(width, height, bpp=4):
+    return SHM_HEADER_SIZE + width * height * bpp
+
+
+def read_layout(buf):
+    """驗證識別碼與版本並讀取映射資訊，不符時拋出 ValueError"""
+    magic, version, map_size, generation = _LAYOUT_STRUCT.unpack_from(buf, 0)
+    if magic != SHM_MAGIC:
+        raise ValueError(f"共享記憶體識別碼不符: 0x{magic:08X}")
+    if version != SHM_VERSION:
+        raise ValueError(f"共享記憶體版本不符: {version} (需要 {SHM_VERSION})")
+    return ShmLayout(version, map_size, generation)
+
+
+def read_generation(buf):
+    return _U32_STRUCT.unpack_from(buf, _GENERATION_OFFSET)[0]
+
+
+def read_header(buf):
+    """從共享記憶體 (mmap 或任何 buffer) 讀取標頭"""
+    w, h, s, fid, count = _HEADER_STRUCT.unpack_from(buf, _FRAME_OFFSET)[:5]
+    fmt = _U32_STRUCT.unpack_from(buf, _FORMAT_OFFSET)[0]
+    if count == SHM_DAMAGE_FULL or count > SHM_MAX_DAMAGE_RECTS:
+        return FrameHeader(w, h, s, fid, None, fmt)
+    rects = tuple(_RECT_STRUCT.unpack_from(buf, _DAMAGE_OFFSET + i * _RECT_STRUCT.size) for i in range(count))
+    return FrameHeader(w, h, s, fid, rects, fmt)
+
+
+def read_seq(buf):
+    return _U32_STRUCT.unpack_from(buf, _SEQ_OFFSET)[0]
+
+
+def read_consistent(buf, read_fn, retries=SEQLOCK_RETRIES):
+    """以 seqlock 協定執行 read_fn(header, attempt)
+
+    只有在序號為偶數且 read_fn 前後不變時才回傳 (True, 結果)，
+    重試次數用盡仍被寫入端打斷則回傳 (False, None)。讀取端從不阻塞寫入端。
+    """
+    for attempt in range(retries):
+        seq = read_seq(buf)
+        if seq & 1:
+            time.sleep(0)
+            continue
+        result = read_fn(read_header(buf), attempt)
+        if read_seq(buf) == seq:
+            return True, result
+    return False, None
+
+
+def read_stats(buf):
+    """讀取發佈端的閒置/活動計數與連線統計"""
+    fid, _, coalesced, idle, active = _HEADER_STRUCT.unpack_from(buf, _FRAME_OFFSET)[3:]
+    received, busy = _LINK_STRUCT.unpack_from(buf, _LINK_OFFSET)
+    return FrameStats(fid, coalesced, idle, active, received, busy)
+
+
+def write_header(buf, width, height, stride, frame_id, damage, coalesced=0, idle=0, active=0,
+                 fmt=SHM_FORMAT_BGRA32):
+    """寫入標頭 (供模擬端使用)，damage 為 None 時標記整張更新"""
+    _U32_STRUCT.pack_into(buf, _FORMAT_OFFSET, fmt)
+    if damage is None:
+        count = SHM_DAMAGE_FULL
+    else:
+        count = len(damage)
+        for i, rect in enumerate(damage):
+            _RECT_STRUCT.pack_into(buf, _DAMAGE_OFFSET + i * _RECT_STRUCT.size, *rect)
+    _HEADER_STRUCT.pack_into(buf, _FRAME_OFFSET, width, height, stride, frame_id, count, coalesced, idle, active)
+
+
+def write_link_stats(buf, received_kib, busy_us):
+    """寫入累計的接收量與處理時間 (供模擬端使用)"""
+    _LINK_STRUCT.pack_into(buf, _LINK_OFFSET, received_kib & 0xFFFFFFFF, busy_us & 0xFFFFFFFF)
+
+
+def write_layout(buf, map_size, generation):
+    """寫入識別碼、版本與映射資訊 (供模擬端使用)"""
+    _LAYOUT_STRUCT.pack_into(buf, 0, SHM_MAGIC, SHM_VERSION, map_size, generation)
+
+
+def plan_upload(header, last_fid, tex_width, tex_height, force_full=False):
+    """決定本幀要上傳的區域
+
+    回傳 None 表示不需上傳，否則回傳要上傳的 (x, y, w, h) 矩形 tuple，
+    需要整張上傳時回傳只含整個畫面的單一矩形。
+    只有與上次上傳的幀連續 (中間沒有漏接) 時才能只上傳髒矩形。
+    """
+    if header.width == 0:
+        return None
+    full = ((0, 0, header.width, header.height),)
+    if force_full or header.width != tex_width or header.height != tex_height:
+        return full
+    if header.frame_id == last_fid:
+        return None
+    if header.damage is None or header.frame_id != (last_fid + 1) & 0xFFFFFFFF:
+        return full
+    if not header.damage:
+        return None
+    return header.damage
+
+
+class ShmMapping:
+    """依標頭的 mapSize 映射共享記憶體，發佈端換代 (解析度變更) 時自動重新映射
+
+    open_fn(size) 開啟發佈端目前的映射並回傳至少 size bytes 的 buffer；
+    先以標頭大小開啟讀取 mapSize，不足時再以完整大小重新開啟。
+    """
+    def __init__(self, open_fn):
+        self.open_fn = open_fn
+        self.buf = None
+        self.address = 0
+        self.map_size = 0
+        self.generation = None
+
+    def remap(self):
+        """映射發佈端目前的世代，標頭尚未就緒或版本不符時回傳 False"""
+        buf = self.open_fn(SHM_HEADER_SIZE)
+        try:
+            layout = read_layout(buf)
+            if len(buf) < layout.map_size:
+                buf.close()
+                buf = self.open_fn(layout.map_size)
+                layout = read_layout(buf)
+        except ValueError as e:
+            print(f"[SHM] {e}")
+            if buf is not self.buf: _close_buffer(buf)
+            return False
+        old = self.buf
+        self.buf = buf
+        self.address = ctypes.addressof(ctypes.c_char.from_buffer(buf))
+        self.map_size = layout.map_size
+        self.generation = layout.generation
+        if old is not None and old is not buf: _close_buffer(old)
+        return True
+
+    def check(self):
+        """發佈端已換代時重新映射，回傳是否換過映射"""
+        if self.buf is None: return self.remap()
+        if read_generation(self.buf) == self.generation: return False
+        return self.remap()
+
+    def close(self):
+        if self.buf is not None:
+            _close_buffer(self.buf)
+            self.buf = None
+            self.address = 0
+
+
+def open_named_shm(name, size):
+    """以名稱開啟發佈端建立的共享記憶體：Windows 為具名映射，
+    其他平台 (模擬發佈端) 為檔案路徑"""
+    if sys.platform == 'win32': return mmap.mmap(-1, size, tagname=name)
+    with open(name, 'r+b') as f:
+        return mmap.mmap(f.fileno(), size)
+
+
+def _close_buffer(buf):
+    try:
+        buf.close()
+    except BufferError:
+        pass  # 仍有 NumPy 視圖 (RdpSession.frame) 指向這個映射，最後一個視圖釋放時才解除映射
+
+
+class DamageAccumulator:
+    """與 C 端 Damage_Add 相同的髒矩形累積規則"""
+    def __init__(self, width, height):
+        self.width = width
+        self.height = height
+        self.rects = []
+        self.full = True
+
+    def add(self, x, y, w, h):
+        if self.full: return
+        if x < 0: w += x; x = 0
+        if y < 0: h += y; y = 0
+        if x >= self.width or y >= self.height or w <= 0 or h <= 0: return
+        w = min(w, self.width - x)
+        h = min(h, self.height - y)
+        for i, (rx, ry, rw, rh) in enumerate(self.rects):
+            ux, uy = min(rx, x), min(ry, y)
+            ur, ub = max(rx + rw, x + w), max(ry + rh, y + h)
+            if (ur - ux) * (ub - uy) <= rw * rh + w * h:
+                self.rects[i] = (ux, uy, ur - ux, ub - uy)
+                return
+        if len(self.rects) >= SHM_MAX_DAMAGE_RECTS:
+            self.full = True
+            return
+        self.rects.append((x, y, w, h))
+
+    def take(self):
+        """取出目前累積的矩形 (None 表示整張) 並重置"""
+        damage = None if self.full else tuple(self.rects)
+        self.rects = []
+        self.full = False
+        return damage
+
+
+class SyntheticProducer:
+    """以純 Python 模擬 RdpBridge 的畫面發佈端
+
+    寫入與 DLL 相同的標頭 + 像素版面配置，預設使用匿名 mmap，
+    讓消費端 (check_frame / RdpBackend) 不需連線伺服器即可運作。
+    消費端可以 ShmMapping(producer.open) 映射，resize() 會像 DLL 一樣換代。
+    alloc(size, generation) 可改為配置其他程序也能開啟的映射 (例如以世代命名的檔案)。
+    """
+    def __init__(self, width, height, shm=None, fmt=SHM_FORMAT_BGRA32, alloc=None):
+        self.width = width
+        self.height = height
+        self.format = fmt
+        self.bpp = BYTES_PER_PIXEL[fmt]
+        self.stride = width * self.bpp
+        self.generation = 1
+        self.alloc = alloc or (lambda size, generation: mmap.mmap(-1, size))
+        self.shm = shm if shm is not None else self.alloc(calc_shm_size(width, height, self.bpp), self.generation)
+        write_layout(self.shm, len(self.shm), self.generation)
+        self.frame_id = 0
+        self.damage = DamageAccumulator(width, height)
+        self.pending_paints = 0
+        self.idle_steps = 0
+        self.active_steps = 0
+        self.in_write = False
+        write_header(self.shm, 0, 0, 0, 0, None)
+
+    def open(self, size):
+        """ShmMapping 的 open_fn：匿名映射無法以名稱重新開啟，直接回傳目前的映射"""
+        return self.shm
+
+    def resize(self, width, height):
+        """模擬伺服器變更解析度：建立新一代映射並通知舊映射的讀取端"""
+        self._end_write()
+        old = self.shm
+        self.generation += 1
+        self.width, self.height = width, height
+        self.stride = width * self.bpp
+        self.shm = self.alloc(calc_shm_size(width, height, self.bpp), self.generation)
+        write_layout(self.shm, len(self.shm), self.generation)
+        write_header(self.shm, 0, 0, 0, self.frame_id, None, 0, self.idle_steps, self.active_steps, self.format)
+        self.damage = DamageAccumulator(width, height)
+        # 舊映射由消費端重新映射後關閉
+        _U32_STRUCT.pack_into(old, _GENERATION_OFFSET, self.generation)
+
+    def pixel_offset(self, x, y):
+        return SHM_HEADER_SIZE + y * self.stride + x * self.bpp
+
+    def _begin_write(self):
+        # 與 C 端相同：從第一次繪製到發佈為同一個寫入區段
+        if self.in_write: return
+        self.in_write = True
+        _U32_STRUCT.pack_into(self.shm, _SEQ_OFFSET, (read_seq(self.shm) + 1) & 0xFFFFFFFF)
+
+    def _end_write(self):
+        if not self.in_write: return
+        self.in_write = False
+        _U32_STRUCT.pack_into(self.shm, _SEQ_OFFSET, (read_seq(self.shm) + 1) & 0xFFFFFFFF)
+
+    def fill_rect(self, x, y, w, h, pixel):
+        """以單一顏色 (BGRA32 為 4 bytes，RGB565 為 2 bytes) 填滿矩形並記錄為髒區域"""
+        x0, y0 = max(0, x), max(0, y)
+        x1, y1 = min(self.width, x + w), min(self.height, y + h)
+        if x1 <= x0 or y1 <= y0: return
+        row = bytes(pixel) * (x1 - x0)
+        self._begin_write()
+        for row_y in range(y0, y1):
+            off = self.pixel_offset(x0, row_y)
+            self.shm[off:off + len(row)] = row
+        self.damage.add(x, y, w, h)
+        self.pending_paints += 1
+
+    def write_rect(self, x, y, w, h, data):
+        """寫入一塊像素 (data 為連續的 h 列，每列 w * bpp bytes) 並記錄為髒區域"""
+        data = memoryview(data).cast('B')
+        row = w * self.bpp
+        self._begin_write()
+        for i in range(h):
+            off = self.pixel_offset(x, y + i)
+            self.shm[off:off + row] = data[i * row:(i + 1) * row]
+        self.damage.add(x, y, w, h)
+        self.pending_paints += 1
+
+    def step(self):
+        """模擬 rdpb_step：有繪製才發佈，回傳新的 frameId，閒置時回傳 None"""
+        if self.pending_paints == 0 and not self.damage.full:
+            self.idle_steps += 1
+            _U32_STRUCT.pack_into(self.shm, _IDLE_STEPS_OFFSET, self.idle_steps)
+            return None
+        return self.publish()
+
+    def publish(self):
+        """無條件發佈累積的變更，回傳新的 frameId"""
+        self.frame_id = (self.frame_id + 1) & 0xFFFFFFFF
+        self.active_steps += 1
+        self._begin_write()
+        write_header(self.shm, self.width, self.height, self.stride, self.frame_id, self.damage.take(),
+                     self.pending_paints, self.idle_steps, self.active_steps, self.format)
+        self._end_write()
+        self.pending_paints = 0
+        return self.frame_id
+
+    def close(self):
+        if self.shm is not None:
+            self.shm.close()
+            self.shm = None
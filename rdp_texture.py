@@ -0,0 +1,224 @@
+"""紋理上傳路徑
+
+- DirectUploader：glTexSubImage2D 直接讀取共享記憶體 (同步，驅動程式在呼叫內完成複製)
+- PboUploader：以多個 Pixel Buffer Object 輪替串流，CPU 只做一次 memmove，
+  實際搬到 VRAM 的動作由 GPU 非同步完成，與繪製重疊；
+  驅動支援時使用持久映射 (persistent mapping)
+
+兩者介面相同，呼叫端必須已經 makeCurrent()。像素格式 (BGRA32 / RGB565) 交由 GL 直接取樣，
+不在 CPU 端轉換。
+"""
+import ctypes
+
+from OpenGL.GL import (
+    glBindTexture, glTexImage2D, glTexSubImage2D, glPixelStorei, glGetString, glGetIntegerv,
+    glGetStringi, glGenBuffers, glDeleteBuffers, glBindBuffer, glBufferData, glBufferStorage,
+    glMapBufferRange, glUnmapBuffer, glFenceSync, glClientWaitSync, glDeleteSync,
+    GL_TEXTURE_2D, GL_UNPACK_ROW_LENGTH, GL_UNPACK_ALIGNMENT, GL_RGBA, GL_RGB, GL_BGRA, GL_UNSIGNED_BYTE,
+    GL_UNSIGNED_SHORT_5_6_5, GL_VERSION, GL_RENDERER, GL_EXTENSIONS,
+    GL_NUM_EXTENSIONS, GL_PIXEL_UNPACK_BUFFER, GL_STREAM_DRAW, GL_MAP_WRITE_BIT, GL_MAP_INVALIDATE_BUFFER_BIT,
+    GL_MAP_PERSISTENT_BIT, GL_MAP_COHERENT_BIT, GL_SYNC_GPU_COMMANDS_COMPLETE, GL_SYNC_FLUSH_COMMANDS_BIT,
+)
+from OpenGL.error import GLError, NullFunctionError
+
+from rdp_shm import SHM_FORMAT_BGRA32, SHM_FORMAT_RGB565, BYTES_PER_PIXEL
+
+# PBO 環形緩衝數量：一個正在寫入、一個可能仍在 GPU 傳輸中、一個備用
+PBO_RING_SIZE = 3
+# 持久映射模式等待 GPU 釋放緩衝區的上限 (奈秒)
+_FENCE_TIMEOUT_NS = 50 * 1000 * 1000
+# 軟體光柵化器沒有 DMA，PBO 只會多一次複製，auto 模式下改用直接上傳
+_SOFTWARE_RENDERERS = (b'llvmpipe', b'softpipe', b'swrast', b'GDI Generic', b'Microsoft Basic Render')
+
+# SHM 格式 -> (internal format, format, type)
+_GL_FORMATS = {
+    SHM_FORMAT_BGRA32: (GL_RGBA, GL_BGRA, GL_UNSIGNED_BYTE),
+    SHM_FORMAT_RGB565: (GL_RGB, GL_RGB, GL_UNSIGNED_SHORT_5_6_5),
+}
+
+
+def _gl_version():
+    text = glGetString(GL_VERSION) or b''
+    try:
+        major, minor = text.split(b' ')[0].split(b'.')[:2]
+        return int(major), int(minor)
+    except ValueError:
+        return 0, 0
+
+
+def _gl_extensions():
+    try:
+        count = glGetIntegerv(GL_NUM_EXTENSIONS)
+        return {glGetStringi(GL_EXTENSIONS, i) for i in range(int(count))}
+    except (GLError, NullFunctionError):
+        return set((glGetString(GL_EXTENSIONS) or b'').split())
+
+
+def _row_bands(rects):
+    """合併矩形覆蓋的列範圍，回傳排序後不重疊的 (y0, y1)"""
+    bands = []
+    for y0, y1 in sorted((y, y + h) for _, y, _, h in rects):
+        if bands and y0 <= bands[-1][1]:
+            if y1 > bands[-1][1]: bands[-1][1] = y1
+        else:
+            bands.append([y0, y1])
+    return bands
+
+
+def _to_address(ptr):
+    if isinstance(ptr, int): return ptr
+    return ctypes.cast(ptr, ctypes.c_void_p).value
+
+
+class DirectUploader:
+    """同步上傳：glTexSubImage2D 直接讀取 client memory"""
+    mode = 'direct'
+
+    def __init__(self, texture_id):
+        self.texture_id = texture_id
+        self.width = 0
+        self.height = 0
+        self.format = SHM_FORMAT_BGRA32
+
+    def _needs_realloc(self, width, height, fmt):
+        return width != self.width or height != self.height or fmt != self.format
+
+    def _begin_unpack(self, stride, bpp):
+        # ROW_LENGTH 讓 GL 以整張畫面的步幅讀取子區域；RGB565 的列不一定 4 位元組對齊
+        glPixelStorei(GL_UNPACK_ROW_LENGTH, stride // bpp)
+        glPixelStorei(GL_UNPACK_ALIGNMENT, 1)
+
+    def _end_unpack(self):
+        glPixelStorei(GL_UNPACK_ROW_LENGTH, 0)
+        glPixelStorei(GL_UNPACK_ALIGNMENT, 4)
+
+    def upload(self, pixel_ptr, width, height, stride, rects, fmt=SHM_FORMAT_BGRA32):
+        internal, gl_format, gl_type = _GL_FORMATS[fmt]
+        bpp = BYTES_PER_PIXEL[fmt]
+        glBindTexture(GL_TEXTURE_2D, self.texture_id)
+        self._begin_unpack(stride, bpp)
+        if self._needs_realloc(width, height, fmt):
+            glTexImage2D(GL_TEXTURE_2D, 0, internal, width, height, 0, gl_format, gl_type, ctypes.c_void_p(pixel_ptr))
+            self.width, self.height, self.format = width, height, fmt
+        else:
+            # 只上傳髒矩形
+            for x, y, rw, rh in rects:
+                data_ptr = ctypes.c_void_p(pixel_ptr + y * stride + x * bpp)
+                glTexSubImage2D(GL_TEXTURE_2D, 0, x, y, rw, rh, gl_format, gl_type, data_ptr)
+        self._end_unpack()
+        glBindTexture(GL_TEXTURE_2D, 0)
+
+    def release(self):
+        pass
+
+
+class PboUploader(DirectUploader):
+    """PBO 環形串流上傳
+
+    每個 PBO 與共享記憶體的像素區採相同版面配置，每幀只把髒矩形涵蓋的列 memmove 進去，
+    再以 PBO 內的位移呼叫 glTexSubImage2D，呼叫會立即返回，由 GPU 非同步完成傳輸。
+    """
+    mode = 'pbo'
+
+    def __init__(self, texture_id, ring_size=PBO_RING_SIZE, persistent=False):
+        super().__init__(texture_id)
+        self.ring_size = ring_size
+        self.persistent = persistent
+        if persistent: self.mode = 'pbo-persistent'
+        self.buffers = []
+        self.mapped = []
+        self.fences = []
+        self.buffer_size = 0
+        self.slot = 0
+
+    def _allocate(self, size):
+        self.release()
+        self.buffers = list(glGenBuffers(self.ring_size)) if self.ring_size > 1 else [glGenBuffers(1)]
+        for buf in self.buffers:
+            glBindBuffer(GL_PIXEL_UNPACK_BUFFER, buf)
+            if self.persistent:
+                flags = GL_MAP_WRITE_BIT | GL_MAP_PERSISTENT_BIT | GL_MAP_COHERENT_BIT
+                glBufferStorage(GL_PIXEL_UNPACK_BUFFER, size, None, flags)
+                self.mapped.append(_to_address(glMapBufferRange(GL_PIXEL_UNPACK_BUFFER, 0, size, flags)))
+            else:
+                glBufferData(GL_PIXEL_UNPACK_BUFFER, size, None, GL_STREAM_DRAW)
+        glBindBuffer(GL_PIXEL_UNPACK_BUFFER, 0)
+        self.fences = [None] * len(self.buffers)
+        self.buffer_size = size
+        self.slot = 0
+
+    def _wait_slot(self, slot):
+        # 持久映射時 GPU 可能仍在讀取這個緩衝區，需等它的 fence
+        fence = self.fences[slot]
+        if fence is None: return
+        glClientWaitSync(fence, GL_SYNC_FLUSH_COMMANDS_BIT, _FENCE_TIMEOUT_NS)
+        glDeleteSync(fence)
+        self.fences[slot] = None
+
+    def upload(self, pixel_ptr, width, height, stride, rects, fmt=SHM_FORMAT_BGRA32):
+        internal, gl_format, gl_type = _GL_FORMATS[fmt]
+        bpp = BYTES_PER_PIXEL[fmt]
+        size = stride * height
+        if size > self.buffer_size: self._allocate(size)
+        glBindTexture(GL_TEXTURE_2D, self.texture_id)
+        if self._needs_realloc(width, height, fmt):
+            # 先配置紋理儲存空間，內容改由 PBO 整張上傳
+            glTexImage2D(GL_TEXTURE_2D, 0, internal, width, height, 0, gl_format, gl_type, None)
+            self.width, self.height, self.format = width, height, fmt
+            rects = ((0, 0, width, height),)
+
+        slot = self.slot
+        self.slot = (slot + 1) % len(self.buffers)
+        glBindBuffer(GL_PIXEL_UNPACK_BUFFER, self.buffers[slot])
+        if self.persistent:
+            self._wait_slot(slot)
+            dst = self.mapped[slot]
+        else:
+            # INVALIDATE 讓驅動程式孤立 (orphan) 舊內容，不必等待 GPU 讀完上一輪
+            dst = _to_address(glMapBufferRange(GL_PIXEL_UNPACK_BUFFER, 0, size,
+                                               GL_MAP_WRITE_BIT | GL_MAP_INVALIDATE_BUFFER_BIT))
+        for y0, y1 in _row_bands(rects):
+            ctypes.memmove(dst + y0 * stride, pixel_ptr + y0 * stride, (y1 - y0) * stride)
+        if not self.persistent:
+            glUnmapBuffer(GL_PIXEL_UNPACK_BUFFER)
+
+        self._begin_unpack(stride, bpp)
+        for x, y, rw, rh in rects:
+            glTexSubImage2D(GL_TEXTURE_2D, 0, x, y, rw, rh, gl_format, gl_type,
+                            ctypes.c_void_p(y * stride + x * bpp))
+        self._end_unpack()
+        if self.persistent:
+            self.fences[slot] = glFenceSync(GL_SYNC_GPU_COMMANDS_COMPLETE, 0)
+        glBindBuffer(GL_PIXEL_UNPACK_BUFFER, 0)
+        glBindTexture(GL_TEXTURE_2D, 0)
+
+    def release(self):
+        if not self.buffers: return
+        if self.persistent:
+            for fence in self.fences:
+                if fence is not None: glDeleteSync(fence)
+            for buf in self.buffers:
+                glBindBuffer(GL_PIXEL_UNPACK_BUFFER, buf)
+                glUnmapBuffer(GL_PIXEL_UNPACK_BUFFER)
+            glBindBuffer(GL_PIXEL_UNPACK_BUFFER, 0)
+        glDeleteBuffers(len(self.buffers), self.buffers)
+        self.buffers, self.mapped, self.fences = [], [], []
+        self.buffer_size = 0
+
+
+def create_uploader(texture_id, mode='auto'):
+    """依照目前 GL context 的能力選擇上傳路徑
+
+    mode: 'auto' | 'pbo-persistent' | 'pbo' | 'direct'
+    """
+    if mode == 'direct': return DirectUploader(texture_id)
+    renderer = glGetString(GL_RENDERER) or b''
+    if mode == 'auto' and any(name in renderer for name in _SOFTWARE_RENDERERS):
+        return DirectUploader(texture_id)
+    version = _gl_version()
+    extensions = _gl_extensions()
+    has_pbo = version >= (2, 1) or b'GL_ARB_pixel_buffer_object' in extensions
+    has_storage = version >= (4, 4) or b'GL_ARB_buffer_storage' in extensions
+    if not has_pbo: return DirectUploader(texture_id)
+    if mode == 'pbo' or not has_storage: return PboUploader(texture_id)
+    return PboUploader(texture_id, persistent=True)
@@ -0,0 +1,178 @@
+"""畫面區域監看
+
+自動化程式常需要等待某個對話框或按鈕出現。
+與其每次輪詢都掃描整張畫面 (1080p 約 8 MB)，
+RegionWatcher 只檢查登記過的區域：以固定大小的圖塊 (tile) 為單位計算雜湊，
+連續的幀只重新計算與 DLL 回報的髒矩形重疊的圖塊，內容真的改變時才呼叫回呼。
+區域可附帶樣板，只在改變的圖塊附近以 OpenCV 比對 (需要 opencv-python)。
+
+    watcher = RegionWatcher(session)
+    watcher.watch(800, 500, 320, 200, on_dialog, template=cv2.imread("ok_button.png"))
+    while True:
+        session.wait_for_frame(timeout=1)
+        watcher.update()
+"""
+import zlib
+from collections import namedtuple
+
+import numpy as np
+
+from rdp_shm import SHM_FORMAT_RGB565
+
+try:
+    import cv2
+except ImportError:
+    cv2 = None
+
+# 圖塊邊長 (像素)
+TILE_SIZE = 64
+# 樣板比對的預設門檻 (TM_CCOEFF_NORMED)
+MATCH_THRESHOLD = 0.9
+
+# rects：本次內容改變的圖塊 (x, y, w, h)；match：樣板比對結果 (x, y, score)，
+# 沒有樣板或未找到時為 None
+RegionChange = namedtuple('RegionChange', 'region frame_id rects match')
+
+
+class Region:
+    """監看區域；tiles 為區域內各圖塊 (已裁切到區域邊界) 的矩形，
+    hashes 為各圖塊上一次的雜湊"""
+    def __init__(self, x, y, w, h, callback, template=None, threshold=MATCH_THRESHOLD, name=None):
+        self.x, self.y, self.w, self.h = x, y, w, h
+        self.callback = callback
+        self.template = template
+        self.threshold = threshold
+        self.name = name
+        self.size = (0, 0)
+        self.tiles = []
+        self.hashes = {}
+
+    def layout(self, tile, width, height):
+        """依畫面大小切出區域內的圖塊"""
+        tiles = []
+        x0, y0 = max(0, self.x), max(0, self.y)
+        x1, y1 = min(width, self.x + self.w), min(height, self.y + self.h)
+        for ty in range(y0 - y0 % tile, y1, tile):
+            for tx in range(x0 - x0 % tile, x1, tile):
+                left, top = max(tx, x0), max(ty, y0)
+                tiles.append((left, top, min(tx + tile, x1) - left, min(ty + tile, y1) - top))
+        return tiles
+
+    def __repr__(self):
+        return f"Region({self.name or ''} {self.x},{self.y} {self.w}x{self.h})"
+
+
+def _intersects(a, b):
+    return a[0] < b[0] + b[2] and b[0] < a[0] + a[2] and a[1] < b[1] + b[3] and b[1] < a[1] + a[3]
+
+
+def tile_hash(view, rect):
+    x, y, w, h = rect
+    return zlib.crc32(np.ascontiguousarray(view[y:y + h, x:x + w]))
+
+
+def rgb565_to_bgr(pixels):
+    """RGB565 (uint16) 轉為 BGR uint8，供樣板比對使用"""
+    r = ((pixels >> 11) & 0x1F).astype(np.uint8)
+    g = ((pixels >> 5) & 0x3F).astype(np.uint8)
+    b = (pixels & 0x1F).astype(np.uint8)
+    return np.dstack(((b << 3) | (b >> 2), (g << 2) | (g >> 4), (r << 3) | (r >> 2)))
+
+
+def to_bgr(view, fmt):
+    if fmt == SHM_FORMAT_RGB565: return rgb565_to_bgr(view)
+    return np.ascontiguousarray(view[:, :, :3])
+
+
+def match_template(image, template, threshold=MATCH_THRESHOLD):
+    """在 BGR 影像中尋找樣板，回傳最佳位置 (x, y, score)，
+    低於門檻或影像比樣板小時回傳 None"""
+    th, tw = template.shape[:2]
+    if image.shape[0] < th or image.shape[1] < tw: return None
+    result = cv2.matchTemplate(image, template, cv2.TM_CCOEFF_NORMED)
+    _, score, _, loc = cv2.minMaxLoc(result)
+    return (loc[0], loc[1], score) if score >= threshold else None
+
+
+class RegionWatcher:
+    """監看 RdpSession 畫面中的多個區域，只處理改變的圖塊
+
+    update() 讀取目前的幀：與上一次處理的幀連續且有髒矩形時只重新計算重疊的圖塊，
+    否則 (漏幀、整張更新、解析度變更) 重新計算區域內所有圖塊。
+    回呼在呼叫 update() 的執行緒中執行。
+    """
+    def __init__(self, session, tile=TILE_SIZE):
+        self.session = session
+        self.tile = tile
+        self.regions = []
+        self.last_fid = None
+        self.hashed_tiles = 0  # 累計重新計算雜湊的圖塊數
+
+    def watch(self, x, y, w, h, callback, template=None, threshold=MATCH_THRESHOLD, name=None):
+        """登記區域並回傳 Region；template 為 BGR (或 BGRA) uint8 影像"""
+        if template is not None:
+            if cv2 is None: raise RuntimeError("樣板比對需要 opencv-python")
+            if template.ndim == 3 and template.shape[2] == 4: template = np.ascontiguousarray(template[:, :, :3])
+        region = Region(x, y, w, h, callback, template, threshold, name)
+        self.regions.append(region)
+        return region
+
+    def unwatch(self, region):
+        self.regions.remove(region)
+
+    def update(self):
+        """處理目前的幀並呼叫內容有改變的區域的回呼，回傳 RegionChange 清單"""
+        ok, scan = self.session.read(self._scan)
+        if not ok or scan is None: return []
+        # 讀取區段可能重試，狀態在確認讀到一致的畫面後才更新
+        self.last_fid, results = scan
+        changes = []
+        for region, size, tiles, hashes, change in results:
+            if region.size != size: region.size, region.tiles, region.hashes = size, tiles, {}
+            region.hashes.update(hashes)
+            if change: changes.append(change)
+        for change in changes: change.region.callback(change)
+        return changes
+
+    def _scan(self, header, view):
+        if view is None or header.frame_id == self.last_fid: return None
+        consecutive = self.last_fid is not None and header.frame_id == (self.last_fid + 1) & 0xFFFFFFFF
+        size = (header.width, header.height)
+        results = []
+        for region in self.regions:
+            if region.size == size:
+                tiles, old = region.tiles, region.hashes
+                damage = header.damage if consecutive else None
+            else:
+                # 新登記的區域或解析度變更：重新切割並計算所有圖塊
+                tiles, old, damage = region.layout(self.tile, *size), {}, None
+            hashes, rects = self._changed_tiles(tiles, old, view, damage)
+            change = None
+            if rects:
+                match = self._match(region, view, header.format, rects) if region.template is not None else None
+                change = RegionChange(region, header.frame_id, rects, match)
+            results.append((region, size, tiles, hashes, change))
+        return header.frame_id, results
+
+    def _changed_tiles(self, tiles, old, view, damage):
+        hashes, changed = {}, []
+        for rect in tiles:
+            if damage is not None and not any(_intersects(rect, d) for d in damage): continue
+            value = tile_hash(view, rect)
+            self.hashed_tiles += 1
+            if old.get(rect) != value:
+                hashes[rect] = value
+                changed.append(rect)
+        return hashes, changed
+
+    def _match(self, region, view, fmt, rects):
+        # 只在改變的圖塊外接矩形附近搜尋 (向外延伸樣板大小，
+        # 涵蓋部分落在改變區域的位置)
+        th, tw = region.template.shape[:2]
+        x0 = max(region.x, min(r[0] for r in rects) - tw + 1, 0)
+        y0 = max(region.y, min(r[1] for r in rects) - th + 1, 0)
+        x1 = min(region.x + region.w, max(r[0] + r[2] for r in rects) + tw - 1, view.shape[1])
+        y1 = min(region.y + region.h, max(r[1] + r[3] for r in rects) + th - 1, view.shape[0])
+        found = match_template(to_bgr(view[y0:y1, x0:x1], fmt), region.template, region.threshold)
+        if found is None: return None
+        return found[0] + x0, found[1] + y0, found[2]
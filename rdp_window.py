@@ -0,0 +1,913 @@
+"""RDP 連線視窗：OpenGL 畫面、鍵盤鉤子、系統托盤與錄影播放
+
+由 rdp_client_gpu.py 在顯示登入對話框的同時於背景匯入 (PySide6 OpenGL、
+PyOpenGL 等較重的模組都在這裡)，
+RdpBridge.dll 也在那時載入。錄影相關的模組 (NumPy、OpenCV) 到第一次使用時才匯入。
+"""
+import ctypes
+import time
+from ctypes import wintypes, windll
+
+# 導入對話視窗類別
+from rdp_dialog import RDPLoginDialog
+from rdp_shm import BYTES_PER_PIXEL, read_consistent
+from rdp_metrics import MetricsExporter, format_overlay, rates, registry, startup
+from rdp_pacer import FramePacer
+from rdp_texture import DirectUploader, create_uploader
+from rdp_render import FrameRenderer, SCALE_LETTERBOX, SCALE_MODES, compute_viewport, map_to_source
+from rdp_scheduler import SessionScheduler
+from rdp_keymap import HOOK_KEYS, ScancodeTable
+from rdp_input import InputQueue, MOVE_FLUSH_MS
+from rdp_connect import Backoff, ConnectPool, STATE_CONNECTED, STATE_CANCELLED, STATE_FAILED, STATE_LABELS
+from rdp_worker import connect_backend
+from rdp_profile import ADAPT_INTERVAL, AUTO_PROFILE, AdaptiveController, LinkMonitor, needs_reconnect, profile_for
+
+
+# Windows API 常數
+WH_KEYBOARD_LL = 13
+WM_KEYDOWN = 0x0100
+WM_KEYUP = 0x0101
+WM_SYSKEYDOWN = 0x0104
+WM_SYSKEYUP = 0x0105
+KEY_DOWN_MESSAGES = frozenset((WM_KEYDOWN, WM_SYSKEYDOWN))
+
+# 旗標
+LLKHF_EXTENDED = 0x01
+
+# 定義結構
+class KBDLLHOOKSTRUCT(ctypes.Structure):
+    _fields_ = [
+        ("vkCode", wintypes.DWORD),
+        ("scanCode", wintypes.DWORD),
+        ("flags", wintypes.DWORD),
+        ("time", wintypes.DWORD),
+        ("dwExtraInfo", ctypes.POINTER(wintypes.ULONG))
+    ]
+
+# 定義回呼函數類型 (必須使用 c_longlong 作為 restype 以支援 64位元)
+LowLevelKeyboardProc = ctypes.WINFUNCTYPE(
+    ctypes.c_longlong, ctypes.c_int, wintypes.WPARAM, wintypes.LPARAM
+)
+
+# API 實例
+user32 = ctypes.windll.user32
+kernel32 = ctypes.windll.kernel32
+
+# 明確定義函數簽章，防止 64 位元截斷
+user32.SetWindowsHookExW.argtypes = [ctypes.c_int, LowLevelKeyboardProc, wintypes.HINSTANCE, wintypes.DWORD]
+user32.SetWindowsHookExW.restype = wintypes.HHOOK
+user32.UnhookWindowsHookEx.argtypes = [wintypes.HHOOK]
+user32.UnhookWindowsHookEx.restype = wintypes.BOOL
+user32.CallNextHookEx.argtypes = [wintypes.HHOOK, ctypes.c_int, wintypes.WPARAM, wintypes.LPARAM]
+user32.CallNextHookEx.restype = ctypes.c_longlong
+
+kernel32.GetModuleHandleW.argtypes = [wintypes.LPCWSTR]
+kernel32.GetModuleHandleW.restype = wintypes.HINSTANCE
+
+kernel32.GetLastError.restype = wintypes.DWORD
+user32.GetForegroundWindow.restype = wintypes.HWND
+user32.MapVirtualKeyW.argtypes = [wintypes.UINT, wintypes.UINT]
+user32.MapVirtualKeyW.restype = wintypes.UINT
+
+# VK -> (掃描碼, 延伸鍵) 查表，依 UI 執行緒的鍵盤配置建立 (open_window 中重建)，
+# 切換輸入語言時重建
+scancodes = ScancodeTable(user32.MapVirtualKeyW)
+
+from PySide6.QtWidgets import (
+    QApplication, QMainWindow, QMessageBox,
+    QSystemTrayIcon, QMenu, QWidget, QVBoxLayout, QHBoxLayout, QLabel, QPushButton, QSlider, QFileDialog
+)
+from PySide6.QtGui import QAction, QIcon
+from PySide6.QtOpenGLWidgets import QOpenGLWidget
+from PySide6.QtCore import Qt, Signal, QTimer, QEvent
+
+from OpenGL.GL import (
+    glGenTextures, glBindTexture, glTexParameteri,
+    GL_TEXTURE_2D, GL_TEXTURE_MIN_FILTER, GL_TEXTURE_MAG_FILTER, GL_LINEAR
+)
+from OpenGL.error import GLError
+
+# 由全域鍵盤鉤子送出的修飾鍵，視窗的按鍵事件略過
+HOOKED_QT_KEYS = frozenset((Qt.Key.Key_Control, Qt.Key.Key_Alt, Qt.Key.Key_Meta))
+
+# 視窗看不到後延遲多久 (毫秒) 才要求伺服器暫停送出畫面，
+# 快速最小化/還原時不來回送出
+SUPPRESS_OUTPUT_DELAY_MS = 1000
+
+# --- 默認設定 ---
+DEFAULT_CONFIG = {
+    'server': "192.168.1.201",
+    'port': 3389,
+    'username': "Admin1",
+    'password': "password",
+    'width': 800,
+    'height': 600,
+    'color_depth': 16
+}
+
+# --- 用於管理多視窗的全局列表 ---
+active_windows = []
+# 托盤選單「總覽所有連線」開啟的視窗 (所有連線共用一個，關閉時只隱藏)
+overview_window = None
+
+# 所有連線共用的 I/O 排程器：少數幾條執行緒等待全部連線的事件句柄，
+# 取代每個連線兩條執行緒
+scheduler = SessionScheduler()
+registry.gauges['scheduler_threads'] = lambda: scheduler.stats()[0]
+registry.gauges['scheduler_wakeups_total'] = lambda: scheduler.stats()[1]
+# 托盤選單「匯出統計」啟動的定期匯出 (所有視窗共用一個)
+metrics_exporter = None
+
+class GlobalKeyboardHook:
+    def __init__(self, rdp_widget):
+        self.rdp_widget = rdp_widget
+        self.hook = None
+        # RDP 視窗在前景時為其 HWND，否則為 0；由視窗的啟用狀態變更時更新，
+        # 鉤子內不再呼叫 winId()
+        self.target_hwnd = 0
+        # 將 callback 存為成員變數，避免被垃圾回收
+        self._callback = LowLevelKeyboardProc(self.hook_callback)
+
+    def install(self):
+        # 獲取模組句柄
+        h_instance = kernel32.GetModuleHandleW(None)
+        
+        # 安裝鉤子 (WH_KEYBOARD_LL)
+        self.hook = user32.SetWindowsHookExW(WH_KEYBOARD_LL, self._callback, h_instance, 0)
+        
+        # 如果因為 126 錯誤失敗，嘗試傳入 0
+        if not self.hook:
+            self.hook = user32.SetWindowsHookExW(WH_KEYBOARD_LL, self._callback, 0, 0)
+
+        if not self.hook:
+            print(f"[Hook] 安裝失敗！錯誤代碼: {kernel32.GetLastError()}")
+        else:
+            print(f"[Hook] 已啟動：成功攔截全局 Ctrl/Alt/Win 鍵")
+
+    def uninstall(self):
+        if self.hook:
+            user32.UnhookWindowsHookEx(self.hook)
+            self.hook = None
+            print("[Hook] 已卸載")
+
+    def set_active(self, active):
+        self.target_hwnd = int(self.rdp_widget.window().winId()) if active else 0
+
+    def hook_callback(self, nCode, wParam, lParam):
+        # 這段程式對整台電腦的每次按鍵都會執行：
+        # RDP 視窗不在前景或不是攔截的修飾鍵時立即交給下一個鉤子
+        if nCode == 0 and self.target_hwnd: # HC_ACTION
+            # vkCode 為 KBDLLHOOKSTRUCT 的第一個欄位，只讀這個欄位
+            key = HOOK_KEYS.get(wintypes.DWORD.from_address(lParam).value)
+            # 快取的 HWND 可能落後於實際的前景視窗，攔截前再確認一次
+            if key is not None and user32.GetForegroundWindow() == self.target_hwnd:
+                self.rdp_widget.input.key(key[0], wParam in KEY_DOWN_MESSAGES, key[1])
+                # --- 關鍵：返回 1 (吃掉按鍵) ---
+                # 這樣本地系統就不會收到這些按鍵，Alt+Tab 或開始選單就不會觸發
+                return 1
+
+        return user32.CallNextHookEx(self.hook, nCode, wParam, lParam)
+
+# 背景連線池：握手在工作執行緒進行，
+# 多個連線可同時建立 (設定勾選 worker 時在獨立程序中執行)
+connect_pool = ConnectPool(connect_backend)
+
+class RdpGLWidget(QOpenGLWidget):
+    frame_ready = Signal()
+
+    def __init__(self, backend, upload_mode='auto', scale_mode=SCALE_LETTERBOX, name="session"):
+        super().__init__()
+        self.backend = backend
+        self.scale_mode = scale_mode
+        self.renderer = FrameRenderer()
+        self.last_fid = 0
+        self.force_full_upload = False
+        self.texture_id = None
+        self.upload_mode = upload_mode
+        self.uploader = None
+        self.tex_width = 0
+        self.tex_height = 0
+        self.is_ui_visible = True
+        self.setMouseTracking(True)
+        self.setFocusPolicy(Qt.FocusPolicy.StrongFocus)
+        # 排程器執行緒只在沒有待處理的通知時才送出 signal，避免 UI 忙碌時事件堆積；
+        # 上傳對齊畫面交換，同一次螢幕更新內的多幀合併為一次上傳
+        self.pacer = FramePacer()
+        self.frame_ready.connect(self.check_frame)
+        self.frameSwapped.connect(self.on_frame_swapped)
+        self.debounce_timer = QTimer(self)
+        self.debounce_timer.setSingleShot(True)
+        self.debounce_timer.timeout.connect(self.send_delayed_release)
+        self.pending_release_button = 0
+        # 錄影中時由排程器執行緒通知新幀，輸入也一併記錄
+        self.recorder = None
+        # 其他也要收到新幀標頭的函式 (例如總覽的縮圖)，在排程器執行緒呼叫；
+        # 修改時整個換掉
+        self.frame_listeners = ()
+        # 滑鼠移動合併到下一個 tick，其餘事件立即送出；換上新連線後自動送往新的 backend
+        self.input = InputQueue(self._send_input, schedule=lambda fn: QTimer.singleShot(MOVE_FLUSH_MS, fn))
+        # 效能統計：排程器記錄 poll 與發佈，這裡記錄上傳、繪製、呈現與輸入
+        self.metrics = registry.register(name)
+        self.metrics.gauges['input_queue'] = lambda: len(self.input.pending)
+        self.overlay = QLabel(self)
+        self.overlay.setStyleSheet("background: rgba(0, 0, 0, 160); color: #7CFC00; "
+                                   "font-family: Consolas, monospace; padding: 4px;")
+        self.overlay.hide()
+        self.overlay_timer = QTimer(self)
+        self.overlay_timer.timeout.connect(self.update_overlay)
+        self._overlay_last = None
+
+    def initializeGL(self):
+        self.texture_id = glGenTextures(1)
+        glBindTexture(GL_TEXTURE_2D, self.texture_id)
+        glTexParameteri(GL_TEXTURE_2D, GL_TEXTURE_MIN_FILTER, GL_LINEAR)
+        glTexParameteri(GL_TEXTURE_2D, GL_TEXTURE_MAG_FILTER, GL_LINEAR)
+        glBindTexture(GL_TEXTURE_2D, 0)
+        self.uploader = create_uploader(self.texture_id, self.upload_mode)
+        self.renderer.initialize()
+        if self.screen(): self.pacer.set_refresh_rate(self.screen().refreshRate())
+        print(f"[GL] 紋理上傳模式: {self.uploader.mode}，"
+              f"繪製: {'shader' if self.renderer.program else '固定管線'}")
+
+    def paintGL(self):
+        start = time.perf_counter()
+        self.renderer.draw(self.texture_id, self.tex_width, self.tex_height, self.viewport(),
+                           self.height(), self.devicePixelRatioF(), self.scale_mode)
+        self.metrics.painted(time.perf_counter() - start)
+
+    def set_overlay(self, visible):
+        """在畫面左上角顯示每秒更新的效能統計"""
+        self._overlay_last = None
+        if visible:
+            self.update_overlay()
+            self.overlay_timer.start(1000)
+        else:
+            self.overlay_timer.stop()
+        self.overlay.setVisible(visible)
+
+    def update_overlay(self):
+        now, snapshot = time.perf_counter(), self.metrics.snapshot()
+        last, self._overlay_last = self._overlay_last, (now, snapshot)
+        rate = rates(last[1], snapshot, now - last[0]) if last else {}
+        self.overlay.setText(format_overlay(snapshot, rate))
+        self.overlay.adjustSize()
+
+    def viewport(self):
+        """遠端畫面在視窗中的顯示區域 (邏輯座標)"""
+        return compute_viewport(self.tex_width, self.tex_height, self.width(), self.height(), self.scale_mode)
+
+    def attach_backend(self, backend):
+        """重新連線後換上新的連線，紋理與上傳器沿用；
+        畫面維持上一幀直到新連線發佈第一幀"""
+        self.backend = backend
+        self.last_fid = 0
+        self.force_full_upload = True
+        self.pacer.reset()
+        if self.recorder:
+            from rdp_session import RdpSession
+            self.recorder.set_source(RdpSession(backend))
+
+    def _send_input(self, events):
+        self.backend.send_input_batch(events)
+        self.metrics.input_sent(events)
+        if self.recorder: self.recorder.log_input(events)
+
+    def set_scale_mode(self, mode):
+        if mode not in SCALE_MODES: return
+        self.scale_mode = mode
+        self.update()
+
+    def _to_remote(self, event):
+        pos = event.position()
+        return map_to_source(pos.x(), pos.y(), self.viewport(), self.tex_width, self.tex_height)
+
+    def notify_frame(self, backend=None):
+        """由排程器執行緒呼叫"""
+        if self.recorder: self.recorder.notify()
+        # 工作程序模式下發佈端在另一個程序，以 seqlock 讀取一致的標頭；
+        # 映射剛被 UI 執行緒換掉時讀不到
+        shm = self.backend.shm
+        try:
+            header = read_consistent(shm, lambda header, attempt: header)[1] if shm else None
+        except ValueError:
+            header = None
+        for fn in self.frame_listeners: fn(header)
+        if self.pacer.add(header): self.frame_ready.emit()
+
+    def on_frame_swapped(self):
+        self.metrics.presented()
+        if self.pacer.swapped(): self.check_frame()
+
+    def check_frame(self):
+        self.pacer.begin()
+        if not self.backend.shm: return
+        header = self.backend.check_new_frame(self.last_fid)
+        if header is None: return
+        # 隱藏期間不上傳也不推進 last_fid，恢復顯示後因幀不連續而整張上傳
+        if not self.is_ui_visible: return
+        if not self.pacer.ready(time.perf_counter()):
+            # 上一次上傳的畫面還沒交換：交換後再上傳最新的幀；
+            # 沒收到 frameSwapped 時由計時器補上
+            if self.pacer.defer(): QTimer.singleShot(int(self.pacer.max_wait * 1000) + 1, self.check_frame)
+            return
+        self.makeCurrent()
+        ok, uploaded = read_consistent(self.backend.shm, self._upload_frame)
+        if not ok:
+            # 重試期間一直被寫入端打斷：不呈現，下一次通知時整張上傳
+            self.force_full_upload = True
+            return
+        self.force_full_upload = False
+        if uploaded:
+            self.pacer.uploaded(time.perf_counter())
+            self.update()
+
+    def _upload_frame(self, header, attempt):
+        """在 seqlock 讀取區段內上傳紋理；重試時整張上傳，確保紋理內容一致"""
+        rects = self.pacer.plan(header, self.last_fid, self.tex_width, self.tex_height,
+                                force_full=self.force_full_upload or attempt > 0)
+        self.last_fid = header.frame_id
+        self.pacer.commit(header.frame_id)
+        if not rects: return False
+        pixel_ptr = self.backend.get_pixel_address()
+        start = time.perf_counter()
+        try:
+            self.uploader.upload(pixel_ptr, header.width, header.height, header.stride, rects, header.format)
+        except GLError as e:
+            # PBO 路徑在部分驅動上失敗時退回同步上傳
+            print(f"[GL] {self.uploader.mode} 上傳失敗，改用直接上傳: {e}")
+            self.uploader.release()
+            self.uploader = DirectUploader(self.texture_id)
+            self.uploader.upload(pixel_ptr, header.width, header.height, header.stride,
+                                 ((0, 0, header.width, header.height),), header.format)
+        self.tex_width, self.tex_height = self.uploader.width, self.uploader.height
+        self.metrics.uploaded(time.perf_counter() - start,
+                              sum(w * h for _, _, w, h in rects) * BYTES_PER_PIXEL[header.format])
+        return True
+
+    def mouseMoveEvent(self, event): self.input.mouse_move(*self._to_remote(event))
+    def mousePressEvent(self, event):
+        f = {Qt.MouseButton.LeftButton: 1, Qt.MouseButton.RightButton: 3,
+             Qt.MouseButton.MiddleButton: 7}.get(event.button(), 0)
+        if f: self.input.mouse(f, *self._to_remote(event))
+    def mouseReleaseEvent(self, event):
+        f = {Qt.MouseButton.LeftButton: 2, Qt.MouseButton.RightButton: 4,
+             Qt.MouseButton.MiddleButton: 8}.get(event.button(), 0)
+        if f:
+            self.pending_release_x, self.pending_release_y = self._to_remote(event)
+            self.pending_release_button = f
+            self.debounce_timer.start(50)
+    def send_delayed_release(self):
+        if self.pending_release_button:
+            self.input.mouse(self.pending_release_button, self.pending_release_x, self.pending_release_y)
+            self.pending_release_button = 0
+    def wheelEvent(self, event):
+        angle = event.angleDelta().y()
+        self.input.mouse(5 if angle > 0 else 6, *self._to_remote(event))
+
+    def keyPressEvent(self, event):
+        if event.isAutoRepeat(): return
+        
+        # 忽略已經被全局鉤子處理的修飾鍵
+        if event.key() in HOOKED_QT_KEYS:
+            return
+            
+        scancode, is_extended = self._map_key(event)
+        if scancode > 0:
+            self.input.key(scancode, True, is_extended)
+
+    def keyReleaseEvent(self, event):
+        if event.isAutoRepeat(): return
+        
+        # 忽略修飾鍵
+        if event.key() in HOOKED_QT_KEYS:
+            return
+            
+        scancode, is_extended = self._map_key(event)
+        if scancode > 0:
+            self.input.key(scancode, False, is_extended)
+
+    def update_lock_state(self):
+        num = (windll.user32.GetKeyState(0x90) & 0x0001) != 0
+        caps = (windll.user32.GetKeyState(0x14) & 0x0001) != 0
+        scroll = (windll.user32.GetKeyState(0x91) & 0x0001) != 0
+        self.backend.sync_locks(num, caps, scroll)
+    def _map_key(self, event):
+        return scancodes.lookup(event.nativeVirtualKey())
+    def event(self, event):
+        # 切換輸入語言後掃描碼對應可能不同
+        if event.type() == QEvent.Type.KeyboardLayoutChange: scancodes.rebuild()
+        return super().event(event)
+    def closeEvent(self, event):
+        stats = self.pacer.stats()
+        print(f"[Pacer] 幀 {stats.frames}，上傳 {stats.uploads}，合併 {stats.coalesced}，"
+              f"等待畫面交換 {stats.deferrals}")
+        if self.uploader:
+            self.makeCurrent(); self.uploader.release(); self.renderer.release(); self.doneCurrent()
+        super().closeEvent(event)
+
+class ConnectingView(QWidget):
+    """連線進行中的畫面：顯示目前階段並提供取消按鈕"""
+    def __init__(self, server, on_cancel):
+        super().__init__()
+        layout = QVBoxLayout(self)
+        layout.addStretch()
+        self.label = QLabel(f"正在連線到 {server}...")
+        self.label.setAlignment(Qt.AlignmentFlag.AlignCenter)
+        layout.addWidget(self.label)
+        self.cancel_button = QPushButton("取消")
+        self.cancel_button.clicked.connect(on_cancel)
+        layout.addWidget(self.cancel_button, alignment=Qt.AlignmentFlag.AlignCenter)
+        layout.addStretch()
+
+    def set_state(self, state):
+        self.label.setText(f"{STATE_LABELS.get(state, state)}...")
+
+class MainWindow(QMainWindow):
+    connection_lost = Signal()
+    # 連線工作執行緒 -> UI 執行緒
+    connect_progress = Signal(str)
+
+    def __init__(self, config):
+        super().__init__()
+        self.config = config
+        self.title = f"RDP: {config['server']} ({config['width']}x{config['height']})"
+        self.setWindowTitle(self.title)
+        self.resize(config['width'], config['height'])
+        self.is_rdp_visible = True
+        self.backend = None
+        self.rdp_widget = None
+        self.scale_mode = SCALE_LETTERBOX
+        self.closing = False
+        # 自動重新連線：斷線後保留視窗與畫面，依退避間隔在背景重連
+        self.backoff = Backoff()
+        self.reconnect_timer = QTimer(self)
+        self.reconnect_timer.setSingleShot(True)
+        self.reconnect_timer.timeout.connect(self.reconnect)
+        # 視窗看不到 (隱藏到托盤、最小化、未露出) 時要求伺服器暫停送出畫面
+        # (Suppress Output)，
+        # 背景連線幾乎不占頻寬、解碼 CPU 與喚醒；隱藏時延遲送出，恢復顯示時立即送出
+        self.remote_visible = True
+        # 總覽視窗正在顯示這個連線的縮圖
+        self.in_overview = False
+        self.suppress_timer = QTimer(self)
+        self.suppress_timer.setSingleShot(True)
+        self.suppress_timer.timeout.connect(lambda: self.apply_remote_visibility(False))
+        # 定期取樣連線狀況 (幀率、接收頻寬、處理時間)；
+        # 設定檔為自動調整時依此切換設定檔，
+        # 只差幀率上限時立即套用，編碼或快取不同時重新連線套用
+        self.link_monitor = LinkMonitor()
+        self.live_profile = None
+        self.link_sample = None
+        self.adaptive = AdaptiveController() if config.get('profile') == AUTO_PROFILE else None
+        self.adapt_timer = QTimer(self)
+        self.adapt_timer.timeout.connect(self.on_adapt_tick)
+
+        # 握手在背景進行，視窗先顯示進度，UI 與其他連線的畫面不受影響
+        self.connecting_view = ConnectingView(config['server'], self.cancel_connect)
+        self.setCentralWidget(self.connecting_view)
+        self.connect_progress.connect(self.on_connect_progress)
+        self.connection_lost.connect(self.on_disconnect)
+        self.submit_connect()
+
+        self.setup_tray()
+
+    def submit_connect(self, **options):
+        self.job = connect_pool.submit(self.config, **options)
+        self.job.add_listener(lambda job, state: self.connect_progress.emit(state))
+
+    def cancel_connect(self):
+        if self.job: self.job.cancel()
+
+    def on_connect_progress(self, state):
+        if self.job is None: return
+        reconnecting = self.rdp_widget is not None
+        if state == STATE_CONNECTED:
+            backend, self.job = self.job.result, None
+            if self.closing:
+                backend.close()
+                return
+            if reconnecting: self.on_reconnected(backend)
+            else: self.on_connected(backend)
+        elif state in (STATE_FAILED, STATE_CANCELLED):
+            error, self.job = self.job.error, None
+            if reconnecting and not self.closing:
+                print(f"[Reconnect] {self.config['server']} 重新連線失敗: {error}")
+                self.schedule_reconnect()
+                return
+            if state == STATE_FAILED and not self.closing:
+                QMessageBox.critical(self, "連線錯誤", str(error))
+            self.close()
+        elif reconnecting:
+            self.setWindowTitle(f"{self.title} - 重新連線中：{STATE_LABELS.get(state, state)}...")
+        else:
+            self.connecting_view.set_state(state)
+
+    def on_connected(self, backend):
+        startup.mark("第一個連線完成")
+        self.backend = backend
+        self.rdp_widget = RdpGLWidget(self.backend, scale_mode=self.scale_mode, name=self.config['server'])
+        self.rdp_widget.set_overlay(self.overlay_action.isChecked())
+        self.rdp_widget.metrics.gauges['remote_visible'] = lambda: int(self.remote_visible)
+        self.rdp_widget.metrics.gauges['link_kbps'] = lambda: round(self.link_sample.kbps) if self.link_sample else 0
+        self.rdp_widget.metrics.gauges['busy_percent'] = (
+            lambda: round(self.link_sample.busy * 100, 1) if self.link_sample else 0)
+        self.setCentralWidget(self.rdp_widget)
+        self.connecting_view = None
+        self.update_visibility()
+
+        # --- 初始化並安裝鍵盤鉤子 ---
+        self.kb_hook = GlobalKeyboardHook(self.rdp_widget)
+        self.kb_hook.install()
+        self.kb_hook.set_active(self.isActiveWindow())
+        self.start_session()
+
+    def start_session(self):
+        # 交給共用排程器驅動；回呼在排程器執行緒，經由 signal 轉回 UI 執行緒
+        scheduler.add(self.backend, on_frame=self.rdp_widget.notify_frame,
+                      on_disconnect=lambda backend: self.connection_lost.emit(), metrics=self.rdp_widget.metrics)
+        QTimer.singleShot(1000, self.rdp_widget.update_lock_state)
+        # 這個連線握手時使用的設定檔
+        self.live_profile = profile_for(self.config)
+        self.link_monitor.reset()
+        self.adapt_timer.start(ADAPT_INTERVAL * 1000)
+
+    def on_adapt_tick(self):
+        sample = self.link_monitor.sample(self.backend.get_frame_stats())
+        if sample: self.link_sample = sample
+        # 伺服器暫停送出畫面期間沒有資料，不列入判斷
+        if not self.adaptive or not self.remote_visible: return
+        profile = self.adaptive.update(sample)
+        if profile is None: return
+        self.config['adaptive_profile'] = profile.name
+        reason = (f"{sample.fps:.1f} fps, {sample.kbps:.0f} kbps, 處理 {sample.busy:.0%}, "
+                  f"每幀 {sample.decode_ms:.1f} ms")
+        deferred = needs_reconnect(self.live_profile, profile)
+        if deferred and profile.name != self.adaptive.start:
+            print(f"[Profile] {self.config['server']} 改用「{profile.label}」設定檔 ({reason})，"
+                  f"重新連線以套用編碼設定")
+            self.reconnect_with_profile()
+            return
+        # 回到起始設定檔時連線是閒置的，不為此中斷連線：只改幀率上限，
+        # 編碼設定留到下一次重新連線 (start_session 依 adaptive_profile 握手)
+        self.backend.set_frame_rate(profile.frame_rate)
+        if not deferred: self.live_profile = profile
+        note = "，編碼設定於下次重新連線時套用" if deferred else ""
+        print(f"[Profile] {self.config['server']} 改用「{profile.label}」設定檔 ({reason})，"
+              f"幀率上限 {profile.frame_rate or '不限'}{note}")
+
+    def reconnect_with_profile(self):
+        """編碼等握手時協商的設定只能重新連線套用：
+        與自動重新連線相同，沿用視窗、紋理與共享記憶體"""
+        if self.closing or self.job: return
+        scheduler.remove(self.backend)
+        self.adapt_timer.stop()
+        self.backend.close_instance()
+        self.setWindowTitle(f"{self.title} - 正在套用連線設定檔...")
+        self.submit_connect(reuse=self.backend)
+
+    def on_reconnected(self, backend):
+        """新連線接手原本的視窗、紋理與鍵盤鉤子，只換掉 DLL 實例"""
+        old, self.backend = self.backend, backend
+        self.rdp_widget.attach_backend(backend)
+        # 新連線已開啟同一塊共享記憶體，舊的映射可以關閉
+        old.close()
+        print(f"[Reconnect] 已重新連線到 {self.config['server']} (第 {self.backoff.attempts} 次嘗試)")
+        self.backoff.reset()
+        self.setWindowTitle(self.title)
+        # 新實例的伺服器預設送出畫面，視窗仍看不到時重新暫停
+        self.remote_visible = True
+        self.suppress_timer.stop()
+        self.update_visibility()
+        self.start_session()
+
+    def schedule_reconnect(self):
+        delay = self.backoff.next_delay()
+        self.setWindowTitle(f"{self.title} - 連線中斷，"
+                            f"{delay:.1f} 秒後重新連線 (第 {self.backoff.attempts} 次)")
+        self.reconnect_timer.start(int(delay * 1000))
+
+    def reconnect(self):
+        if self.closing or self.job: return
+        self.setWindowTitle(f"{self.title} - 正在重新連線 (第 {self.backoff.attempts} 次)...")
+        self.submit_connect(reuse=self.backend)
+
+    def setup_tray(self):
+        self.tray_icon = QSystemTrayIcon(self)
+        self.tray_icon.setIcon(self.style().standardIcon(QApplication.style().StandardPixmap.SP_ComputerIcon))
+        
+        tray_menu = QMenu()
+        
+        # [新增] 新建連線選項
+        new_conn_action = QAction("新建連線...", self)
+        new_conn_action.triggered.connect(self.on_new_connection)
+        overview_action = QAction("總覽所有連線...", self)
+        overview_action.triggered.connect(show_overview)
+        
+        # 縮放模式 (單選)
+        scale_menu = QMenu("縮放模式", self)
+        scale_names = {'letterbox': "等比例 (補黑邊)", 'integer': "整數倍 (像素清晰)",
+                       'stretch': "拉伸填滿"}
+        for mode in SCALE_MODES:
+            action = QAction(scale_names[mode], self, checkable=True)
+            action.setChecked(mode == self.scale_mode)
+            action.triggered.connect(lambda checked, m=mode: self.on_scale_mode(m))
+            scale_menu.addAction(action)
+        self.scale_actions = scale_menu.actions()
+
+        # 錄影 (連線建立後才能開始)
+        self.record_action = QAction("開始錄影...", self)
+        self.record_action.triggered.connect(self.toggle_recording)
+        play_action = QAction("播放錄影...", self)
+        play_action.triggered.connect(self.on_play_recording)
+
+        # 效能統計
+        metrics_menu = QMenu("效能統計", self)
+        self.overlay_action = QAction("在視窗中顯示", self, checkable=True)
+        self.overlay_action.triggered.connect(self.on_toggle_overlay)
+        copy_metrics_action = QAction("複製所有連線的統計 (Prometheus)", self)
+        copy_metrics_action.triggered.connect(lambda: QApplication.clipboard().setText(registry.prometheus()))
+        self.export_metrics_action = QAction(
+            "停止匯出統計" if metrics_exporter else "定期匯出統計...", self)
+        self.export_metrics_action.triggered.connect(self.on_toggle_export)
+        metrics_menu.addAction(self.overlay_action)
+        metrics_menu.addAction(copy_metrics_action)
+        metrics_menu.addAction(self.export_metrics_action)
+
+        show_action = QAction("顯示視窗", self)
+        show_action.triggered.connect(self.show_rdp)
+        hide_action = QAction("隱藏視窗", self)
+        hide_action.triggered.connect(self.hide_rdp)
+        
+        quit_action = QAction("結束所有連線", self)
+        quit_action.triggered.connect(QApplication.instance().quit)
+
+        tray_menu.addAction(new_conn_action)
+        tray_menu.addAction(overview_action)
+        tray_menu.addSeparator()
+        tray_menu.addAction(show_action)
+        tray_menu.addAction(hide_action)
+        tray_menu.addMenu(scale_menu)
+        tray_menu.addSeparator()
+        tray_menu.addAction(self.record_action)
+        tray_menu.addAction(play_action)
+        tray_menu.addMenu(metrics_menu)
+        tray_menu.addSeparator()
+        tray_menu.addAction(quit_action)
+
+        self.tray_icon.setContextMenu(tray_menu)
+        self.tray_icon.activated.connect(self.on_tray_activated)
+        self.tray_icon.show()
+
+    def on_new_connection(self):
+        """開啟對話框並建立新的 RDP 視窗"""
+        dialog = RDPLoginDialog(self)
+        if dialog.exec():
+            data = dialog.get_data()
+            if data:
+                new_win = MainWindow(data)
+                new_win.show()
+                active_windows.append(new_win) # 保持引用防止被回收
+
+    def toggle_recording(self):
+        if not self.rdp_widget: return
+        if self.rdp_widget.recorder:
+            self.stop_recording()
+            return
+        default = f"{self.config['server']}_{time.strftime('%Y%m%d_%H%M%S')}.rdprec"
+        path, _ = QFileDialog.getSaveFileName(self, "儲存錄影", default, "RDP 錄影 (*.rdprec)")
+        if not path: return
+        from rdp_record import Recorder
+        from rdp_session import RdpSession
+        self.rdp_widget.recorder = Recorder(RdpSession(self.backend), path)
+        self.record_action.setText("停止錄影")
+        self.update_visibility()
+        print(f"[Record] 開始錄影: {path}")
+
+    def stop_recording(self):
+        recorder, self.rdp_widget.recorder = self.rdp_widget.recorder, None
+        recorder.stop()
+        self.record_action.setText("開始錄影...")
+        self.update_visibility()
+        print(f"[Record] 已停止錄影: {recorder.path} ({recorder.written_bytes / 1e6:.1f} MB，"
+              f"關鍵幀 {recorder.keyframes}，差異 {recorder.deltas}，丟幀 {recorder.dropped})")
+
+    def on_play_recording(self):
+        path, _ = QFileDialog.getOpenFileName(self, "播放錄影", "", "RDP 錄影 (*.rdprec)")
+        if not path: return
+        try:
+            window = PlaybackWindow(path)
+        except (OSError, ValueError) as e:
+            QMessageBox.warning(self, "播放錄影", str(e))
+            return
+        window.show()
+        active_windows.append(window)
+
+    def on_toggle_overlay(self, checked):
+        if self.rdp_widget: self.rdp_widget.set_overlay(checked)
+
+    def on_toggle_export(self):
+        global metrics_exporter
+        if metrics_exporter:
+            metrics_exporter.stop()
+            print(f"[Metrics] 已停止匯出: {metrics_exporter.path}")
+            metrics_exporter = None
+        else:
+            path, _ = QFileDialog.getSaveFileName(self, "匯出統計", "rdp_metrics.jsonl",
+                                                  "JSON Lines (*.jsonl);;Prometheus textfile (*.prom)")
+            if not path: return
+            metrics_exporter = MetricsExporter(registry, path)
+            metrics_exporter.start()
+            print(f"[Metrics] 每 {metrics_exporter.interval:g} 秒匯出統計到 {path}")
+        for window in active_windows:
+            if isinstance(window, MainWindow):
+                window.export_metrics_action.setText(
+                    "停止匯出統計" if metrics_exporter else "定期匯出統計...")
+
+    def on_tray_activated(self, reason):
+        if reason in [QSystemTrayIcon.ActivationReason.Trigger, QSystemTrayIcon.ActivationReason.DoubleClick]:
+            if self.isVisible(): self.hide_rdp()
+            else: self.show_rdp()
+
+    def on_scale_mode(self, mode):
+        self.scale_mode = mode
+        if self.rdp_widget: self.rdp_widget.set_scale_mode(mode)
+        for action, m in zip(self.scale_actions, SCALE_MODES): action.setChecked(m == mode)
+
+    def hide_rdp(self):
+        self.is_rdp_visible = False
+        self.hide()
+        self.update_visibility()
+
+    def show_rdp(self):
+        self.is_rdp_visible = True
+        self.show(); self.activateWindow()
+        self.update_visibility()
+
+    def is_on_screen(self):
+        """視窗是否看得到：沒有隱藏到托盤、沒有最小化，
+        且平台回報視窗有露出 (部分平台被完全遮住時不算露出)"""
+        if not self.is_rdp_visible or self.isMinimized(): return False
+        handle = self.windowHandle()
+        return handle is None or handle.isExposed()
+
+    def set_in_overview(self, watched):
+        self.in_overview = watched
+        self.update_visibility()
+
+    def update_visibility(self):
+        """依視窗狀態決定是否上傳畫面，
+        以及是否要求伺服器送出畫面 (錄影中或總覽顯示中一律送出)"""
+        on_screen = self.is_on_screen()
+        if self.rdp_widget:
+            # 看不到期間沒有上傳，
+            # 恢復時立即上傳最新的幀 (伺服器沒有暫停時不一定會再發佈)
+            if on_screen and not self.rdp_widget.is_ui_visible: QTimer.singleShot(0, self.rdp_widget.check_frame)
+            self.rdp_widget.is_ui_visible = on_screen
+        if on_screen or self.in_overview or (self.rdp_widget and self.rdp_widget.recorder):
+            self.suppress_timer.stop()
+            self.apply_remote_visibility(True)
+        elif self.remote_visible and not self.suppress_timer.isActive():
+            self.suppress_timer.start(SUPPRESS_OUTPUT_DELAY_MS)
+
+    def apply_remote_visibility(self, visible):
+        if visible == self.remote_visible or not self.backend: return
+        self.remote_visible = visible
+        self.backend.set_visible(visible)
+        print(f"[Visibility] {self.config['server']} 已{'恢復' if visible else '暫停'}伺服器畫面輸出")
+
+    def on_disconnect(self):
+        scheduler.remove(self.backend)
+        self.adapt_timer.stop()
+        if self.closing: return
+        if self.config.get('auto_reconnect', True):
+            # 保留視窗、紋理、鍵盤鉤子與映射，只釋放斷線的 DLL 實例；
+            # 輸入在重連前由後端忽略
+            print(f"[Reconnect] 與 {self.config['server']} 的連線中斷，準備重新連線")
+            self.backend.close_instance()
+            self.schedule_reconnect()
+            return
+        QMessageBox.warning(self, "斷線", f"與 {self.config['server']} 的連線已中斷。")
+        self.close()
+
+    def changeEvent(self, event):
+        # 鍵盤鉤子只在 RDP 視窗位於前景時攔截修飾鍵
+        if event.type() == QEvent.Type.ActivationChange and hasattr(self, 'kb_hook'):
+            self.kb_hook.set_active(self.isActiveWindow())
+        elif event.type() == QEvent.Type.WindowStateChange:
+            self.update_visibility()
+        super().changeEvent(event)
+
+    def showEvent(self, event):
+        super().showEvent(event)
+        # 視窗露出狀態只通知 QWindow (重複安裝不會重複觸發)
+        self.windowHandle().installEventFilter(self)
+
+    def eventFilter(self, obj, event):
+        if event.type() == QEvent.Type.Expose: QTimer.singleShot(0, self.update_visibility)
+        return super().eventFilter(obj, event)
+
+    def closeEvent(self, event):
+        print("[UI] 正在關閉程式並清理鉤子...")
+        self.closing = True
+        self.reconnect_timer.stop()
+        self.suppress_timer.stop()
+        self.adapt_timer.stop()
+        # 仍在握手中 (包含重新連線)：取消，完成的連線會在 on_connect_progress 中釋放
+        if self.job: self.job.cancel()
+        
+        # --- 務必卸載鉤子，否則系統鍵盤可能異常 ---
+        if hasattr(self, 'kb_hook'):
+            self.kb_hook.uninstall()
+
+        # 寫完錄影再釋放連線
+        if self.rdp_widget and self.rdp_widget.recorder: self.stop_recording()
+        
+        if self.backend:
+            # 先確定排程器不再 poll 這個連線，才能釋放 DLL 實例
+            scheduler.remove(self.backend)
+            self.backend.close()
+        if self.rdp_widget: registry.unregister(self.rdp_widget.metrics)
+
+        if hasattr(self, 'tray_icon'): self.tray_icon.hide()
+        # 從列表中移除自己
+        if self in active_windows:
+            active_windows.remove(self)
+        
+        event.accept()
+
+class PlaybackWindow(QMainWindow):
+    """以 RdpGLWidget 播放錄影，可暫停與拖曳跳轉"""
+    def __init__(self, path):
+        super().__init__()
+        from rdp_record import PlaybackBackend, RecordingPlayer
+        self.backend = PlaybackBackend(RecordingPlayer(path))
+        self.setWindowTitle(f"錄影播放: {path}")
+        player = self.backend.player
+        self.resize(player.width or 800, (player.height or 600) + 40)
+
+        self.rdp_widget = RdpGLWidget(self.backend, name=f"playback:{path}")
+        self.play_button = QPushButton("暫停")
+        self.play_button.clicked.connect(self.toggle_pause)
+        self.slider = QSlider(Qt.Orientation.Horizontal)
+        self.slider.setRange(0, int(player.duration * 1000))
+        self.slider.sliderMoved.connect(lambda ms: self.seek(ms / 1000))
+        self.time_label = QLabel()
+        controls = QHBoxLayout()
+        controls.addWidget(self.play_button)
+        controls.addWidget(self.slider, 1)
+        controls.addWidget(self.time_label)
+        central = QWidget()
+        layout = QVBoxLayout(central)
+        layout.setContentsMargins(0, 0, 0, 0)
+        layout.addWidget(self.rdp_widget, 1)
+        layout.addLayout(controls)
+        self.setCentralWidget(central)
+
+        self.timer = QTimer(self)
+        self.timer.timeout.connect(self.on_tick)
+        self.timer.start(16)
+
+    def on_tick(self):
+        if self.backend.tick(): self.rdp_widget.check_frame()
+        position = self.backend.position
+        if not self.slider.isSliderDown(): self.slider.setValue(int(position * 1000))
+        self.time_label.setText(f"{position:6.1f} / {self.backend.player.duration:.1f} 秒")
+        if self.backend.finished and not self.backend.paused: self.toggle_pause()
+
+    def toggle_pause(self):
+        if self.backend.paused: self.backend.resume()
+        else: self.backend.pause()
+        self.play_button.setText("播放" if self.backend.paused else "暫停")
+
+    def seek(self, t):
+        self.backend.seek(t)
+        self.rdp_widget.check_frame()
+
+    def closeEvent(self, event):
+        self.timer.stop()
+        self.backend.close()
+        registry.unregister(self.rdp_widget.metrics)
+        if self in active_windows: active_windows.remove(self)
+        event.accept()
+
+def show_overview():
+    """以縮圖顯示所有連線視窗，按一下縮圖切換到該連線"""
+    global overview_window
+    if overview_window is None:
+        from rdp_overview import OverviewWindow
+        overview_window = OverviewWindow(lambda: [w for w in active_windows if isinstance(w, MainWindow)])
+    overview_window.showNormal()
+    overview_window.activateWindow()
+
+def open_window(config):
+    """建立第一個連線視窗 (由 rdp_client_gpu.py 在對話框確認後呼叫)"""
+    app = QApplication.instance()
+    # 模組在背景執行緒匯入，掃描碼表要依 UI 執行緒的鍵盤配置重建
+    scancodes.rebuild()
+    app.aboutToQuit.connect(scheduler.stop)
+    app.aboutToQuit.connect(connect_pool.shutdown)
+    app.aboutToQuit.connect(lambda: metrics_exporter and metrics_exporter.stop())
+    window = MainWindow(config)
+    window.show()
+    active_windows.append(window)
+    return window
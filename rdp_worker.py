@@ -0,0 +1,259 @@
+"""工作程序模式：每個連線在獨立的程序中執行
+
+所有連線都在同一個 Python 程序時，FreeRDP 的 ctypes 呼叫、畫面處理與輸入轉換都搶同一個
+GIL，RdpBridge.dll 當掉也會帶走全部連線。工作程序模式下連線 (RdpBackend + 排程器)
+在子程序中執行：
+    畫面   子程序的 DLL 寫入具名共享記憶體，主程序以同一個名稱映射
+           (解析度變更的新一代為 <基底>_<世代>)
+    通知   子程序每發佈一幀送出一則訊息；主程序的排程器等待管線 (Windows 為具名事件)
+           與程序的結束句柄
+    輸入   主程序把 (type, flags, x, y) 批次以訊息送給子程序，由子程序呼叫 rdpb_send_input_batch
+子程序結束 (包含當掉) 時 poll() 回報斷線，由原本的斷線/自動重新連線流程處理，
+其他連線不受影響。
+
+WorkerBackend 提供與 RdpBackend 相同的介面，可直接交給 SessionScheduler、RdpGLWidget 與 RdpSession。
+"""
+import multiprocessing
+import sys
+import threading
+
+from rdp_backend import MappedBackend, RdpBackend
+from rdp_connect import ConnectJob, FINAL_STATES
+from rdp_input import INPUT_KEYBOARD, INPUT_MOUSE, key_flags
+from rdp_profile import profile_for
+from rdp_scheduler import POLL_DISCONNECTED, POLL_FRAME, POLL_IDLE, SessionScheduler
+from rdp_shm import ShmMapping, open_named_shm, read_generation
+
+# 關閉時等待工作程序自行結束的秒數，逾時強制終止
+WORKER_CLOSE_TIMEOUT = 5.0
+
+EVENT_MODIFY_STATE = 0x0002
+
+_worker_count = 0
+_worker_lock = threading.Lock()
+
+
+class Win32Event:
+    """具名的自動重設事件：工作程序送出訊息後設定，
+    主程序的排程器以 WaitForMultipleObjects 等待"""
+    def __init__(self, name, create):
+        import ctypes
+        from ctypes import wintypes
+        self.kernel32 = ctypes.windll.kernel32
+        self.kernel32.CreateEventW.restype = wintypes.HANDLE
+        self.kernel32.OpenEventW.restype = wintypes.HANDLE
+        self.kernel32.SetEvent.argtypes = [wintypes.HANDLE]
+        self.kernel32.CloseHandle.argtypes = [wintypes.HANDLE]
+        if create: self.handle = self.kernel32.CreateEventW(None, False, False, name)
+        else: self.handle = self.kernel32.OpenEventW(EVENT_MODIFY_STATE, False, name)
+
+    def set(self):
+        self.kernel32.SetEvent(self.handle)
+
+    def close(self):
+        if self.handle:
+            self.kernel32.CloseHandle(self.handle)
+            self.handle = None
+
+
+def create_rdp_backend(config, job, reuse):
+    """工作程序中建立連線的預設方式 (也是非工作程序模式的連線方式)，
+    設定檔依 config['profile'] 決定"""
+    return RdpBackend(config['server'], config['port'], config['username'], config['password'],
+                      config['width'], config['height'], config['color_depth'], job=job, reuse=reuse,
+                      profile=profile_for(config))
+
+
+def worker_main(conn, config, reuse, notify_name, factory):
+    """工作程序的進入點：在背景建立連線並以自己的排程器驅動，
+    主執行緒處理主程序的命令
+
+    送給主程序：
+    ('state', 狀態) / ('connected', 共享記憶體名稱) / ('failed', 訊息) / ('frame',) / ('disconnected',)
+    來自主程序：
+    ('input', 事件清單) / ('locks', num, caps, scroll) / ('visible', 是否可見) / ('frame_rate', fps)
+              / ('cancel',) / ('close',)
+    """
+    notify = Win32Event(notify_name, create=False) if notify_name else None
+    send_lock = threading.Lock()
+
+    def send(*message):
+        with send_lock:
+            try:
+                conn.send(message)
+            except (OSError, ValueError):
+                return  # 主程序已關閉管線
+        if notify: notify.set()
+
+    job = ConnectJob(config)
+    job.add_listener(lambda job, state: send('state', state))
+    scheduler = SessionScheduler()
+    backends = []
+
+    def connect():
+        try:
+            backend = factory(config, job, reuse)
+        except Exception as e:
+            send('failed', str(e))
+            return
+        backends.append(backend)
+        send('connected', backend.shm_name)
+        scheduler.add(backend, on_frame=lambda b: send('frame'), on_disconnect=lambda b: send('disconnected'))
+
+    threading.Thread(target=connect, daemon=True, name="RdpWorkerConnect").start()
+    try:
+        while True:
+            message = conn.recv()
+            kind = message[0]
+            if kind == 'close': break
+            if kind == 'cancel': job.cancel()
+            elif not backends: continue
+            elif kind == 'input': backends[0].send_input_batch(message[1])
+            elif kind == 'locks': backends[0].sync_locks(*message[1:])
+            elif kind == 'visible': backends[0].set_visible(message[1])
+            elif kind == 'frame_rate': backends[0].set_frame_rate(message[1])
+    except (EOFError, OSError):
+        pass  # 主程序已結束
+    finally:
+        scheduler.stop()
+        for backend in backends: backend.close()
+        if notify: notify.close()
+
+
+class WorkerBackend(MappedBackend):
+    """在工作程序中執行的連線，於主程序提供與 RdpBackend 相同的介面
+
+    建構時啟動工作程序並阻塞到握手完成；傳入 ConnectJob 時轉送進度並可由其取消。
+    factory(config, job, reuse) 在工作程序中建立實際的後端，必須是可匯入的模組層級函式。
+    """
+    def __init__(self, config, job=None, reuse=None, factory=create_rdp_backend):
+        global _worker_count
+        with _worker_lock:
+            _worker_count += 1
+            index = _worker_count
+        if reuse is not None and not isinstance(reuse, tuple): reuse = reuse.shm_reuse()
+        context = multiprocessing.get_context('spawn')
+        self.conn, child_conn = context.Pipe()
+        self._send_lock = threading.Lock()
+        self.notify = None
+        notify_name = None
+        if sys.platform == 'win32':
+            notify_name = f"Local\\RdpWorkerNotify_{multiprocessing.current_process().pid}_{index}"
+            self.notify = Win32Event(notify_name, create=True)
+        self.process = context.Process(target=worker_main, args=(child_conn, config, reuse, notify_name, factory),
+                                       name=f"RdpWorker-{config['server']}", daemon=True)
+        self.process.start()
+        child_conn.close()
+        self.alive = True
+        self.mapping = ShmMapping(self._open_shm)
+        if job is not None: job.attach_native(lambda: self._send('cancel'))
+        try:
+            self.shm_name = self._wait_connected(job)
+            if not self.mapping.remap(): raise Exception("共享記憶體版本與 RdpBridge.dll 不符！")
+        except Exception:
+            self.close()
+            raise
+        finally:
+            if job is not None: job.attach_native(None)
+        print(f"[Worker] {config['server']} 在工作程序 {self.process.pid} 中執行")
+
+    def _wait_connected(self, job):
+        while True:
+            try:
+                message = self.conn.recv()
+            except (EOFError, OSError):
+                raise Exception(f"工作程序意外結束 (結束代碼 {self.process.exitcode})")
+            kind = message[0]
+            if kind == 'connected': return message[1]
+            if kind == 'failed': raise Exception(message[1])
+            # 最終狀態由主程序的 ConnectPool 決定
+            if kind == 'state' and job is not None and message[1] not in FINAL_STATES: job.set_state(message[1])
+
+    def _open_shm(self, size):
+        if self.mapping.buf is not None:
+            # 發佈端換代時舊映射標頭的 generation 已指向新一代
+            self.shm_name = f"{self.shm_name.rsplit('_', 1)[0]}_{read_generation(self.mapping.buf)}"
+        return open_named_shm(self.shm_name, size)
+
+    def _send(self, *message):
+        with self._send_lock:
+            try:
+                self.conn.send(message)
+            except (OSError, ValueError):
+                self.alive = False
+
+    # --- 排程器介面 ---
+
+    def get_event_handles(self):
+        if not self.alive: return []
+        notify = self.notify.handle if self.notify else self.conn.fileno()
+        return [notify, self.process.sentinel]
+
+    def poll(self):
+        """處理工作程序送來的訊息，不阻塞"""
+        result = POLL_IDLE
+        try:
+            while self.alive and self.conn.poll():
+                kind = self.conn.recv()[0]
+                if kind == 'frame': result = POLL_FRAME
+                elif kind == 'disconnected': self.alive = False
+        except (EOFError, OSError):
+            self.alive = False
+        if self.alive and not self.process.is_alive():
+            print(f"[Worker] 工作程序 {self.process.pid} 已結束 (結束代碼 {self.process.exitcode})")
+            self.alive = False
+        return result if self.alive else POLL_DISCONNECTED
+
+    # --- 輸入 ---
+
+    def send_mouse(self, flags, x, y):
+        self.send_input_batch([(INPUT_MOUSE, flags, x, y)])
+
+    def send_scancode(self, scancode, is_down, is_extended):
+        self.send_input_batch([(INPUT_KEYBOARD, key_flags(is_down, is_extended), scancode, 0)])
+
+    def send_input_batch(self, events):
+        if self.alive: self._send('input', list(events))
+
+    def sync_locks(self, num_lock, caps_lock, scroll_lock):
+        if self.alive: self._send('locks', num_lock, caps_lock, scroll_lock)
+
+    def set_visible(self, visible):
+        if self.alive: self._send('visible', bool(visible))
+
+    def set_frame_rate(self, fps):
+        if self.alive: self._send('frame_rate', int(fps))
+
+    # --- 結束 ---
+
+    def close_instance(self):
+        """結束工作程序；映射保留到重新連線的新工作程序接手同一塊共享記憶體為止"""
+        self.alive = False
+        if self.process.is_alive():
+            self._send('close')
+            # 工作程序可能正等著送出訊息，等待期間繼續讀取管線
+            deadline = WORKER_CLOSE_TIMEOUT
+            while self.process.is_alive() and deadline > 0:
+                try:
+                    while self.conn.poll(): self.conn.recv()
+                except (EOFError, OSError):
+                    pass
+                self.process.join(0.05)
+                deadline -= 0.05
+            if self.process.is_alive():
+                print(f"[Worker] 工作程序 {self.process.pid} 沒有回應，強制結束")
+                self.process.terminate()
+                self.process.join()
+
+    def close(self):
+        self.close_instance()
+        self.mapping.close()
+        self.conn.close()
+        if self.notify: self.notify.close()
+
+
+def connect_backend(job):
+    """ConnectPool 的 connect_fn：config['worker'] 為真時在工作程序中建立連線"""
+    config, reuse = job.config, job.options.get('reuse')
+    if config.get('worker'): return WorkerBackend(config, job=job, reuse=reuse)
+    return create_rdp_backend(config, job, reuse)